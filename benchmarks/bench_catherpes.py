@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+
+"""Benchmark suite for the catherpes parsers and converters.
+
+Synopsis:
+
+    python benchmarks/bench_catherpes.py --scale 4 --repeat 3
+    python benchmarks/bench_catherpes.py --compare
+    python benchmarks/bench_catherpes.py --list
+    python benchmarks/bench_catherpes.py gff_parse_df region_fetch
+
+Description:
+
+Each benchmark is a function registered with the @benchmark decorator
+that returns the number of items it processed, so results are
+reported as both seconds and items per second.  Peak resident memory
+benchmarks run in a fresh Python process and report the maximum RSS
+of that process.
+
+Larger inputs are synthesized by replicating the chr22 GFF3 test file
+--scale times, with the seqid of each copy renamed (22_1, 22_2, ...),
+and writing the result with bgzip compression.  Synthetic inputs are
+cached in the work directory between runs.
+
+Results are written as JSON to benchmarks/results named by the date
+and the git commit, and --compare prints the change relative to the
+previous result file so regressions between commits are visible.
+
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from catherpes import bgzf  # noqa: E402
+from catherpes import index  # noqa: E402
+from catherpes import writers  # noqa: E402
+from catherpes.gff import GFF  # noqa: E402
+
+GFF_FILE = os.path.join(ROOT, 'tests', 'data',
+                        'Homo_sapiens.GRCh38.104.chromosome.22.gff3.gz')
+
+BENCHMARKS = {}
+
+
+def benchmark(name, unit='records', repeat=True):
+    """Register a benchmark function.
+
+    Args:
+        name (str)    : The name of the benchmark.
+
+        unit (str)    : The unit of the count returned by the function.
+
+        repeat (bool) : False for benchmarks that should only run
+                        once, such as peak memory measurements.
+
+    Returns:
+        The decorator.
+    """
+
+    def register(func):
+        BENCHMARKS[name] = {'func': func, 'unit': unit, 'repeat': repeat}
+        return func
+
+    return register
+
+
+class Inputs(object):
+    """Build and cache the synthetic benchmark inputs."""
+
+    def __init__(self, workdir, scale):
+        self.workdir = workdir
+        self.scale = scale
+        self.objects = {}
+        os.makedirs(workdir, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def cached(self, name, build):
+        """Build an object once and reuse it across repeats."""
+        if name not in self.objects:
+            self.objects[name] = build()
+        return self.objects[name]
+
+    @property
+    def gff(self):
+        """The chr22 GFF3 file replicated scale times, bgzipped and
+        indexed.
+        """
+
+        file = self.path('chr22x{}.gff3.gz'.format(self.scale))
+        if not os.path.exists(file):
+            with gzip.open(GFF_FILE, 'rt') as f:
+                lines = f.read().splitlines(True)
+            headers = [line for line in lines if line.startswith('##gff')]
+            records = [line for line in lines if not line.startswith('#')]
+            with bgzf.BgzfWriter(file) as writer:
+                writer.write(''.join(headers))
+                for copy in range(1, self.scale + 1):
+                    seqid = '22_{}'.format(copy)
+                    writer.write(''.join(seqid + line[2:] for line in records))
+            index.build_index(file)
+
+        return file
+
+    @property
+    def sj(self):
+        """A synthetic STAR SJ.out.tab file with 20,000 junctions per
+        unit of scale.
+        """
+
+        file = self.path('synthetic_x{}.SJ.out.tab'.format(self.scale))
+        if not os.path.exists(file):
+            rng = np.random.default_rng(1)
+            n = 20000 * self.scale
+            starts = np.sort(rng.integers(10000, 50000000, n))
+            with open(file, 'w') as f:
+                for (i, start) in enumerate(starts.tolist()):
+                    f.write('chr22\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n'.format(
+                        start, start + int(rng.integers(50, 20000)),
+                        i % 3, i % 7, i % 2, i % 101, i % 13, i % 60))
+
+        return file
+
+
+@benchmark('gff_parse_dict')
+def gff_parse_dict(inputs):
+    return len(GFF(file=inputs.gff).data)
+
+
+@benchmark('gff_parse_object')
+def gff_parse_object(inputs):
+    return len(GFF(file=inputs.gff, format='object').data)
+
+
+@benchmark('gff_parse_df')
+def gff_parse_df(inputs):
+    return len(GFF(file=inputs.gff, format='df').data)
+
+
+@benchmark('gff_parse_df_workers4')
+def gff_parse_df_workers4(inputs):
+    return len(GFF(file=inputs.gff, format='df', workers=4).data)
+
+
+@benchmark('gff_parse_filtered')
+def gff_parse_filtered(inputs):
+    return len(GFF(file=inputs.gff, format='df', types=['gene', 'exon']).data)
+
+
+@benchmark('gff_iter_records')
+def gff_iter_records(inputs):
+    return sum(1 for record in GFF(file=inputs.gff, lazy=True))
+
+
+@benchmark('gff_cache_load')
+def gff_cache_load(inputs):
+    cache_dir = inputs.path('cache')
+    if not os.path.exists(cache_dir):
+        GFF(file=inputs.gff, format='df', cache_dir=cache_dir)
+    return len(GFF(file=inputs.gff, format='df', cache_dir=cache_dir).data)
+
+
+@benchmark('region_fetch', unit='regions')
+def region_fetch(inputs):
+    rng = np.random.default_rng(2)
+    starts = rng.integers(16000000, 50000000, 100)
+    for start in starts.tolist():
+        GFF(file=inputs.gff, format='df',
+            region='22_1:{}-{}'.format(start, start + 100000))
+    return len(starts)
+
+
+@benchmark('query_batch', unit='queries')
+def query_batch(inputs):
+    gff = inputs.cached('df_gff', lambda: GFF(file=inputs.gff, format='df'))
+    gff._indexes.clear()
+    rng = np.random.default_rng(3)
+    n = 100000
+    seqids = rng.choice(['22_{}'.format(i + 1) for i in range(inputs.scale)], n)
+    starts = rng.integers(16000000, 50000000, n)
+    gff.query_batch(seqids, starts, starts + 100, type='exon')
+    return n
+
+
+@benchmark('write_gff3_bgzip')
+def write_gff3_bgzip(inputs):
+    gff = inputs.cached('df_gff', lambda: GFF(file=inputs.gff, format='df'))
+    writers.write_gff3(gff, inputs.path('out.gff3.gz'), bgzip=True, threads=4)
+    return len(gff.data)
+
+
+@benchmark('write_bed12', unit='transcripts')
+def write_bed12(inputs):
+    gff = inputs.cached('df_gff', lambda: GFF(file=inputs.gff, format='df'))
+    writers.write_bed(gff, inputs.path('out.bed'), bed12=True)
+    with open(inputs.path('out.bed')) as f:
+        return sum(1 for line in f)
+
+
+@benchmark('create_igv_junc_bed', unit='junctions')
+def create_igv_junc_bed(inputs):
+    script = os.path.join(ROOT, 'scripts', 'create_igv_junc_bed.py')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [ROOT, env.get('PYTHONPATH')]))
+    with open(os.devnull, 'w') as devnull:
+        subprocess.run([sys.executable, script, inputs.sj],
+                       stdout=devnull, check=True, env=env)
+    with open(inputs.sj) as f:
+        return sum(1 for line in f)
+
+
+# Peak memory is read from VmHWM in /proc where available because
+# ru_maxrss can carry over the RSS of the parent across fork and exec.
+PEAK_RSS = """
+import resource, sys
+sys.path.insert(0, {root!r})
+from catherpes.gff import GFF
+gff = GFF(file={file!r}, format={format!r})
+try:
+    with open('/proc/self/status') as f:
+        kb = [int(l.split()[1]) for l in f if l.startswith('VmHWM')][0]
+except (OSError, IndexError):
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(len(gff.data), kb)
+"""
+
+
+def peak_rss(inputs, format):
+    """Load the synthetic GFF3 file in a fresh process and measure its
+    peak resident memory.
+    """
+
+    output = subprocess.run(
+        [sys.executable, '-c',
+         PEAK_RSS.format(root=ROOT, file=inputs.gff, format=format)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    (count, kb) = output.stdout.split()
+    return {'count': int(count), 'peak_rss_mb': int(kb) / 1024}
+
+
+for _format in ('dict', 'object', 'df'):
+    benchmark('gff_peak_rss_' + _format, repeat=False)(
+        lambda inputs, format=_format: peak_rss(inputs, format))
+
+
+def run(names, inputs, repeat):
+    """Run benchmarks and collect their results.
+
+    Args:
+        names (list)   : The names of the benchmarks to run.
+
+        inputs (Inputs): The benchmark inputs.
+
+        repeat (int)   : The number of times to run each benchmark.
+
+    Returns:
+        A dictionary of results keyed by benchmark name.
+    """
+
+    results = {}
+    for name in names:
+        bench = BENCHMARKS[name]
+        times = []
+        extra = {}
+        for i in range(repeat if bench['repeat'] else 1):
+            start = time.perf_counter()
+            count = bench['func'](inputs)
+            times.append(time.perf_counter() - start)
+            if isinstance(count, dict):
+                extra = count
+                count = extra.pop('count')
+
+        best = min(times)
+        results[name] = dict(extra,
+                             unit=bench['unit'],
+                             count=count,
+                             best=best,
+                             median=statistics.median(times),
+                             rate=count / best if best else None)
+        _report(name, results[name])
+
+    return results
+
+
+def _report(name, result, previous=None):
+    line = '{:<28} {:>10.3f}s {:>14,.0f} {}/s'.format(
+        name, result['best'], result['rate'] or 0, result['unit'])
+    if 'peak_rss_mb' in result:
+        line += ' {:>10.1f} MB peak'.format(result['peak_rss_mb'])
+    if previous is not None and previous.get('best'):
+        line += ' {:>+8.1%}'.format(result['best'] / previous['best'] - 1)
+    print(line)
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL,
+                                universal_newlines=True)
+        return output.stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+
+def compare(outdir, results=None):
+    """Print the change in run time between the two most recent result
+    files, or between the most recent file and a new set of results.
+
+    Args:
+        outdir (str)  : The directory holding result files.
+
+        results (dict): Results to compare to the latest file.
+
+    Returns: No return value.
+    """
+
+    files = sorted(f for f in os.listdir(outdir) if f.endswith('.json'))
+    if results is None:
+        if len(files) < 2:
+            print('Need two result files in {} to compare'.format(outdir))
+            return
+        with open(os.path.join(outdir, files[-1])) as f:
+            results = json.load(f)['results']
+        files = files[:-1]
+    elif not files:
+        return
+
+    with open(os.path.join(outdir, files[-1])) as f:
+        previous = json.load(f)
+    print('\nCompared to {} ({})'.format(files[-1], previous['commit']))
+    for (name, result) in results.items():
+        _report(name, result, previous['results'].get(name))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the catherpes parsers and converters',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('names', nargs='*',
+                        help='Benchmarks to run (default all)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Number of copies of chr22 in the synthetic input')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to run each benchmark')
+    parser.add_argument('--workdir',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'catherpes-bench'),
+                        help='Directory for synthetic inputs')
+    parser.add_argument('--outdir', default=os.path.join(HERE, 'results'),
+                        help='Directory to save results to')
+    parser.add_argument('--compare', action='store_true',
+                        help='Compare with the previous result file')
+    parser.add_argument('--list', action='store_true',
+                        help='List the benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return
+
+    names = args.names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('Unknown benchmarks: ' + ', '.join(sorted(unknown)))
+
+    inputs = Inputs(args.workdir, args.scale)
+    results = run(names, inputs, args.repeat)
+
+    os.makedirs(args.outdir, exist_ok=True)
+    commit = _git_commit()
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    if args.compare:
+        compare(args.outdir, results)
+    path = os.path.join(args.outdir, '{}-{}.json'.format(stamp, commit))
+    with open(path, 'w') as f:
+        json.dump({'commit': commit, 'date': stamp, 'scale': args.scale,
+                   'python': sys.version.split()[0], 'results': results},
+                  f, indent=2)
+    print('\nResults saved to ' + path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+"""The catherpes annotate.py module labels variants with the genes,
+transcripts and gene model regions they overlap.
+
+An Annotator is built once from a GFF object.  It collects the exon,
+CDS and UTR features, the transcripts and genes above them and the
+introns between exons into a single interval index, resolving the
+gene and transcript of every entry up front.  Variants are then
+annotated in batches with one vectorized lookup per batch, so the same
+Annotator can be reused across any number of VCF files.
+
+Example:
+    Annotate a VCF file::
+
+        $ python annotate.py genes.gff3.gz sample.vcf.gz > sample.tsv
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from catherpes.gff import GFF
+from catherpes.intervals import IntervalIndex
+from catherpes.utils import hierarchy, join_groups, stable_ids
+from catherpes.vcf import VCF
+
+CHUNK_SIZE = 100000
+
+# Gene model regions from the most to the least specific.  A variant
+# is given the first region any of its overlaps has.
+REGIONS = ('CDS', 'five_prime_UTR', 'three_prime_UTR', 'exon', 'intron',
+           'transcript', 'gene')
+INTERGENIC = 'intergenic'
+
+
+def main(args):
+    """ Main entry point of the app """
+
+    annotator = Annotator(GFF(file=args.gff, format='df',
+                              cache_dir=args.cache_dir))
+    for (i, file) in enumerate(args.vcf):
+        for (j, chunk) in enumerate(annotator.annotate_vcf(file)):
+            chunk.to_csv(sys.stdout, sep='\t', index=False,
+                         header=(i == 0 and j == 0))
+
+
+class Annotator(object):
+    """Catherpes Annotator is a Python class for labelling genomic
+    positions with the gene model features they overlap.
+    """
+
+    def __init__(self, gff):
+        """Args:
+            gff (GFF): The gene models, in any format.
+
+        """
+
+        df = gff.to_frame()
+        (parents, genes, transcripts) = hierarchy(df)
+        types = df['type'].to_numpy(dtype=object)
+        ids = df['ID'].to_numpy(dtype=object)
+
+        regions = np.flatnonzero(np.isin(types, REGIONS[:4]))
+        tx_rows = np.unique(transcripts[regions])
+        tx_rows = tx_rows[tx_rows >= 0]
+        gene_rows = np.unique(genes[tx_rows])
+
+        introns = gff.introns()
+        row_of = {}
+        for (row, id) in zip(tx_rows.tolist(), ids[tx_rows].tolist()):
+            row_of.setdefault(id, row)
+        intron_tx = np.array([row_of.get(id, -1) for id in introns['Parent']],
+                             dtype=np.int64)
+        introns = introns[intron_tx >= 0]
+        intron_tx = intron_tx[intron_tx >= 0]
+
+        rows = np.concatenate((regions, tx_rows, gene_rows))
+        labels = np.concatenate((
+            pd.Categorical(types[regions], categories=REGIONS).codes,
+            np.full(len(tx_rows), REGIONS.index('transcript')),
+            np.full(len(gene_rows), REGIONS.index('gene')),
+            np.full(len(introns), REGIONS.index('intron')))).astype(np.int8)
+        row_tx = np.concatenate((transcripts[regions], tx_rows,
+                                 np.full(len(gene_rows), -1), intron_tx))
+        row_gene = np.concatenate((genes[regions], genes[tx_rows], gene_rows,
+                                   genes[intron_tx]))
+
+        attributes = df['attributes'].to_numpy(dtype=object)
+        names = df['Name'].to_numpy(dtype=object)
+        self.labels = labels
+        self.gene_ids = stable_ids(attributes, ids, row_gene, 'gene_id=')
+        self.gene_names = names[row_gene]
+        self.transcript_ids = stable_ids(attributes, ids, row_tx,
+                                         'transcript_id=')
+        self.index = IntervalIndex(
+            np.concatenate((df['seqid'].to_numpy(dtype=object)[rows],
+                            introns['seqid'].to_numpy(dtype=object))),
+            np.concatenate((df['start'].to_numpy(dtype=np.int64)[rows],
+                            introns['start'].to_numpy(dtype=np.int64))),
+            np.concatenate((df['end'].to_numpy(dtype=np.int64)[rows],
+                            introns['end'].to_numpy(dtype=np.int64))))
+
+    def query(self, seqids, starts, ends):
+        """Find every gene model feature overlapping a batch of
+        positions.
+
+        Args:
+            seqids (array-like): The seqid of each position.
+
+            starts (array-like): The 1-based start of each position.
+
+            ends (array-like)  : The 1-based inclusive end of each
+                                 position.
+
+        Returns:
+            A DataFrame with one row per overlap and columns query (the
+            position in the batch), region, gene, gene_name and
+            transcript.
+        """
+
+        (query_idx, entry_idx) = self.index.query_batch(seqids, starts, ends)
+
+        return pd.DataFrame({
+            'query': query_idx,
+            'region': pd.Categorical.from_codes(self.labels[entry_idx],
+                                                categories=REGIONS),
+            'gene': self.gene_ids[entry_idx],
+            'gene_name': self.gene_names[entry_idx],
+            'transcript': self.transcript_ids[entry_idx]})
+
+    def annotate(self, seqids, starts, ends):
+        """Summarize the gene model features overlapping a batch of
+        positions.
+
+        Args:
+            seqids (array-like): The seqid of each position.
+
+            starts (array-like): The 1-based start of each position.
+
+            ends (array-like)  : The 1-based inclusive end of each
+                                 position.
+
+        Returns:
+            A DataFrame with one row per position and columns region
+            (the most specific region overlapped, or 'intergenic'),
+            genes, gene_names and transcripts holding comma-separated
+            identifiers of all overlapping features.
+        """
+
+        size = len(starts)
+        hits = self.query(seqids, starts, ends)
+
+        best = np.full(size, len(REGIONS), dtype=np.int64)
+        np.minimum.at(best, hits['query'].to_numpy(),
+                      hits['region'].cat.codes.to_numpy())
+        result = pd.DataFrame({'region': np.array(REGIONS + (INTERGENIC,),
+                                                  dtype=object)[best]})
+
+        for (key, column) in (('gene', 'genes'), ('gene_name', 'gene_names'),
+                              ('transcript', 'transcripts')):
+            values = hits[['query', key]].dropna().drop_duplicates()
+            result[column] = join_groups(values['query'].to_numpy(),
+                                         values[key].tolist(), size)
+
+        return result
+
+    def annotate_vcf(self, file, region=None, chunk_size=CHUNK_SIZE):
+        """Annotate the variants of a VCF file.
+
+        Args:
+            file (str)      : The path/name of the VCF file.
+
+            region (str)    : Only annotate variants in a region.
+
+            chunk_size (int): The number of variants annotated at a
+                              time.
+
+        Yields:
+            A DataFrame for each chunk of variants with the chrom, pos,
+            id, ref and alt columns followed by the annotate columns.
+        """
+
+        chunk = []
+        for variant in VCF(file=file, region=region):
+            chunk.append((variant.chrom, variant.pos, variant.id,
+                          variant.ref, ','.join(variant.alt)))
+            if len(chunk) == chunk_size:
+                yield self._annotate_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield self._annotate_chunk(chunk)
+
+    def _annotate_chunk(self, chunk):
+        """Annotate a list of (chrom, pos, id, ref, alt) tuples."""
+
+        variants = pd.DataFrame(chunk, columns=['chrom', 'pos', 'id', 'ref',
+                                                'alt'])
+        pos = variants['pos'].to_numpy(dtype=np.int64)
+        ends = pos + variants['ref'].str.len().to_numpy(dtype=np.int64) - 1
+        result = self.annotate(variants['chrom'].to_numpy(dtype=object), pos,
+                               np.maximum(ends, pos))
+
+        return pd.concat([variants, result], axis=1)
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional arguments
+    parser.add_argument("gff", help="Required path/name of a GFF3 file")
+    parser.add_argument("vcf", nargs='+', help="Required path/name of one or "
+                        "more VCF files")
+
+    # Optional argument which requires a parameter (eg. -c ~/.cache)
+    parser.add_argument("-c", "--cache-dir", action="store", dest="cache_dir",
+                        help="A directory to cache the parsed GFF3 file in")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
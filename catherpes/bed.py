@@ -1,6 +1,20 @@
 #!/usr/bin/env python3
-"""
-Module Docstring
+
+"""The catherpes bed.py module provides a class and methods for
+reading BED files and for interval algebra on them.
+
+Intervals are loaded into NumPy arrays and, per chrom, sorted by
+start.  Sort, merge, intersect, subtract, complement and closest are
+all single sorted passes over those arrays using cumulative maxima,
+binary searches and repeat/offset tricks rather than a Python loop per
+interval, in the spirit of the bedtools commands of the same names.
+Coordinates are 0-based and half-open as in the BED format.
+
+Example:
+    Merge overlapping intervals::
+
+        $ python bed.py merge file.bed
+
 """
 
 __author__ = "Barry Moore"
@@ -8,33 +22,474 @@ __version__ = "0.1.0"
 __license__ = "GNU GPL"
 
 import argparse
+import gzip
+import sys
+
+import numpy as np
+import pandas as pd
+
+from catherpes.intervals import IntervalIndex
+
+COLUMNS = ('chrom', 'start', 'end', 'name', 'score', 'strand',
+           'thickStart', 'thickEnd', 'itemRgb', 'blockCount',
+           'blockSizes', 'blockStarts')
 
 
 def main(args):
     """ Main entry point of the app """
-    print("hello world")
-    print(args)
+
+    bed = BED(file=args.file)
+    if args.operation == 'sort':
+        result = bed.sort()
+    elif args.operation == 'merge':
+        result = bed.merge(distance=args.distance)
+    elif args.operation == 'complement':
+        result = bed.complement(read_genome(args.genome))
+    elif args.operation == 'closest':
+        result = bed.closest(BED(file=args.other))
+        result.to_csv(sys.stdout, sep='\t', header=False, index=False)
+        return
+    elif args.operation == 'intersect':
+        result = bed.intersect(BED(file=args.other), unique=args.unique,
+                               invert=args.invert)
+    else:
+        result = bed.subtract(BED(file=args.other))
+
+    result.write(sys.stdout)
+
+
+def read_genome(file):
+    """Read a genome file of chrom names and lengths.
+
+    Args:
+        file (str): The path/name of a tab-delimited file of chrom and
+                    length, such as a .fai or chrom.sizes file.
+
+    Returns:
+        A dictionary of chrom lengths in file order.
+    """
+
+    genome = {}
+    with _open(file) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) > 1:
+                genome[fields[0]] = int(fields[1])
+
+    return genome
+
+
+def iter_intervals(file):
+    """Iterate over the intervals of a BED file one line at a time.
+
+    Args:
+        file (str): The path/name of a BED file, which may be gzip
+                    compressed.
+
+    Yields:
+        A tuple of (chrom, start, end, ...) for each interval with
+        integer start and end and any other columns as strings.
+    """
+
+    with _open(file) as f:
+        for line in f:
+            if line.startswith(('#', 'track', 'browser')) or not line.strip():
+                continue
+            fields = line.rstrip('\n').split('\t')
+            fields[1] = int(fields[1])
+            fields[2] = int(fields[2])
+            yield tuple(fields)
+
+
+class BED(object):
+    """Catherpes BED is a Python class with methods for reading BED
+    data and for vectorized interval algebra.
+    """
+
+    def __init__(self, file=None, data=None):
+        """Args:
+            file (str)      : The path/name of a BED file, which may be
+                              gzip compressed.
+
+            data (DataFrame): Intervals to use instead of reading a
+                              file, with at least chrom, start and end
+                              columns.
+
+        """
+
+        self.file = file
+        self.headers = []
+        self._chroms = None
+
+        if file is not None:
+            self.data = self._parse(file=file)
+        elif data is not None:
+            self.data = data.reset_index(drop=True)
+        else:
+            self.data = pd.DataFrame({'chrom': pd.Series([], dtype=object),
+                                      'start': np.zeros(0, dtype=np.int64),
+                                      'end': np.zeros(0, dtype=np.int64)})
+
+    def __len__(self):
+        return len(self.data)
+
+    def chroms(self):
+        """Get the intervals grouped by chrom and sorted by start,
+        building and caching the arrays on first use.
+
+        Returns:
+            A dictionary keyed by chrom of (rows, starts, ends) arrays,
+            where rows are positions in the data attribute.
+        """
+
+        if self._chroms is None:
+            self._chroms = {}
+            starts = self.data['start'].to_numpy(dtype=np.int64)
+            ends = self.data['end'].to_numpy(dtype=np.int64)
+            (codes, uniques) = pd.factorize(
+                self.data['chrom'].to_numpy(dtype=object))
+            order = np.lexsort((ends, starts, codes))
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for (code, chrom) in enumerate(uniques):
+                rows = order[bounds[code]:bounds[code + 1]]
+                self._chroms[chrom] = (rows, starts[rows], ends[rows])
+
+        return self._chroms
+
+    def sort(self):
+        """Sort by chrom and then start and end.
+
+        Returns:
+            A new sorted BED object.
+        """
+
+        chroms = self.chroms()
+        rows = [chroms[chrom][0] for chrom in sorted(chroms)]
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+
+        return BED(data=self.data.iloc[rows])
+
+    def merge(self, distance=0):
+        """Merge overlapping or book-ended intervals.
+
+        Args:
+            distance (int): Also merge intervals separated by at most
+                            this many bases.
+
+        Returns:
+            A new BED object of chrom, start and end.
+        """
+
+        chroms = []
+        starts = []
+        ends = []
+        for (chrom, (rows, c_starts, c_ends)) in sorted(self.chroms().items()):
+            if len(rows) == 0:
+                continue
+            reach = np.maximum.accumulate(c_ends)
+            gaps = np.flatnonzero(c_starts[1:] > reach[:-1] + distance)
+            first = np.concatenate(([0], gaps + 1))
+            chroms.append(np.full(len(first), chrom, dtype=object))
+            starts.append(c_starts[first])
+            ends.append(np.maximum.reduceat(c_ends, first))
+
+        return _frame(chroms, starts, ends)
+
+    def overlaps(self, other):
+        """Find all overlapping pairs of intervals.
+
+        Args:
+            other (BED): The intervals to test against.
+
+        Returns:
+            A tuple of two equal length arrays (rows, other_rows) of
+            positions in the data of this and the other BED object.
+        """
+
+        data = other.data
+        index = IntervalIndex(data['chrom'].to_numpy(dtype=object),
+                              data['start'].to_numpy(dtype=np.int64),
+                              data['end'].to_numpy(dtype=np.int64) - 1)
+
+        return index.query_batch(self.data['chrom'].to_numpy(dtype=object),
+                                 self.data['start'].to_numpy(dtype=np.int64),
+                                 self.data['end'].to_numpy(dtype=np.int64) - 1)
+
+    def intersect(self, other, unique=False, invert=False):
+        """Intersect with another set of intervals.
+
+        Args:
+            other (BED)  : The intervals to intersect with.
+
+            unique (bool): Report each interval with any overlap once,
+                           unclipped (bedtools intersect -u).
+
+            invert (bool): Report the intervals with no overlap
+                           (bedtools intersect -v).
+
+        Returns:
+            A new BED object.  By default there is one interval per
+            overlapping pair, clipped to the overlap, with the other
+            columns of this object.
+        """
+
+        (rows, other_rows) = self.overlaps(other)
+        if unique or invert:
+            hit = np.zeros(len(self.data), dtype=bool)
+            hit[rows] = True
+            return BED(data=self.data[~hit if invert else hit])
+
+        data = self.data.iloc[rows].copy()
+        data['start'] = np.maximum(self.data['start'].to_numpy()[rows],
+                                   other.data['start'].to_numpy()[other_rows])
+        data['end'] = np.minimum(self.data['end'].to_numpy()[rows],
+                                 other.data['end'].to_numpy()[other_rows])
+
+        return BED(data=data)
+
+    def subtract(self, other):
+        """Remove the parts of each interval covered by another set of
+        intervals.
+
+        Args:
+            other (BED): The intervals to subtract.
+
+        Returns:
+            A new BED object with the remaining pieces of each interval
+            and the other columns of this object.
+        """
+
+        others = other.merge().chroms()
+        pieces_rows = []
+        pieces_starts = []
+        pieces_ends = []
+        for (chrom, (rows, starts, ends)) in self.chroms().items():
+            if chrom not in others:
+                pieces_rows.append(rows)
+                pieces_starts.append(starts)
+                pieces_ends.append(ends)
+                continue
+            (o_rows, o_starts, o_ends) = others[chrom]
+
+            # Merged intervals are disjoint and sorted, so those
+            # overlapping [start, end) are the run from lo to hi.
+            lo = np.searchsorted(o_ends, starts, side='right')
+            hi = np.searchsorted(o_starts, ends, side='left')
+            counts = np.maximum(hi - lo, 0) + 1
+            which = np.repeat(np.arange(len(rows)), counts)
+            j = (np.arange(counts.sum()) -
+                 np.repeat(np.cumsum(counts) - counts, counts))
+            k = lo[which] + j
+
+            last = max(len(o_ends) - 1, 0)
+            gap_starts = np.where(j == 0, starts[which],
+                                  o_ends[np.clip(k - 1, 0, last)])
+            gap_ends = np.where(j == counts[which] - 1, ends[which],
+                                o_starts[np.clip(k, 0, last)])
+            gap_starts = np.maximum(gap_starts, starts[which])
+            gap_ends = np.minimum(gap_ends, ends[which])
+            keep = gap_starts < gap_ends
+
+            pieces_rows.append(rows[which[keep]])
+            pieces_starts.append(gap_starts[keep])
+            pieces_ends.append(gap_ends[keep])
+
+        if not pieces_rows:
+            return BED()
+        rows = np.concatenate(pieces_rows)
+        data = self.data.iloc[rows].copy()
+        data['start'] = np.concatenate(pieces_starts)
+        data['end'] = np.concatenate(pieces_ends)
+
+        return BED(data=data).sort()
+
+    def complement(self, genome):
+        """Get the intervals of a genome not covered by any interval.
+
+        Args:
+            genome (dict): The length of each chrom, as returned by
+                           read_genome.
+
+        Returns:
+            A new BED object of chrom, start and end.
+        """
+
+        merged = self.merge().chroms()
+        chroms = []
+        starts = []
+        ends = []
+        for (chrom, length) in genome.items():
+            if chrom in merged:
+                (rows, m_starts, m_ends) = merged[chrom]
+            else:
+                m_starts = m_ends = np.zeros(0, dtype=np.int64)
+            g_starts = np.concatenate(([0], np.minimum(m_ends, length)))
+            g_ends = np.concatenate((np.minimum(m_starts, length), [length]))
+            keep = g_starts < g_ends
+            chroms.append(np.full(keep.sum(), chrom, dtype=object))
+            starts.append(g_starts[keep])
+            ends.append(g_ends[keep])
+
+        return _frame(chroms, starts, ends)
+
+    def closest(self, other):
+        """Find the closest interval in another set for each interval.
+        Overlapping intervals have a distance of 0; otherwise the
+        distance is the number of bases between the intervals plus one
+        as in bedtools closest -d.  Ties are broken by taking the
+        upstream interval.
+
+        Args:
+            other (BED): The intervals to search.
+
+        Returns:
+            A DataFrame with the columns of this object, the chrom,
+            start and end of the closest interval prefixed with 'b_',
+            its row in the other data as 'b_row' (-1 if the chrom has no
+            intervals) and the 'distance' (-1 if none).
+        """
+
+        b_row = np.full(len(self.data), -1, dtype=np.int64)
+        distance = np.full(len(self.data), -1, dtype=np.int64)
+
+        (rows, other_rows) = self.overlaps(other)
+        if len(rows):
+            first = np.concatenate(([True], rows[1:] != rows[:-1]))
+            b_row[rows[first]] = other_rows[first]
+            distance[rows[first]] = 0
+
+        others = other.chroms()
+        for (chrom, (a_rows, a_starts, a_ends)) in self.chroms().items():
+            if chrom not in others:
+                continue
+            (o_rows, o_starts, o_ends) = others[chrom]
+            open_rows = distance[a_rows] < 0
+            a_rows = a_rows[open_rows]
+            a_starts = a_starts[open_rows]
+            a_ends = a_ends[open_rows]
+
+            by_end = np.argsort(o_ends, kind='stable')
+            sorted_ends = o_ends[by_end]
+            up = np.searchsorted(sorted_ends, a_starts, side='right') - 1
+            down = np.searchsorted(o_starts, a_ends, side='left')
+
+            up_ok = up >= 0
+            down_ok = down < len(o_starts)
+            up_dist = np.where(up_ok,
+                               a_starts - sorted_ends[np.maximum(up, 0)] + 1,
+                               np.iinfo(np.int64).max)
+            nearest = o_starts[np.minimum(down, len(o_starts) - 1)]
+            down_dist = np.where(down_ok, nearest - a_ends + 1,
+                                 np.iinfo(np.int64).max)
+            use_up = up_dist <= down_dist
+            best = np.where(use_up,
+                            o_rows[by_end][np.maximum(up, 0)],
+                            o_rows[np.minimum(down, len(o_rows) - 1)])
+            found = up_ok | down_ok
+            b_row[a_rows[found]] = best[found]
+            distance[a_rows[found]] = np.minimum(up_dist, down_dist)[found]
+
+        result = self.data.copy()
+        has = b_row >= 0
+        for key in ('chrom', 'start', 'end'):
+            values = other.data[key].to_numpy()[np.maximum(b_row, 0)]
+            result['b_' + key] = pd.Series(values).where(has, None).to_numpy()
+        result['b_row'] = b_row
+        result['distance'] = distance
+
+        return result
+
+    def write(self, file):
+        """Write the intervals as BED text.
+
+        Args:
+            file: The path/name of the file to write or an open file
+                  handle.
+
+        Returns: No return value.
+        """
+
+        self.data.to_csv(file, sep='\t', header=False, index=False)
+
+    def _parse(self, file=None):
+        """
+        Parse a BED file.  Leading track, browser and comment lines
+        are kept in the headers attribute.
+
+        Args:
+            file: The path/name of the BED file to parse.
+
+        Returns:
+            A DataFrame with the standard BED column names.
+        """
+
+        with _open(file) as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.startswith(('#', 'track', 'browser')) or not line:
+                    break
+                self.headers.append(line.rstrip('\n'))
+            if not line:
+                return BED().data
+            f.seek(offset)
+            data = pd.read_csv(f, sep='\t', header=None, dtype={0: str})
+
+        data.columns = [COLUMNS[i] if i < len(COLUMNS) else i
+                        for i in range(len(data.columns))]
+
+        return data
+
+
+def _frame(chroms, starts, ends):
+    """Build a BED object from per chrom lists of arrays."""
+
+    if not chroms:
+        return BED()
+
+    return BED(data=pd.DataFrame({'chrom': np.concatenate(chroms),
+                                  'start': np.concatenate(starts),
+                                  'end': np.concatenate(ends)}))
+
+
+def _open(file):
+    """Open a text file that may be gzip compressed."""
+
+    with open(file, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(file, 'rt')
+    return open(file)
 
 if __name__ == "__main__":
     """ This is executed when run from the command line """
     parser = argparse.ArgumentParser()
 
-    # Required positional argument
-    parser.add_argument("arg", help="Required positional argument")
+    # Required positional arguments
+    parser.add_argument("operation",
+                        choices=['sort', 'merge', 'intersect', 'subtract',
+                                 'complement', 'closest'],
+                        help="The operation to run")
+    parser.add_argument("file", help="Required path/name of a BED file")
 
-    # Optional argument flag which defaults to False
-    parser.add_argument("-f", "--flag", action="store_true", default=False)
+    # Optional argument which requires a parameter (eg. -b other.bed)
+    parser.add_argument("-b", "--other", action="store", dest="other",
+                        help="The second BED file for intersect, subtract "
+                        "and closest")
 
-    # Optional argument which requires a parameter (eg. -d test)
-    parser.add_argument("-n", "--name", action="store", dest="name")
+    # Optional argument which requires a parameter (eg. -g hg38.fai)
+    parser.add_argument("-g", "--genome", action="store", dest="genome",
+                        help="A genome file of chrom lengths for complement")
 
-    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
-    parser.add_argument(
-        "-v",
-        "--verbose",
-        action="count",
-        default=0,
-        help="Verbosity (-v, -vv, etc)")
+    # Optional argument which requires a parameter (eg. -d 10)
+    parser.add_argument("-d", "--distance", action="store", type=int,
+                        default=0, help="Merge distance")
+
+    # Optional argument flags which default to False
+    parser.add_argument("-u", "--unique", action="store_true", default=False,
+                        help="Report intervals with any overlap once")
+    parser.add_argument("-v", "--invert", action="store_true", default=False,
+                        help="Report intervals with no overlap")
 
     # Specify output of "--version"
     parser.add_argument(
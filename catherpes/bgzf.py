@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+"""The catherpes bgzf.py module provides functions for working with
+BGZF (blocked gzip) compressed files such as those written by bgzip.
+
+A BGZF file is a series of gzip members (blocks) each holding at most
+64 KiB of uncompressed data, with the compressed size of each block
+stored in a 'BC' extra subfield of its gzip header.  This allows a
+file to be split on block boundaries and each piece decompressed
+independently.
+
+Example:
+    List the blocks in a bgzipped file::
+
+        $ python bgzf.py file.gff3.gz
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+MAGIC = b'\x1f\x8b\x08\x04'
+
+# The maximum amount of uncompressed data written to one block, as
+# used by bgzip.
+BLOCK_SIZE = 0xff00
+
+# The empty block that marks the end of a BGZF file.
+EOF = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43'
+       b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+
+def main(args):
+    """ Main entry point of the app """
+    print("catherpes/BGZF")
+    print(args)
+
+    for (offset, size) in iter_blocks(args.file):
+        print(offset, size, sep='\t')
+
+
+def is_bgzf(file):
+    """Test if a file is BGZF compressed.
+
+    Args:
+        file (str): The path/name of the file to test.
+
+    Returns:
+        True if the first block of the file has a BGZF header.
+    """
+
+    with open(file, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[0:4] != MAGIC:
+            return False
+        (xlen,) = struct.unpack('<H', header[10:12])
+        return _block_size(f.read(xlen)) is not None
+
+
+def iter_blocks(file):
+    """Iterate over the blocks of a BGZF file by reading only the
+    block headers.
+
+    Args:
+        file (str): The path/name of a BGZF file.
+
+    Yields:
+        A tuple of (offset, size) in compressed bytes for each block.
+    """
+
+    with open(file, 'rb') as f:
+        offset = 0
+        while True:
+            header = f.read(12)
+            if not header:
+                break
+            if len(header) < 12 or header[0:4] != MAGIC:
+                raise ValueError('Invalid BGZF block at offset '
+                                 '{} in {}'.format(offset, file))
+            (xlen,) = struct.unpack('<H', header[10:12])
+            size = _block_size(f.read(xlen))
+            if size is None:
+                raise ValueError('Missing BGZF block size at offset '
+                                 '{} in {}'.format(offset, file))
+            yield (offset, size)
+            offset += size
+            f.seek(offset)
+
+
+def decompress(data):
+    """Decompress a run of whole BGZF blocks.
+
+    Args:
+        data (bytes): The compressed bytes of one or more consecutive
+                      BGZF blocks.
+
+    Returns:
+        The uncompressed bytes.
+    """
+
+    chunks = []
+    offset = 0
+    while offset < len(data):
+        (xlen,) = struct.unpack('<H', data[offset + 10:offset + 12])
+        size = _block_size(data[offset + 12:offset + 12 + xlen])
+        cdata = data[offset + 12 + xlen:offset + size - 8]
+        chunks.append(zlib.decompress(cdata, -15))
+        offset += size
+
+    return b''.join(chunks)
+
+
+class BgzfReader(object):
+    """Catherpes BgzfReader is a Python class for reading lines from a
+    BGZF file with support for seeking to virtual file offsets.
+
+    A virtual offset is the compressed offset of a block shifted left
+    16 bits plus the offset of a byte within the uncompressed block.
+    """
+
+    def __init__(self, file):
+        """Args:
+            file (str): The path/name of a BGZF file.
+
+        """
+
+        self.file = file
+        self.fh = open(file, 'rb')
+        self.block = b''
+        self.block_offset = 0
+        self.next_offset = 0
+        self.pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            yield line
+
+    def close(self):
+        """Close the underlying file handle."""
+        self.fh.close()
+
+    def seek(self, voffset):
+        """Move to a virtual offset.
+
+        Args:
+            voffset (int): The virtual offset to move to.
+
+        Returns: No return value.
+        """
+
+        self._load(voffset >> 16)
+        self.pos = voffset & 0xFFFF
+
+    def tell(self):
+        """Get the current virtual offset.  A position at the end of a
+        block is reported as the start of the next block.
+
+        Returns:
+            The virtual offset of the next byte to be read.
+        """
+
+        if self.pos >= len(self.block):
+            return self.next_offset << 16
+        return (self.block_offset << 16) | self.pos
+
+    def readline(self):
+        """Read a single line, which may span several blocks.
+
+        Returns:
+            The bytes of the line including the trailing newline, or
+            an empty bytes object at the end of the file.
+        """
+
+        parts = []
+        while True:
+            if self.pos >= len(self.block):
+                if not self._load(self.next_offset):
+                    break
+                continue
+            i = self.block.find(b'\n', self.pos)
+            if i < 0:
+                parts.append(self.block[self.pos:])
+                self.pos = len(self.block)
+                continue
+            parts.append(self.block[self.pos:i + 1])
+            self.pos = i + 1
+            break
+
+        return b''.join(parts)
+
+    def _load(self, offset):
+        """Read and decompress the block at a compressed offset.
+
+        Args:
+            offset (int): The compressed offset of the block.
+
+        Returns:
+            False at the end of the file, otherwise True.
+        """
+
+        self.fh.seek(offset)
+        header = self.fh.read(12)
+        if len(header) < 12:
+            self.block = b''
+            self.pos = 0
+            return False
+        (xlen,) = struct.unpack('<H', header[10:12])
+        size = _block_size(self.fh.read(xlen))
+        if header[0:4] != MAGIC or size is None:
+            raise ValueError('Invalid BGZF block at offset '
+                             '{} in {}'.format(offset, self.file))
+        cdata = self.fh.read(size - 12 - xlen)
+        self.block = zlib.decompress(cdata[:-8], -15)
+        self.block_offset = offset
+        self.next_offset = offset + size
+        self.pos = 0
+
+        return True
+
+
+class BgzfWriter(object):
+    """Catherpes BgzfWriter is a Python class for writing BGZF files
+    that can be read by gzip, bgzip, tabix and catherpes.index.
+    """
+
+    def __init__(self, file, level=6, threads=1):
+        """Args:
+            file (str)   : The path/name of the file to write.
+
+            level (int)  : The zlib compression level.
+
+            threads (int): The number of threads used to compress
+                           blocks.  zlib releases the GIL so large
+                           writes are compressed in parallel.
+
+        """
+
+        self.file = file
+        self.level = level
+        self.fh = open(file, 'wb')
+        self.buffer = bytearray()
+        self.executor = None
+        if threads > 1:
+            self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        """Write data, compressing each full block as it fills.
+
+        Args:
+            data (str or bytes): The data to write.  Text is encoded
+                                 as UTF-8.
+
+        Returns: No return value.
+        """
+
+        if isinstance(data, str):
+            data = data.encode()
+        self.buffer += data
+        if len(self.buffer) >= BLOCK_SIZE:
+            full = len(self.buffer) - len(self.buffer) % BLOCK_SIZE
+            self._flush(self.buffer[:full])
+            del self.buffer[:full]
+
+    def close(self):
+        """Write any buffered data and the end of file marker and close
+        the file.
+        """
+
+        if self.fh.closed:
+            return
+        if self.buffer:
+            self._flush(self.buffer)
+            self.buffer = bytearray()
+        self.fh.write(EOF)
+        self.fh.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _flush(self, data):
+        """Compress and write data as whole blocks.
+
+        Args:
+            data (bytes): The data to write.
+
+        Returns: No return value.
+        """
+
+        if self.executor is None or len(data) <= BLOCK_SIZE:
+            self.fh.write(compress(data, self.level))
+            return
+
+        pieces = [data[i:i + BLOCK_SIZE]
+                  for i in range(0, len(data), BLOCK_SIZE)]
+        for block in self.executor.map(compress, pieces,
+                                       [self.level] * len(pieces)):
+            self.fh.write(block)
+
+
+def compress(data, level=6):
+    """Compress data into a run of BGZF blocks.
+
+    Args:
+        data (bytes): The data to compress.
+
+        level (int) : The zlib compression level.
+
+    Returns:
+        The bytes of the BGZF blocks (without an end of file marker).
+    """
+
+    blocks = []
+    for start in range(0, len(data), BLOCK_SIZE):
+        chunk = bytes(data[start:start + BLOCK_SIZE])
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        cdata = compressor.compress(chunk) + compressor.flush()
+        header = struct.pack('<4BIBBHBBHH', 31, 139, 8, 4, 0, 0, 255,
+                             6, 66, 67, 2, len(cdata) + 25)
+        trailer = struct.pack('<II', zlib.crc32(chunk), len(chunk))
+        blocks.append(header + cdata + trailer)
+
+    return b''.join(blocks)
+
+
+def _block_size(extra):
+    """Get the total block size from the gzip extra field of a BGZF
+    block header.
+
+    Args:
+        extra (bytes): The gzip header extra field.
+
+    Returns:
+        The size of the block in bytes or None if the extra field has
+        no BC subfield.
+    """
+
+    i = 0
+    while i + 4 <= len(extra):
+        (slen,) = struct.unpack('<H', extra[i + 2:i + 4])
+        if extra[i:i + 2] == b'BC' and slen == 2:
+            (bsize,) = struct.unpack('<H', extra[i + 4:i + 6])
+            return bsize + 1
+        i += 4 + slen
+
+    return None
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("file", help="Required path/name of a BGZF file")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
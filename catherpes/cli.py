@@ -1,16 +1,169 @@
 """Console script for catherpes."""
+import os
 import sys
 import click
 
 
-@click.command()
-def main(args=None):
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx, args=None):
     """Console script for catherpes."""
+    if ctx.invoked_subcommand is not None:
+        return 0
     click.echo("Replace this message by putting your code into "
                "catherpes.cli.main")
     click.echo("See click documentation at https://click.palletsprojects.com/")
     return 0
 
 
+@main.command()
+@click.argument('gff', type=click.Path(exists=True))
+@click.argument('vcfs', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False),
+              help='Write <name>.annotated.tsv per VCF here instead of '
+              'to standard output.')
+@click.option('-c', '--cache-dir', type=click.Path(file_okay=False),
+              help='Cache the parsed GFF3 file here for later runs.')
+def annotate(gff, vcfs, output_dir, cache_dir):
+    """Label VCF variants with overlapping gene model features."""
+    from catherpes.annotate import Annotator
+    from catherpes.gff import GFF
+
+    annotator = Annotator(GFF(file=gff, format='df', cache_dir=cache_dir))
+    _write_tables(vcfs, output_dir, _annotated_name, annotator.annotate_vcf)
+    return 0
+
+
+@main.command()
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.argument('store', type=click.Path(file_okay=False))
+@click.option('-w', '--workers', type=int, default=1, show_default=True,
+              help='The number of worker processes.')
+def viq(manifest, store, workers):
+    """Aggregate the VIQ outputs listed in a manifest into a store."""
+    from catherpes.viq import aggregate, read_manifest
+
+    status = aggregate(read_manifest(manifest), store, workers=workers)
+    for (key, samples) in status.items():
+        click.echo('{}\t{}'.format(key, len(samples)))
+    return 0
+
+
+@main.command('igv-junctions')
+@click.argument('sj', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', type=click.Path(dir_okay=False),
+              help='Write the BED file here instead of to standard output.')
+def igv_junctions(sj, output):
+    """Convert a STAR SJ.out.tab file to an IGV splice junction BED file."""
+    from catherpes.junctions import write_igv_junctions
+
+    write_igv_junctions(sj, output or sys.stdout)
+    return 0
+
+
+@main.command('annotate-junctions')
+@click.argument('gff', type=click.Path(exists=True))
+@click.argument('sjs', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False),
+              help='Write <name>.junctions.tsv per SJ.out.tab file here '
+              'instead of to standard output.')
+@click.option('-c', '--cache-dir', type=click.Path(file_okay=False),
+              help='Cache the parsed GFF3 file here for later runs.')
+def annotate_junctions(gff, sjs, output_dir, cache_dir):
+    """Label STAR junctions as known or novel against gene models."""
+    from catherpes.gff import GFF
+    from catherpes.junctions import JunctionAnnotator, sample_name
+
+    annotator = JunctionAnnotator(GFF(file=gff, format='df',
+                                      cache_dir=cache_dir))
+    _write_tables(sjs, output_dir,
+                  lambda sj: sample_name(sj) + '.junctions.tsv',
+                  annotator.annotate_sj)
+    return 0
+
+
+@main.command('junction-matrix')
+@click.argument('store', type=click.Path(file_okay=False))
+@click.argument('sjs', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('-m', '--manifest', type=click.Path(exists=True, dir_okay=False),
+              help='A file of sample IDs and SJ.out.tab paths to merge.')
+@click.option('-w', '--workers', type=int, default=1, show_default=True,
+              help='The number of worker processes.')
+def junction_matrix(store, sjs, manifest, workers):
+    """Merge STAR SJ.out.tab files into a junction by sample matrix."""
+    from catherpes.junctions import merge_junctions
+    from catherpes.viq import read_manifest
+
+    entries = list(sjs)
+    if manifest is not None:
+        entries.extend(read_manifest(manifest))
+    if not entries:
+        raise click.UsageError('Give SJ.out.tab files or a manifest.')
+
+    matrix = merge_junctions(entries, store, workers=workers)
+    click.echo('{} junctions in {} samples'.format(len(matrix),
+                                                   len(matrix.samples)))
+    return 0
+
+
+def _write_tables(files, output_dir, name, tables):
+    """Write the tables made from input files as tab-delimited text.
+
+    Args:
+        files (list)    : The input files.
+
+        output_dir (str): Write a file per input here, or None to write
+                          every table to standard output with one
+                          header.
+
+        name            : A function giving the output file name of an
+                          input file.
+
+        tables          : A function giving the DataFrame chunks of the
+                          table of an input file.
+
+    Returns: No return value.
+    """
+
+    if output_dir is None:
+        for (i, file) in enumerate(files):
+            _write_chunks(tables(file), sys.stdout, i == 0)
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    for file in files:
+        # Write to a temporary file and rename it into place so a
+        # failed run never leaves a truncated table.
+        path = os.path.join(output_dir, name(file))
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'w') as output:
+                _write_chunks(tables(file), output, True)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _write_chunks(chunks, output, header):
+    """Write DataFrame chunks to an open file, with a header first if
+    header is True.
+    """
+
+    for chunk in chunks:
+        chunk.to_csv(output, sep='\t', index=False, header=header)
+        header = False
+
+
+def _annotated_name(vcf):
+    """Get the output file name of an annotated VCF file."""
+
+    name = os.path.basename(vcf)
+    for extension in ('.gz', '.vcf'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name + '.annotated.tsv'
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
@@ -27,9 +27,22 @@ __license__ = "GNU GPL"
 
 import argparse
 import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 
+from catherpes import bgzf
+from catherpes import index
+from catherpes import store
+from catherpes.intervals import IntervalIndex
+from catherpes.utils import file_hash, find_attribute
+
 def main(args):
     """ Main entry point of the app """
     print("catherpes/GFF")
@@ -52,7 +65,11 @@ class GFF(object):
     manipulating GFF3 data.
     """
 
-    def __init__(self, file=None, format='dict'):
+    keys = ('seqid', 'source', 'type', 'start', 'end', 'score', 'strand', 'phase', 'attributes')
+
+    def __init__(self, file=None, format='dict', lazy=False, workers=1,
+                 region=None, cache_dir=None, types=None, seqids=None,
+                 attributes=None):
         """Args:
             file (str)  : The path/name of the GFF3 file to parse.
 
@@ -66,29 +83,498 @@ class GFF(object):
                           list: returns the data as a list-of-lists
 
                           object: returns the data as Catherpes
-                                  Feature objects. Not implimented
-                                  yet.
+                                  Feature objects.  The attributes
+                                  column is only decoded the first
+                                  time a Feature's attributes are
+                                  read.
 
-                          df: returns the data as a pandas
-                                  dataframe. Not implimented yet.
+                          df: returns the data as a columnar
+                              pandas dataframe.  Records are parsed
+                              directly into typed columns (int
+                              start/end, categorical seqid, source,
+                              type and strand) with ID, Name, Alias
+                              and Parent promoted to columns and the
+                              attributes column left as raw text.
 
                           xarray: returns the data as an Xarray.  Not
                                   implimented yet.
 
+            lazy (bool) : If True only the header lines at the top of
+                          the file are read and the data attribute is
+                          left empty.  Records are then streamed with
+                          constant memory from iter_records().
+
+            workers (int): The number of processes to use when parsing
+                           a bgzip compressed file.  The file is split
+                           on BGZF block boundaries and the pieces
+                           are parsed in a process pool and merged
+                           back in order.  Plain gzip files are
+                           always parsed serially.
+
+            region (str): Only load the records overlapping a region
+                          given as 'seqid', 'seqid:start' or
+                          'seqid:start-end' (1-based, inclusive).  If
+                          the file is bgzip compressed and indexed
+                          with catherpes.index.build_index only the
+                          blocks holding the region are read,
+                          otherwise the whole file is scanned.
+
+            cache_dir (str): A directory for a persistent cache of the
+                             parsed data (format='df' only).  The
+                             columns are saved as binary files keyed
+                             on the path, size, mtime and content hash
+                             of the GFF3 file, and later loads
+                             memory-map the numeric and categorical
+                             columns and decode the string columns
+                             instead of parsing.
+                             Entries for files that have changed are
+                             replaced automatically.
+
+            types       : Only load records with a type in this
+                          collection of feature types.
+
+            seqids      : Only load records with a seqid in this
+                          collection of seqids.
+
+            attributes (list): Only decode these attribute keys.  For
+                          the dict format the attributes dictionary
+                          holds just these keys and for the df format
+                          each key is added as a column.
+
+            The types, seqids and region filters are tested on the
+            split text of each line before any attributes are decoded
+            or a record is built.
+
         """
 
         # Define attributes
         self.file = file
         self.format = format
+        self.lazy = lazy
+        self.workers = workers
+        self.region = region
+        self.cache_dir = cache_dir
+        self.types = None if types is None else set(types)
+        self.seqids = None if seqids is None else set(seqids)
+        self.attributes = None if attributes is None else list(attributes)
         self.headers = []
         self.data = []
+        self._indexes = {}
+        self._ids = None
+        self._children = None
+        self._filter = _make_filter(self.types, self.seqids, self.region)
+        self._indexed = (file is not None and self.region is not None and
+                         os.path.exists(file + index.EXTENSION))
 
         # Parse file
-        self._parse(file=file)
+        if file is None:
+            return
+
+        # Records fetched through the index skip the header block, so
+        # it is read separately.  A full scan picks the headers up with
+        # the records.
+        if self.lazy or self._indexed:
+            self._parse_headers(file=file)
+        if self.lazy:
+            return
+
+        if self.cache_dir is not None:
+            if self.format != 'df':
+                raise ValueError("cache_dir requires format='df'")
+            if self._load_cache(file=file):
+                return
+
+        if self.workers > 1 and not self._indexed and bgzf.is_bgzf(file):
+            self._parse_parallel(file=file)
+        else:
+            self._parse(file=file)
 
         if self.format == 'pandas':
             self.data = pd.DataFrame(self.data)
 
+        if self.cache_dir is not None:
+            self._save_cache(file=file)
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def iter_records(self):
+        """Iterate over the GFF3 records in the file one at a time.
+
+        The file is re-read on each call, so only a single record is
+        held in memory at a time regardless of the size of the file.
+        Comment and directive lines are skipped and only the records
+        that pass the types, seqids and region filters are returned.
+
+        Yields:
+            A dictionary for each GFF3 record, or a Feature object if
+            the format is 'object'.
+        """
+
+        for line in self._lines(self.file):
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            values = line.split('\t')
+            if self._filter is None or self._filter(values):
+                yield self._parse_record(values)
+
+    def query(self, seqid, start, end, type=None):
+        """Find the features overlapping a region.
+
+        Args:
+            seqid (str): The seqid of the region.
+
+            start (int): The 1-based start of the region.
+
+            end (int)  : The 1-based end of the region (inclusive).
+
+            type       : A feature type or collection of feature types
+                         to restrict the search to.
+
+        Returns:
+            The overlapping records ordered by start, as a list or a
+            DataFrame depending on the format.
+        """
+
+        return self._records(self._index(type).query(seqid, start, end))
+
+    def query_batch(self, seqids, starts, ends, type=None):
+        """Find the features overlapping each of a batch of regions.
+        This is much faster than calling query() in a loop for large
+        numbers of regions.
+
+        Args:
+            seqids (array-like): The seqid of each region.
+
+            starts (array-like): The 1-based start of each region.
+
+            ends (array-like)  : The 1-based end of each region.
+
+            type               : A feature type or collection of
+                                 feature types to restrict the search
+                                 to.
+
+        Returns:
+            A tuple of two equal length arrays (query_idx, record_idx)
+            with one entry per overlapping pair.  record_idx holds
+            positions in the data attribute.
+        """
+
+        return self._index(type).query_batch(seqids, starts, ends)
+
+    def get(self, id):
+        """Get a feature by its ID.  For features that span several
+        lines with the same ID (such as CDS) the first line is
+        returned.
+
+        Args:
+            id (str): The value of the ID attribute.
+
+        Returns:
+            The record, or None if there is no feature with the ID.
+        """
+
+        self._link()
+        i = self._ids.get(id)
+        if i is None:
+            return None
+        if isinstance(self.data, pd.DataFrame):
+            return self.data.iloc[i]
+        return self.data[i]
+
+    def children(self, id):
+        """Get the features that have an ID as a Parent.
+
+        Args:
+            id (str): The value of the ID attribute of the parent.
+
+        Returns:
+            The child records in file order, as a list or a DataFrame
+            depending on the format.
+        """
+
+        self._link()
+        return self._records(self._children.get(id, []))
+
+    def descendants(self, id, type=None):
+        """Get all of the features below an ID in the feature
+        hierarchy, for example all exons of a gene.
+
+        Args:
+            id (str): The value of the ID attribute of the ancestor.
+
+            type    : A feature type or collection of feature types to
+                      restrict the results to.
+
+        Returns:
+            The descendant records in file order, as a list or a
+            DataFrame depending on the format.
+        """
+
+        self._link()
+        ids = self._column('ID')
+
+        found = set()
+        seen = {id}
+        stack = [id]
+        while stack:
+            for i in self._children.get(stack.pop(), []):
+                found.add(i)
+                child = ids[i]
+                if isinstance(child, str) and child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+
+        found = np.array(sorted(found), dtype=np.int64)
+        if type is not None:
+            types = [type] if isinstance(type, str) else list(type)
+            found = found[np.isin(self._column('type')[found], types)]
+
+        return self._records(found)
+
+    def to_frame(self):
+        """Get the data as a columnar DataFrame in the same layout as
+        the df format, with the attributes column as GFF3 text.
+
+        Returns:
+            A DataFrame.  For the df format this is the data attribute
+            itself rather than a copy.
+        """
+
+        if self.format == 'df':
+            return self.data
+
+        columns = self._columns(force=True)
+        records = self.data
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict('records')
+        for record in records:
+            if isinstance(record, Feature):
+                attrb_text = (record._attrb_text if record._attributes is None
+                              else _encode_attributes(record._attributes))
+            else:
+                attrb_text = _encode_attributes(record['attributes'])
+            columns.append([str(record[key]) for key in self.keys[:-1]] +
+                           [attrb_text])
+
+        return columns.to_frame()
+
+    def introns(self):
+        """Get the introns between consecutive exons of each
+        transcript.  Exons with several comma-separated Parent IDs
+        count towards each parent.
+
+        Returns:
+            A DataFrame with seqid, start, end, strand and Parent
+            columns and one row per intron, with GFF3 (1-based
+            inclusive) coordinates, sorted by Parent and start.
+        """
+
+        df = self.to_frame()
+        df = df[df['type'] == 'exon']
+        exons = pd.DataFrame({
+            'seqid': df['seqid'].to_numpy(dtype=object),
+            'start': df['start'].to_numpy(dtype=np.int64),
+            'end': df['end'].to_numpy(dtype=np.int64),
+            'strand': df['strand'].to_numpy(dtype=object),
+            'Parent': df['Parent'].astype(object).str.split(',')})
+        exons = exons.explode('Parent').dropna(subset=['Parent'])
+        exons = exons.sort_values(['Parent', 'start'], kind='stable')
+
+        parents = exons['Parent'].to_numpy(dtype=object)
+        starts = exons['end'].to_numpy(dtype=np.int64)[:-1] + 1
+        ends = exons['start'].to_numpy(dtype=np.int64)[1:] - 1
+        keep = (parents[1:] == parents[:-1]) & (starts <= ends)
+
+        return pd.DataFrame({'seqid': exons['seqid'].to_numpy()[:-1][keep],
+                             'start': starts[keep],
+                             'end': ends[keep],
+                             'strand': exons['strand'].to_numpy()[:-1][keep],
+                             'Parent': parents[:-1][keep]})
+
+    def _link(self):
+        """Build the ID to record map and the Parent to children
+        adjacency lists from the promoted ID and Parent columns in a
+        single pass on first use.  Parent values with several
+        comma-separated IDs link the record to each of them.
+
+        Returns: No return value.
+        """
+
+        if self._ids is not None:
+            return
+
+        self._ids = {}
+        self._children = {}
+        ids = self._column('ID')
+        parents = self._column('Parent')
+        for i in range(len(ids)):
+            id = ids[i]
+            if isinstance(id, str) and id not in self._ids:
+                self._ids[id] = i
+            parent = parents[i]
+            if isinstance(parent, str):
+                for pid in parent.split(','):
+                    self._children.setdefault(pid, []).append(i)
+
+    def _index(self, type=None):
+        """Get the interval index for a set of feature types, building
+        and caching it on first use.
+
+        Args:
+            type: A feature type or collection of feature types, or
+                  None for all features.
+
+        Returns:
+            An IntervalIndex whose positions refer to the data
+            attribute.
+        """
+
+        types = None
+        if type is not None:
+            types = frozenset([type] if isinstance(type, str) else type)
+
+        if types not in self._indexes:
+            seqids = self._column('seqid')
+            starts = self._column('start')
+            ends = self._column('end')
+            if types is None:
+                self._indexes[types] = IntervalIndex(seqids, starts, ends)
+            else:
+                members = np.flatnonzero(np.isin(self._column('type'),
+                                                 list(types)))
+                self._indexes[types] = _SubsetIndex(
+                    members,
+                    IntervalIndex(seqids[members], starts[members],
+                                  ends[members]))
+
+        return self._indexes[types]
+
+    def _column(self, key):
+        """Get a column of the data as a numpy array regardless of the
+        format.
+
+        Args:
+            key: The name of the column.
+
+        Returns:
+            An int64 array for start and end, otherwise an object array.
+        """
+
+        if isinstance(self.data, pd.DataFrame):
+            values = self.data[key].to_numpy()
+        else:
+            values = [record[key] for record in self.data]
+
+        if key in ('start', 'end'):
+            return np.asarray(values, dtype=np.int64)
+        return np.asarray(values, dtype=object)
+
+    def _records(self, indices):
+        """Get the records at a set of positions in the data.
+
+        Args:
+            indices: An array of positions in the data attribute.
+
+        Returns:
+            A list of records or a DataFrame depending on the format.
+        """
+
+        if isinstance(self.data, pd.DataFrame):
+            return self.data.iloc[indices]
+        return [self.data[i] for i in indices]
+
+    def _cache_path(self, file=None):
+        """Get the cache entry directory for a file and the load
+        options that change the parsed data.
+
+        Args:
+            file: The path/name of the GFF3 file.
+
+        Returns:
+            The path of the cache entry directory.
+        """
+
+        key = json.dumps([os.path.abspath(file), self.region,
+                          sorted(self.types or []), sorted(self.seqids or []),
+                          self.attributes])
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+        return os.path.join(self.cache_dir, digest)
+
+    def _load_cache(self, file=None):
+        """Load the data and headers from the cache if a valid entry
+        exists.  An entry is valid if the size and mtime of the file
+        are unchanged, or if only the mtime has changed and the content
+        hash still matches, in which case the new mtime is recorded so
+        later loads skip the hash.  Invalid entries are removed.
+
+        Args:
+            file: The path/name of the GFF3 file.
+
+        Returns:
+            True if the data was loaded from the cache.
+        """
+
+        path = self._cache_path(file)
+        try:
+            meta = store.read_meta(path)['meta']
+            source = meta['source']
+        except (OSError, ValueError, KeyError):
+            return False
+
+        stat = os.stat(file)
+        if source['size'] != stat.st_size:
+            valid = False
+        elif source['mtime'] == stat.st_mtime_ns:
+            valid = True
+        else:
+            valid = source['hash'] == file_hash(file)
+            if valid:
+                source['mtime'] = stat.st_mtime_ns
+                try:
+                    store.write_meta(path, meta)
+                except OSError:
+                    pass
+
+        if not valid:
+            shutil.rmtree(path, ignore_errors=True)
+            return False
+
+        (self.data, meta) = store.load_frame(path)
+        self.headers = meta['headers']
+
+        return True
+
+    def _save_cache(self, file=None):
+        """Save the data and headers to the cache.  The entry is
+        written to a temporary directory and renamed into place so
+        that other processes never see a partial entry.
+
+        Args:
+            file: The path/name of the GFF3 file.
+
+        Returns: No return value.
+        """
+
+        path = self._cache_path(file)
+        stat = os.stat(file)
+        source = {'path': os.path.abspath(file),
+                  'size': stat.st_size,
+                  'mtime': stat.st_mtime_ns,
+                  'hash': file_hash(file)}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.cache_dir)
+        store.save_frame(self.data, tmp,
+                         meta={'source': source, 'headers': self.headers})
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+
     def _parse(self, file=None):
         """
         Parse a GFF3 file.
@@ -100,19 +586,178 @@ class GFF(object):
             A catherpes/GFF3 object.
         """
 
-        keys = ('seqid', 'source', 'type', 'start', 'end', 'score', 'strand', 'phase', 'attributes') 
-        
+        columns = self._columns()
+
+        for line in self._lines(file):
+            self._add_line(line, columns)
+
+        if columns is not None:
+            self.data = columns.to_frame()
+
+    def _parse_parallel(self, file=None):
+        """
+        Parse a bgzip compressed GFF3 file in a process pool.
+
+        The BGZF blocks of the file are grouped into chunks which are
+        decompressed and parsed by _parse_chunk.  Lines that straddle
+        a chunk boundary are returned unparsed and stitched back
+        together here.
+
+        Args:
+            file: The path/name of the GFF3 file to parse.
+
+        Returns: No return value.
+        """
+
+        blocks = list(bgzf.iter_blocks(file))
+        size = sum(block[1] for block in blocks)
+        chunk_size = max(1, size // (self.workers * 4))
+
+        chunks = []
+        for (offset, length) in blocks:
+            if chunks and chunks[-1][1] - chunks[-1][0] < chunk_size:
+                chunks[-1][1] = offset + length
+            else:
+                chunks.append([offset, offset + length])
+
+        columns = self._columns()
+        pending = b''
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            options = {'format': self.format, 'region': self.region,
+                       'types': self.types, 'seqids': self.seqids,
+                       'attributes': self.attributes}
+            results = executor.map(_parse_chunk,
+                                   [file] * len(chunks),
+                                   [chunk[0] for chunk in chunks],
+                                   [chunk[1] for chunk in chunks],
+                                   [options] * len(chunks))
+            for (head, headers, data, tail) in results:
+                if head is None:
+                    pending += tail
+                    continue
+                self._add_line((pending + head).decode(), columns)
+                self.headers.extend(headers)
+                if columns is not None:
+                    columns.extend(data)
+                else:
+                    self.data.extend(data)
+                pending = tail
+
+        if pending:
+            self._add_line(pending.decode(), columns)
+
+        if columns is not None:
+            self.data = columns.to_frame()
+
+    def _lines(self, file=None):
+        """Iterate over the lines of a GFF3 file, or only the records
+        overlapping the region if one was given.
+
+        Args:
+            file: The path/name of the GFF3 file.
+
+        Yields:
+            Each line of text.  Records outside of the region may
+            still be returned if the file is not indexed.
+        """
+
+        if self._indexed:
+            yield from index.fetch(file, self.region, preset='gff')
+            return
+
+        with gzip.open(file, 'rt') as f:
+            yield from f
+
+    def _add_line(self, line, columns=None):
+        """Parse a line of GFF3 text and add it to the headers or data.
+
+        Args:
+            line: A line of GFF3 text.
+
+            columns: A _Columns object to append records to when
+                     building a columnar DataFrame.
+
+        Returns: No return value.
+        """
+
+        line = line.rstrip()
+        if not line:
+            return
+        if line.startswith('#'):
+            self.headers.append(line)
+            return
+
+        values = line.split('\t')
+        if self._filter is not None and not self._filter(values):
+            return
+        if columns is not None:
+            columns.append(values)
+        else:
+            self.data.append(self._parse_record(values))
+
+    def _columns(self, force=False):
+        """Get a _Columns object to parse into for the df format.
+
+        Args:
+            force: Return a _Columns object whatever the format.
+
+        Returns:
+            A _Columns object, or None for the other formats.
+        """
+
+        if self.format != 'df' and not force:
+            return None
+        return _Columns(attributes=self.attributes)
+
+    def _parse_headers(self, file=None):
+        """
+        Parse only the block of header lines at the top of a GFF3
+        file, stopping at the first record.
+
+        Args:
+            file: The path/name of the GFF3 file to parse.
+
+        Returns: No return value.
+        """
+
         with gzip.open(file, 'rt') as f:
             for line in f:
                 line = line.rstrip()
-                if line.startswith('#'):
-                    self.headers.append(line)
-                else:
-                    values = line.split('\t')
-                    record = dict(zip(keys, values))
-                    record['attributes'] = self._parse_attributes(record['attributes'])
-                    self._promote_attributes(record)
-                    self.data.append(record)
+                if not line:
+                    continue
+                if not line.startswith('#'):
+                    break
+                self.headers.append(line)
+
+    def _parse_record(self, values):
+        """Parse a single line of GFF3 text into a record.
+
+        Args:
+            values: The tab-split columns of a GFF3 record line.
+
+        Returns:
+            A dictionary for the record, or a Feature object if the
+            format is 'object'.
+        """
+
+        if self.format == 'object':
+            return Feature(values)
+
+        record = dict(zip(self.keys, values))
+        attrb_text = record['attributes']
+        if self.attributes is None:
+            record['attributes'] = self._parse_attributes(attrb_text)
+            self._promote_attributes(record)
+        else:
+            record['attributes'] = {}
+            for key in self.attributes:
+                value = find_attribute(attrb_text, key + '=')
+                if value is not None:
+                    record['attributes'][key] = value
+            (record['ID'], record['Name'],
+             record['Alias'], record['Parent']) = _promote(attrb_text)
+
+        return record
 
     def _parse_attributes(self, attrb_text):
         """Parse attribures in a GFF3 record.
@@ -126,14 +771,8 @@ class GFF(object):
             A dictionary of attributes.
 
         """
-        
-        attrbs = {}
-        for pair in attrb_text.split(';'):
-            (key, value) = pair.split('=')
-            value = True if value is None else value
-            attrbs[key] = value
 
-        return attrbs
+        return _decode_attributes(attrb_text)
 
     def _promote_attributes(self, record):
         """Promote a key subset of GFF3 attributes to primary level
@@ -152,6 +791,341 @@ class GFF(object):
             else:
                 record[attr] = None
 
+
+class Feature(object):
+    """Catherpes Feature is a compact Python class for a single GFF3
+    record.  The attributes column is kept as raw text and decoded
+    into a dictionary only the first time the attributes property is
+    read, while ID, Name, Alias and Parent are pulled out of the text
+    directly when the Feature is created.
+
+    Fields can also be read with item access (feature['start']) in the
+    same way as the records of the 'dict' format.
+    """
+
+    __slots__ = ('seqid', 'source', 'type', 'start', 'end', 'score',
+                 'strand', 'phase', 'ID', 'Name', 'Alias', 'Parent',
+                 '_attrb_text', '_attributes')
+
+    def __init__(self, values):
+        """Args:
+            values (list): The nine tab-split GFF3 columns.
+
+        """
+
+        (self.seqid, self.source, self.type, start, end,
+         self.score, self.strand, self.phase, self._attrb_text) = values
+        self.start = int(start)
+        self.end = int(end)
+        (self.ID, self.Name, self.Alias,
+         self.Parent) = _promote(self._attrb_text)
+        self._attributes = None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return 'Feature({}:{}-{} {} {})'.format(self.seqid, self.start,
+                                                self.end, self.type,
+                                                self.ID)
+
+    def __eq__(self, other):
+        if not isinstance(other, Feature):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key)
+                   for key in self.__slots__[:-1])
+
+    @property
+    def attributes(self):
+        """The dictionary of decoded attributes."""
+        if self._attributes is None:
+            self._attributes = _decode_attributes(self._attrb_text)
+        return self._attributes
+
+
+def _decode_attributes(attrb_text):
+    """Decode the text of a GFF3 attributes column.
+
+    Args:
+        attrb_text (str): The attributes column text.  Pairs of
+                          'key=value' are separated by ';' and keys
+                          without a value are set to True.
+
+    Returns:
+        A dictionary of attributes.
+    """
+
+    attrbs = {}
+    if attrb_text == '.':
+        return attrbs
+
+    for pair in attrb_text.split(';'):
+        if not pair:
+            continue
+        (key, sep, value) = pair.partition('=')
+        attrbs[key] = value if sep else True
+
+    return attrbs
+
+
+def _encode_attributes(attrbs):
+    """Encode a dictionary of attributes as GFF3 attributes column
+    text, the reverse of _decode_attributes.
+
+    Args:
+        attrbs (dict): The attributes.
+
+    Returns:
+        The attributes column text.
+    """
+
+    if not attrbs:
+        return '.'
+
+    return ';'.join(key if value is True else key + '=' + value
+                    for (key, value) in attrbs.items())
+
+
+def _promote(attrb_text):
+    """Pull the ID, Name, Alias and Parent values out of the text of
+    a GFF3 attributes column without decoding the rest of it.
+
+    Args:
+        attrb_text (str): The attributes column text.
+
+    Returns:
+        A tuple of (ID, Name, Alias, Parent) with None for missing
+        values.
+    """
+
+    return (find_attribute(attrb_text, 'ID='),
+            find_attribute(attrb_text, 'Name='),
+            find_attribute(attrb_text, 'Alias='),
+            find_attribute(attrb_text, 'Parent='))
+
+
+class _SubsetIndex(object):
+    """Wrap an IntervalIndex built over a subset of the GFF records so
+    that query results refer to positions in the full data.
+    """
+
+    def __init__(self, members, index):
+        self.members = members
+        self.index = index
+
+    def query(self, seqid, start, end):
+        return self.members[self.index.query(seqid, start, end)]
+
+    def query_batch(self, seqids, starts, ends):
+        (query_idx, interval_idx) = self.index.query_batch(seqids, starts,
+                                                           ends)
+        return (query_idx, self.members[interval_idx])
+
+
+def _make_filter(types, seqids, region):
+    """Build a predicate that tests the split text of a GFF3 record
+    against the types, seqids and region filters.
+
+    Args:
+        types (set)  : The feature types to keep, or None.
+
+        seqids (set) : The seqids to keep, or None.
+
+        region (str) : The region to keep records overlapping, or None.
+
+    Returns:
+        A function taking the list of split columns and returning True
+        if the record should be kept, or None if there are no filters.
+    """
+
+    if types is None and seqids is None and region is None:
+        return None
+
+    (r_seqid, r_start, r_end) = (None, None, None)
+    if region is not None:
+        (r_seqid, r_start, r_end) = index.parse_region(region)
+
+    def keep(values):
+        if types is not None and values[2] not in types:
+            return False
+        if seqids is not None and values[0] not in seqids:
+            return False
+        if r_seqid is not None and (values[0] != r_seqid or
+                                    int(values[3]) > r_end or
+                                    int(values[4]) < r_start):
+            return False
+        return True
+
+    return keep
+
+
+def _parse_chunk(file, start, end, options):
+    """Decompress and parse a run of BGZF blocks from a GFF3 file.
+    This is run in a worker process by GFF._parse_parallel.
+
+    Args:
+        file (str)  : The path/name of the GFF3 file.
+
+        start (int) : The offset of the first block in the chunk.
+
+        end (int)   : The offset just past the last block in the chunk.
+
+        options (dict): The format and filter arguments passed to GFF.
+
+    Returns:
+        A tuple of (head, headers, data, tail) where head is the bytes
+        up to and including the first newline (None if the chunk has
+        no newline), tail is the bytes after the last newline and
+        headers and data are the parsed lines in between.
+    """
+
+    with open(file, 'rb') as f:
+        f.seek(start)
+        text = bgzf.decompress(f.read(end - start))
+
+    first = text.find(b'\n')
+    if first < 0:
+        return (None, [], [], text)
+    last = text.rfind(b'\n')
+
+    gff = GFF(**options)
+    columns = gff._columns()
+    for line in text[first + 1:last + 1].decode().splitlines():
+        gff._add_line(line, columns)
+
+    data = columns if columns is not None else gff.data
+    return (text[:first + 1], gff.headers, data, text[last + 1:])
+
+
+class _Columns(object):
+    """Accumulate GFF3 records as typed columns without building a
+    per-record dictionary.  Categorical columns are stored as integer
+    codes into a per-column category table while parsing.
+    """
+
+    categorical = ('seqid', 'source', 'type', 'strand')
+    promoted = ('ID', 'Name', 'Alias', 'Parent')
+
+    def __init__(self, attributes=None):
+        """Args:
+            attributes (list): Extra attribute keys to add as columns.
+
+        """
+
+        self.codes = {key: array('i') for key in self.categorical}
+        self.categories = {key: {} for key in self.categorical}
+        self.start = array('q')
+        self.end = array('q')
+        self.score = array('d')
+        self.phase = array('b')
+        self.attributes = []
+        self.extra = [key for key in attributes or []
+                      if key not in self.promoted]
+        self.values = {key: [] for key in self.promoted}
+        for key in self.extra:
+            self.values[key] = []
+
+    def __len__(self):
+        return len(self.start)
+
+    def append(self, values):
+        """Append a single GFF3 record.
+
+        Args:
+            values: The list of the nine tab-split GFF3 columns.
+
+        Returns: No return value.
+        """
+
+        (seqid, source, type, start, end,
+         score, strand, phase, attrb_text) = values
+
+        for key, value in (('seqid', seqid), ('source', source),
+                           ('type', type), ('strand', strand)):
+            categories = self.categories[key]
+            code = categories.get(value)
+            if code is None:
+                code = categories[value] = len(categories)
+            self.codes[key].append(code)
+
+        self.start.append(int(start))
+        self.end.append(int(end))
+        self.score.append(np.nan if score == '.' else float(score))
+        self.phase.append(-1 if phase == '.' else int(phase))
+        self.attributes.append(attrb_text)
+
+        (ID, Name, Alias, Parent) = _promote(attrb_text)
+        self.values['ID'].append(ID)
+        self.values['Name'].append(Name)
+        self.values['Alias'].append(Alias)
+        self.values['Parent'].append(Parent)
+        for key in self.extra:
+            self.values[key].append(find_attribute(attrb_text, key + '='))
+
+    def extend(self, other):
+        """Append all of the records from another _Columns object.
+
+        Args:
+            other: The _Columns object to append.
+
+        Returns: No return value.
+        """
+
+        for key in self.categorical:
+            categories = self.categories[key]
+            mapping = []
+            for value in other.categories[key]:
+                code = categories.get(value)
+                if code is None:
+                    code = categories[value] = len(categories)
+                mapping.append(code)
+            codes = np.frombuffer(other.codes[key], dtype=np.int32)
+            if len(codes):
+                codes = np.asarray(mapping, dtype=np.int32)[codes]
+                self.codes[key].frombytes(codes.tobytes())
+
+        self.start.extend(other.start)
+        self.end.extend(other.end)
+        self.score.extend(other.score)
+        self.phase.extend(other.phase)
+        self.attributes.extend(other.attributes)
+        for key in self.values:
+            self.values[key].extend(other.values[key])
+
+    def to_frame(self):
+        """Convert the accumulated columns to a pandas DataFrame.
+
+        Returns:
+            A DataFrame with the GFF3 columns followed by the promoted
+            attribute columns.
+        """
+
+        end = np.frombuffer(self.end, dtype=np.int64)
+        dtype = np.int32 if len(end) == 0 or end.max() < 2**31 else np.int64
+
+        data = {}
+        for key in GFF.keys:
+            if key in self.categorical:
+                data[key] = pd.Categorical.from_codes(
+                    np.frombuffer(self.codes[key], dtype=np.int32),
+                    categories=list(self.categories[key]))
+            elif key in ('start', 'end'):
+                data[key] = np.frombuffer(getattr(self, key),
+                                          dtype=np.int64).astype(dtype)
+            elif key == 'score':
+                data[key] = np.frombuffer(self.score, dtype=np.float64)
+            elif key == 'phase':
+                data[key] = np.frombuffer(self.phase, dtype=np.int8)
+            else:
+                data[key] = self.attributes
+        for key in self.values:
+            data[key] = self.values[key]
+
+        return pd.DataFrame(data)
+
 if __name__ == "__main__":
     """ This is executed when run from the command line """
     parser = argparse.ArgumentParser()
@@ -0,0 +1,680 @@
+#!/usr/bin/env python3
+
+"""The catherpes hpo.py module provides a class for querying the Human
+Phenotype Ontology (HPO).
+
+The terms and is-a edges are read from the hp.json release file and
+trimmed to the 'Phenotypic abnormality' (HP:0000118) subgraph.  The
+ancestor closure of every term is computed once, a level of the
+ontology at a time, and kept as a bitset matrix with one row per term
+and one bit per term (about 40 MB for the full ontology).  A term's
+row has a bit set for itself and for each of its ancestors, so
+ancestor sets, subgraph membership and leaf detection for any group of
+terms are bit operations on a few rows rather than graph traversals.
+
+The top level branches (the children of the root) above each term are
+read off the closure once.  The number of edges from each term up to
+each of its ancestors is built a level at a time on first use and kept,
+so the distance between any two terms through their common ancestors
+is a merge of two short sorted lists, done for whole arrays of pairs.
+
+A Resnik engine adds an information content (IC) table, usually from
+term_counts of the phenotype_to_genes.txt annotations, and finds the
+most informative common ancestor (MICA) of blocks of term pairs.  The
+ancestor lists of the two terms of each pair are joined once, giving
+both the common ancestors, whose IC and depth pick the MICA, and the
+distance through each of them.
+
+Example:
+    Get the ancestors and leaves of a proband's terms::
+
+        ontology = Ontology('hp.json')
+        ancestors = ontology.ancestors(['HP:0001250', 'HP:0001263'])
+        leaves = ontology.leaves(ancestors)
+
+    Score proband terms against gene terms::
+
+        resnik = Resnik(ontology, term_counts(annotations)['ic'])
+        matches = resnik.mica(proband_terms, gene_terms)
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import gzip
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+ROOT = 'HP:0000118'
+BLOCK_SIZE = 1024
+UNREACHED = np.iinfo(np.int16).max
+
+
+def main(args):
+    """ Main entry point of the app """
+    print("catherpes/HPO")
+    print(args)
+
+    ontology = Ontology(args.file)
+    print('{} terms below {}'.format(len(ontology), ontology.root))
+    if args.terms:
+        terms = args.terms.split(',')
+        for term in ontology.leaves(ontology.ancestors(terms)):
+            print('{}\t{}'.format(term, ontology.labels[ontology.index[term]]))
+
+
+def read_json(file):
+    """Read the terms and edges of an HPO release.
+
+    Args:
+        file (str): The path/name of the hp.json file, which may be
+                    gzip compressed.
+
+    Returns:
+        A tuple of (terms, edges) where terms is a dictionary of HP ID
+        to a dictionary with the term label and definition and edges is
+        a list of (parent, child) HP ID tuples.
+    """
+
+    with _open(file) as f:
+        data = json.load(f)
+    graph = data['graphs'][0]
+
+    terms = {}
+    for node in graph['nodes']:
+        id = _term_id(node['id'])
+        if not id.startswith('HP:'):
+            continue
+        definition = node.get('meta', {}).get('definition', {})
+        definition = definition.get('val', 'No definition')
+        terms[id] = {'term': node.get('lbl'), 'definition': definition}
+
+    edges = []
+    for edge in graph['edges']:
+        (child, parent) = (_term_id(edge['sub']), _term_id(edge['obj']))
+        if child.startswith('HP:') and parent.startswith('HP:'):
+            edges.append((parent, child))
+
+    return (terms, edges)
+
+
+def term_counts(annotations, root=ROOT):
+    """Get the frequency and information content of annotated terms.
+
+    Args:
+        annotations (DataFrame): Annotations with id and gene columns,
+                                 such as phenotype_to_genes.txt read
+                                 with the catherpes.tsv schema.
+
+        root (str)             : The root term, which is given the total
+                                 count and an information content of 0.
+
+    Returns:
+        A DataFrame indexed by HP ID with the count of genes annotated
+        to each term, its frequency among all annotations and its
+        information content, -log10(freq).
+    """
+
+    ids = annotations[['id', 'gene']].astype(object).drop_duplicates()['id']
+    counts = ids.value_counts()
+    counts.index = counts.index.rename('id')
+    df = pd.DataFrame({'count': counts})
+    df['freq'] = df['count'] / df['count'].sum()
+    df['ic'] = -1 * np.log10(df['freq'])
+    df.loc[root] = [df['count'].sum(), 1, 0]
+
+    return df
+
+
+class Ontology(object):
+    """Catherpes Ontology is a Python class for the terms below one
+    root of the HPO with a precomputed ancestor closure.
+
+    Terms are numbered in sorted HP ID order.  The parents and children
+    attributes are (indptr, indices) arrays in compressed sparse row
+    form and the closure attribute is a packed uint8 bit matrix where
+    bit j of row i (little-endian within each byte) is set if term j
+    is term i or one of its ancestors.  The top_levels attribute holds
+    the top level branches of each term in the same (indptr, indices)
+    form and branch the first of them, -1 for the root.
+    """
+
+    def __init__(self, file=None, terms=None, edges=None, root=ROOT):
+        """Args:
+            file (str)   : The path/name of an hp.json file.
+
+            terms (dict) : HP ID to label and definition dictionaries as
+                           from read_json, instead of a file.
+
+            edges (list) : (parent, child) HP ID tuples, instead of a
+                           file.
+
+            root (str)   : Only keep this term and its descendants.
+
+        """
+
+        if file is not None:
+            (terms, edges) = read_json(file)
+        terms = terms or {}
+        edges = edges or []
+
+        names = sorted(set(terms) | {id for edge in edges for id in edge} |
+                       {root})
+        code = {id: i for (i, id) in enumerate(names)}
+        parent = np.array([code[p] for (p, c) in edges], dtype=np.int64)
+        child = np.array([code[c] for (p, c) in edges], dtype=np.int64)
+
+        # Keep the root and everything below it.
+        member = np.zeros(len(names), dtype=bool)
+        member[code[root]] = True
+        while True:
+            new = child[member[parent] & ~member[child]]
+            if len(new) == 0:
+                break
+            member[new] = True
+        keep = member[parent] & member[child]
+        renumber = np.cumsum(member) - 1
+        (parent, child) = (renumber[parent[keep]], renumber[child[keep]])
+
+        self.root = root
+        self.ids = np.array(names, dtype=object)[member]
+        self.index = {id: i for (i, id) in enumerate(self.ids.tolist())}
+        self.labels = np.array([terms.get(id, {}).get('term')
+                                for id in self.ids], dtype=object)
+        self.definitions = np.array([terms.get(id, {}).get('definition')
+                                     for id in self.ids], dtype=object)
+        self.parents = _csr(child, parent, len(self.ids))
+        self.children = _csr(parent, child, len(self.ids))
+        self.depth = _levels(parent, child, len(self.ids))
+        self.closure = self._closure(parent, child)
+        self.top_levels = self._top_levels()
+        (indptr, indices) = self.top_levels
+        self.branch = np.where(np.diff(indptr) > 0,
+                               np.append(indices, -1)[indptr[:-1]], -1)
+        self._steps = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, term):
+        return term in self.index
+
+    def codes(self, terms):
+        """Get the numbers of a list of HP IDs.
+
+        Args:
+            terms: A list of HP IDs.
+
+        Returns:
+            An int64 array with -1 for terms not in the ontology.
+        """
+
+        get = self.index.get
+        return np.fromiter((get(term, -1) for term in terms), dtype=np.int64,
+                           count=len(terms))
+
+    def contains(self, terms):
+        """Test which of a list of HP IDs are in the ontology.
+
+        Args:
+            terms: A list of HP IDs.
+
+        Returns:
+            A boolean array.
+        """
+
+        return self.codes(terms) >= 0
+
+    def ancestor_mask(self, terms):
+        """Get the terms and all their ancestors as a boolean mask.
+
+        Args:
+            terms: A list of HP IDs.  Terms not in the ontology are
+                   ignored.
+
+        Returns:
+            A boolean array with an entry for every term.
+        """
+
+        codes = self.codes(terms)
+        bits = np.bitwise_or.reduce(self.closure[codes[codes >= 0]], axis=0)
+        return _unpack(bits, len(self))
+
+    def ancestors(self, terms):
+        """Get the terms and all their ancestors.
+
+        Args:
+            terms: A list of HP IDs.  Terms not in the ontology are
+                   ignored.
+
+        Returns:
+            A list of HP IDs in sorted order.
+        """
+
+        return self.ids[self.ancestor_mask(terms)].tolist()
+
+    def is_ancestor(self, ancestors, terms):
+        """Test pairs of terms for an ancestor relationship.
+
+        Args:
+            ancestors: A list of HP IDs.
+
+            terms    : A list of HP IDs of the same length.
+
+        Returns:
+            A boolean array that is True where the ancestor is the term
+            or one of its ancestors.
+        """
+
+        a = self.codes(ancestors)
+        t = self.codes(terms)
+        found = (a >= 0) & (t >= 0)
+        (a, t) = (np.maximum(a, 0), np.maximum(t, 0))
+        bits = (self.closure[t, a >> 3] >> (a & 7).astype(np.uint8)) & 1
+
+        return found & (bits == 1)
+
+    def leaves(self, terms):
+        """Get the leaves of the subgraph induced by a set of terms.
+
+        Args:
+            terms: A list of HP IDs.  Terms not in the ontology are
+                   ignored.
+
+        Returns:
+            A list of the HP IDs with no children in the set, in sorted
+            order.
+        """
+
+        mask = np.zeros(len(self), dtype=bool)
+        codes = self.codes(terms)
+        mask[codes[codes >= 0]] = True
+
+        (indptr, indices) = self.parents
+        members = np.flatnonzero(mask)
+        parents = indices[_ranges(indptr[members],
+                                  indptr[members + 1] - indptr[members])]
+        inner = np.zeros(len(self), dtype=bool)
+        inner[parents] = True
+
+        return self.ids[mask & ~inner].tolist()
+
+    def branches(self, term):
+        """Get the top level branches above a term.
+
+        Args:
+            term (str): An HP ID.
+
+        Returns:
+            A list of the children of the root that are the term or one
+            of its ancestors, in sorted order.
+        """
+
+        (indptr, indices) = self.top_levels
+        i = self.index[term]
+        return self.ids[indices[indptr[i]:indptr[i + 1]]].tolist()
+
+    def distance(self, terms, others):
+        """Get the fewest edges between pairs of terms through a common
+        ancestor.
+
+        Args:
+            terms : A list of HP IDs.
+
+            others: A list of HP IDs of the same length.
+
+        Returns:
+            An int64 array with the up and down steps from each term to
+            the other, or -1 where either term is not in the ontology.
+        """
+
+        return self._distances(self.codes(terms), self.codes(others))
+
+    def steps(self):
+        """Get the number of edges from each term up to each of its
+        ancestors, building the table on first use.
+
+        Returns:
+            A tuple of (indptr, ancestors, steps) arrays in compressed
+            sparse row form with the ancestors of each term sorted and
+            the term itself included at 0 steps.
+        """
+
+        if self._steps is None:
+            self._steps = self._build_steps()
+        return self._steps
+
+    def _distances(self, a, b):
+        """Get the fewest edges between pairs of term numbers through a
+        common ancestor, -1 where either number is -1.
+        """
+
+        distance = np.full(len(a), -1, dtype=np.int64)
+        valid = np.flatnonzero((a >= 0) & (b >= 0))
+        if len(valid) == 0:
+            return distance
+
+        (pairs, _, steps) = self._common(a[valid], b[valid])
+        distance[valid] = _shortest(pairs, steps, len(valid))
+
+        return distance
+
+    def _common(self, a, b):
+        """Join the ancestor lists of the two terms of each pair on
+        (pair, ancestor) keys.
+
+        Args:
+            a (array): The first term number of each pair.
+
+            b (array): The second term number of each pair.
+
+        Returns:
+            A tuple of (pairs, ancestors, steps) arrays with one entry
+            per common ancestor of a pair, ordered by pair, where steps
+            is the sum of the edges up to the ancestor from both terms.
+        """
+
+        (indptr, ancestors, steps) = self.steps()
+        keys = []
+        values = []
+        for codes in (a, b):
+            counts = indptr[codes + 1] - indptr[codes]
+            rows = _ranges(indptr[codes], counts)
+            pairs = np.repeat(np.arange(len(codes)), counts)
+            keys.append(pairs * len(self) + ancestors[rows])
+            values.append(steps[rows].astype(np.int64))
+        (shared, first, second) = np.intersect1d(keys[0], keys[1],
+                                                 assume_unique=True,
+                                                 return_indices=True)
+
+        return (shared // len(self), shared % len(self),
+                values[0][first] + values[1][second])
+
+    def _build_steps(self):
+        """Build the table of edges from each term up to its ancestors
+        a level at a time.  A term's ancestors are its parents'
+        ancestors one step further away, so each level only needs the
+        lists of the levels above it.
+
+        Returns:
+            A tuple of (indptr, ancestors, steps) arrays.
+        """
+
+        size = len(self)
+        (indptr, parents) = self.parents
+        starts = np.zeros(size, dtype=np.int64)
+        lengths = np.zeros(size, dtype=np.int64)
+        pool_ancestors = np.zeros(0, dtype=np.int64)
+        pool_steps = np.zeros(0, dtype=np.int16)
+        for depth in range(int(self.depth.max(initial=-1)) + 1):
+            terms = np.flatnonzero(self.depth == depth)
+            counts = indptr[terms + 1] - indptr[terms]
+            edge_parents = parents[_ranges(indptr[terms], counts)]
+            edge_terms = np.repeat(terms, counts)
+            sizes = lengths[edge_parents]
+            rows = _ranges(starts[edge_parents], sizes)
+            term = np.concatenate((terms, np.repeat(edge_terms, sizes)))
+            ancestor = np.concatenate((terms, pool_ancestors[rows]))
+            step = np.concatenate((np.zeros(len(terms), dtype=np.int16),
+                                   pool_steps[rows] + 1))
+
+            order = np.lexsort((step, ancestor, term))
+            (term, ancestor, step) = (term[order], ancestor[order],
+                                      step[order])
+            first = np.ones(len(term), dtype=bool)
+            first[1:] = ((term[1:] != term[:-1]) |
+                         (ancestor[1:] != ancestor[:-1]))
+            (term, ancestor, step) = (term[first], ancestor[first],
+                                      step[first])
+
+            (terms, offsets, counts) = np.unique(term, return_index=True,
+                                                 return_counts=True)
+            starts[terms] = len(pool_ancestors) + offsets
+            lengths[terms] = counts
+            pool_ancestors = np.concatenate((pool_ancestors, ancestor))
+            pool_steps = np.concatenate((pool_steps, step))
+
+        rows = _ranges(starts, lengths)
+        return (np.concatenate(([0], np.cumsum(lengths))),
+                pool_ancestors[rows], pool_steps[rows])
+
+    def _top_levels(self):
+        """Get the top level branches of every term from the closure.
+
+        Returns:
+            A tuple of (indptr, indices) arrays.
+        """
+
+        (indptr, indices) = self.children
+        root = self.index[self.root]
+        top = indices[indptr[root]:indptr[root + 1]]
+        bits = (self.closure[:, top >> 3] >> (top & 7).astype(np.uint8)) & 1
+        (terms, columns) = np.nonzero(bits)
+
+        counts = np.bincount(terms, minlength=len(self))
+        return (np.concatenate(([0], np.cumsum(counts))), top[columns])
+
+    def _closure(self, parent, child):
+        """Build the ancestor closure bit matrix a level at a time.
+
+        Args:
+            parent (array): The parent term number of each edge.
+
+            child (array) : The child term number of each edge.
+
+        Returns:
+            A packed uint8 array of terms by bytes.
+        """
+
+        size = len(self.ids)
+        closure = np.zeros((size, (size + 7) // 8), dtype=np.uint8)
+        terms = np.arange(size)
+        closure[terms, terms >> 3] = (1 << (terms & 7)).astype(np.uint8)
+
+        # A parent is always on a shallower level than its child, so
+        # its row is complete by the time the child's level is filled.
+        level = self.depth[child]
+        for depth in range(1, int(self.depth.max(initial=0)) + 1):
+            edges = np.flatnonzero(level == depth)
+            np.bitwise_or.at(closure, child[edges], closure[parent[edges]])
+
+        return closure
+
+
+class Resnik(object):
+    """Catherpes Resnik is a Python class for finding the most
+    informative common ancestor (MICA) of pairs of ontology terms.
+
+    The MICA of two terms is the common ancestor (either term itself
+    included) with the highest information content, the deepest such
+    term if several tie.  Terms missing from the IC table are only
+    chosen when no common ancestor has an IC.
+
+    The step table of the ontology is built when the engine is created,
+    so copies sent to worker processes carry it rather than each
+    rebuilding it.
+    """
+
+    def __init__(self, ontology, ic):
+        """Args:
+            ontology (Ontology): The ontology.
+
+            ic                 : The information content of each HP ID
+                                 as a pandas Series or dictionary.
+
+        """
+
+        ic = pd.Series(ic, dtype=np.float64)
+        self.ontology = ontology
+        self.ic = ic.reindex(ontology.ids).to_numpy(dtype=np.float64)
+        ontology.steps()
+
+    def mica(self, terms, others, block_size=BLOCK_SIZE):
+        """Find the MICA of pairs of terms.
+
+        Args:
+            terms (list)    : HP IDs, such as proband terms.
+
+            others (list)   : HP IDs of the same length, such as gene
+                              terms.
+
+            block_size (int): The number of pairs compared at a time.
+
+        Returns:
+            A DataFrame with one row per pair and columns mica (the HP
+            ID, missing if the terms share no ancestor), ic, branch (the
+            top level term above the first term of the pair, or the
+            MICA for the root) and distance (the fewest edges between
+            the terms through a common ancestor, -1 for none).
+        """
+
+        a = self.ontology.codes(terms)
+        b = self.ontology.codes(others)
+        size = len(a)
+        mica = np.full(size, -1, dtype=np.int64)
+        branch = np.full(size, -1, dtype=np.int64)
+        distance = np.full(size, -1, dtype=np.int64)
+        for first in range(0, size, block_size):
+            block = slice(first, first + block_size)
+            (mica[block], branch[block], distance[block]) = \
+                self._block(a[block], b[block])
+
+        ids = np.append(self.ontology.ids, None)
+        ic = np.append(self.ic, np.nan)
+
+        return pd.DataFrame({'mica': ids[mica], 'ic': ic[mica],
+                             'branch': ids[branch], 'distance': distance})
+
+    def _block(self, a, b):
+        """Find the MICA, branch and distance of a block of pairs.
+
+        Args:
+            a (array): The first term number of each pair, -1 for none.
+
+            b (array): The second term number of each pair.
+
+        Returns:
+            A tuple of (mica, branch, distance) arrays with -1 where the
+            terms share no ancestor.
+        """
+
+        size = len(a)
+        mica = np.full(size, -1, dtype=np.int64)
+        branch = np.full(size, -1, dtype=np.int64)
+        distance = np.full(size, -1, dtype=np.int64)
+        valid = np.flatnonzero((a >= 0) & (b >= 0))
+        if len(valid) == 0:
+            return (mica, branch, distance)
+
+        (pairs, common, steps) = self.ontology._common(a[valid], b[valid])
+
+        # Highest IC last within each pair, then the deepest term and
+        # then the lowest term number.
+        ic = np.where(np.isnan(self.ic[common]), -np.inf, self.ic[common])
+        order = np.lexsort((-common, self.ontology.depth[common], ic, pairs))
+        (pairs, common, steps) = (pairs[order], common[order], steps[order])
+        last = np.ones(len(pairs), dtype=bool)
+        last[:-1] = pairs[1:] != pairs[:-1]
+        mica[valid[pairs[last]]] = common[last]
+
+        branch[valid] = np.where(self.ontology.branch[a[valid]] >= 0,
+                                 self.ontology.branch[a[valid]],
+                                 mica[valid])
+        distance[valid] = _shortest(pairs, steps, len(valid))
+
+        return (mica, branch, distance)
+
+
+def _levels(parent, child, size):
+    """Get the length of the longest path from the root to each term.
+
+    Raises:
+        ValueError: If the edges have a cycle.
+    """
+
+    depth = np.zeros(size, dtype=np.int64)
+    for i in range(size + 1):
+        deeper = depth.copy()
+        np.maximum.at(deeper, child, depth[parent] + 1)
+        if np.array_equal(deeper, depth):
+            return depth
+        depth = deeper
+
+    raise ValueError('The ontology has a cycle')
+
+
+def _ranges(starts, counts):
+    """Get the positions of a set of (start, count) ranges of an array
+    as one array.
+    """
+
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.repeat(np.asarray(starts, dtype=np.int64) - np.cumsum(counts)
+                        + counts, counts)
+    return offsets + np.arange(counts.sum())
+
+
+def _csr(rows, columns, size):
+    """Build (indptr, indices) arrays from row and column numbers."""
+
+    order = np.lexsort((columns, rows))
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows,
+                                                        minlength=size))))
+    return (indptr.astype(np.int64), columns[order].astype(np.int64))
+
+
+def _shortest(pairs, steps, size):
+    """Get the fewest steps of each of a number of pairs from the steps
+    through each of their common ancestors, -1 for none.
+    """
+
+    best = np.full(size, UNREACHED, dtype=np.int64)
+    np.minimum.at(best, pairs, steps)
+    return np.where(best == UNREACHED, -1, best)
+
+
+def _unpack(bits, size):
+    """Unpack a packed row of the closure to a boolean array."""
+    return np.unpackbits(bits, count=size, bitorder='little').astype(bool)
+
+
+def _term_id(uri):
+    """Convert an OBO PURL such as .../obo/HP_0000118 to HP:0000118."""
+    return re.sub('_', ':', re.sub(r'.*/', '', uri))
+
+
+def _open(file):
+    """Open a text file that may be gzip compressed."""
+
+    with open(file, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(file, 'rt')
+    return open(file)
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("file", help="Required path/name of the hp.json file")
+
+    # Optional argument which requires a parameter (eg. -t HP:0001250)
+    parser.add_argument("-t", "--terms", action="store", dest="terms",
+                        help="Comma separated HP IDs to print the leaves of")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+
+"""The catherpes index.py module builds and reads tabix-style sidecar
+indexes for random access into bgzip compressed GFF3, VCF and BED
+files.
+
+Each record is assigned to the smallest bin of the UCSC/tabix binning
+scheme that contains it and, per seqid, each bin holds a list of
+chunks of BGZF virtual offsets covering its records.  A region query
+collects the chunks of every bin that overlaps the region and only
+decompresses the blocks those chunks touch.  Unlike tabix the records
+do not need to be sorted, although sorted files give fewer and longer
+chunks.
+
+The index is written next to the data file with a '.cxi' extension
+and records the size and modification time of the data file so that
+stale indexes are detected, and the largest record end of each seqid.
+Coordinates must be below 2^29 (512 Mb).
+
+Example:
+    Index a bgzipped GFF3 file::
+
+        $ python index.py file.gff3.gz
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from catherpes import bgzf
+
+EXTENSION = '.cxi'
+
+# The columns holding the seqid, start and end of a record for each
+# supported file type.  An end column of None means the end is
+# derived from the length of the REF allele (VCF).
+PRESETS = {
+    'gff': {'seqid': 0, 'start': 3, 'end': 4, 'zero_based': False},
+    'vcf': {'seqid': 0, 'start': 1, 'end': None, 'zero_based': False},
+    'bed': {'seqid': 0, 'start': 1, 'end': 2, 'zero_based': True},
+}
+
+MAX_COORD = 1 << 29
+
+
+def main(args):
+    """ Main entry point of the app """
+    print("catherpes/Index")
+    print(args)
+
+    index = build_index(args.file, preset=args.preset)
+    print('Indexed {} chunks on {} seqids'.format(len(index.starts),
+                                                  len(index.seqids)))
+
+
+def build_index(file, preset='gff'):
+    """Build and write the index for a bgzip compressed file.
+
+    Args:
+        file (str)  : The path/name of the bgzip compressed file.
+
+        preset (str): The type of the file, one of 'gff', 'vcf' or
+                      'bed'.
+
+    Returns:
+        The Index object that was written.
+    """
+
+    if not bgzf.is_bgzf(file):
+        raise ValueError('File must be bgzip compressed to be '
+                         'indexed: {}'.format(file))
+    columns = PRESETS[preset]
+
+    seqids = {}
+    lengths = []
+    chunks = []
+    last = {}
+    with bgzf.BgzfReader(file) as reader:
+        while True:
+            vstart = reader.tell()
+            line = reader.readline()
+            if not line:
+                break
+            if line.startswith(b'#') or not line.strip():
+                continue
+            (seqid, beg, end) = _coords(line.decode(), columns)
+            key = (seqids.setdefault(seqid, len(seqids)), reg2bin(beg, end))
+            vend = reader.tell()
+            if key[0] == len(lengths):
+                lengths.append(end)
+            else:
+                lengths[key[0]] = max(lengths[key[0]], end)
+
+            # Extend the last chunk of the bin if it ends in the block
+            # this record starts in.
+            chunk = last.get(key)
+            if chunk is not None and vstart >> 16 <= chunk[3] >> 16:
+                chunk[3] = vend
+                continue
+            chunk = last[key] = [key[0], key[1], vstart, vend]
+            chunks.append(chunk)
+
+    chunks = np.array(chunks, dtype=np.uint64).reshape(-1, 4)
+    order = np.lexsort((chunks[:, 2], chunks[:, 1], chunks[:, 0]))
+    chunks = chunks[order]
+
+    stat = os.stat(file)
+    index = Index(seqids=list(seqids),
+                  chunk_seqids=chunks[:, 0].astype(np.int32),
+                  bins=chunks[:, 1].astype(np.int32),
+                  starts=chunks[:, 2],
+                  ends=chunks[:, 3],
+                  lengths=np.array(lengths, dtype=np.int64),
+                  meta={'preset': preset,
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime_ns})
+    index.write(file + EXTENSION)
+
+    return index
+
+
+def load_index(file):
+    """Load the index for a bgzip compressed file.
+
+    Args:
+        file (str): The path/name of the bgzip compressed file (not the
+                    index itself).
+
+    Returns:
+        An Index object.
+
+    Raises:
+        FileNotFoundError: The index does not exist.
+        ValueError: The index is older than the file.
+    """
+
+    path = file + EXTENSION
+    if not os.path.exists(path):
+        raise FileNotFoundError('No index found for {}, create one with '
+                                'catherpes.index.build_index'.format(file))
+    index = Index.read(path)
+
+    stat = os.stat(file)
+    if (index.meta['size'] != stat.st_size or
+            index.meta['mtime'] != stat.st_mtime_ns):
+        raise ValueError('The index {} is out of date, rebuild it with '
+                         'catherpes.index.build_index'.format(path))
+
+    return index
+
+
+def fetch(file, region, preset=None, index=None):
+    """Fetch the records overlapping a region from an indexed bgzip
+    compressed file.
+
+    Args:
+        file (str)  : The path/name of the bgzip compressed file.
+
+        region (str): A region as 'seqid', 'seqid:start' or
+                      'seqid:start-end' with 1-based inclusive
+                      coordinates.
+
+        preset (str): The type of the file.  Defaults to the type
+                      the index was built with.
+
+        index       : A previously loaded Index for the file.
+
+    Yields:
+        The text of each overlapping record without the newline.
+    """
+
+    if index is None:
+        index = load_index(file)
+    columns = PRESETS[preset or index.meta['preset']]
+    (seqid, start, end) = parse_region(region)
+
+    with bgzf.BgzfReader(file) as reader:
+        for (vstart, vend) in index.chunks(seqid, start - 1, end):
+            reader.seek(vstart)
+            while reader.tell() < vend:
+                line = reader.readline().decode().rstrip('\n')
+                if not line or line.startswith('#'):
+                    continue
+                (r_seqid, r_beg, r_end) = _coords(line, columns)
+                if r_seqid == seqid and r_beg < end and r_end > start - 1:
+                    yield line
+
+
+def parse_region(region):
+    """Parse a region string.
+
+    Args:
+        region (str): A region as 'seqid', 'seqid:start' or
+                      'seqid:start-end' with 1-based inclusive
+                      coordinates.  Commas in numbers are ignored.
+
+    Returns:
+        A tuple of (seqid, start, end) with 1-based inclusive
+        coordinates.
+    """
+
+    match = re.match(r'^(.+?)(?::([\d,]+)(?:-([\d,]+))?)?$', region)
+    if match is None:
+        raise ValueError('Invalid region: {}'.format(region))
+    (seqid, start, end) = match.groups()
+    start = int(start.replace(',', '')) if start else 1
+    end = int(end.replace(',', '')) if end else MAX_COORD
+    if start > end:
+        raise ValueError('Invalid region: {}'.format(region))
+
+    return (seqid, start, end)
+
+
+def reg2bin(beg, end):
+    """Get the smallest bin containing a region.
+
+    Args:
+        beg (int): The 0-based start of the region.
+
+        end (int): The 0-based exclusive end of the region.
+
+    Returns:
+        The bin number.
+    """
+
+    if end > MAX_COORD:
+        raise ValueError('Coordinate {} is too large to index'.format(end))
+    end -= 1
+    if beg >> 14 == end >> 14:
+        return ((1 << 15) - 1) // 7 + (beg >> 14)
+    if beg >> 17 == end >> 17:
+        return ((1 << 12) - 1) // 7 + (beg >> 17)
+    if beg >> 20 == end >> 20:
+        return ((1 << 9) - 1) // 7 + (beg >> 20)
+    if beg >> 23 == end >> 23:
+        return ((1 << 6) - 1) // 7 + (beg >> 23)
+    if beg >> 26 == end >> 26:
+        return ((1 << 3) - 1) // 7 + (beg >> 26)
+    return 0
+
+
+def reg2bins(beg, end):
+    """Get all of the bins that may hold records overlapping a region.
+
+    Args:
+        beg (int): The 0-based start of the region.
+
+        end (int): The 0-based exclusive end of the region.
+
+    Returns:
+        A list of bin numbers.
+    """
+
+    end = min(end, MAX_COORD) - 1
+    bins = [0]
+    for (first, shift) in ((1, 26), (9, 23), (73, 20), (585, 17), (4681, 14)):
+        bins.extend(range(first + (beg >> shift), first + 1 + (end >> shift)))
+
+    return bins
+
+
+def _coords(line, columns):
+    """Get the seqid and 0-based half-open coordinates of a record.
+
+    Args:
+        line (str)    : The text of the record.
+
+        columns (dict): A PRESETS entry describing the columns.
+
+    Returns:
+        A tuple of (seqid, beg, end).
+    """
+
+    fields = line.split('\t', 5)
+    beg = int(fields[columns['start']])
+    if columns['end'] is None:
+        end = beg + len(fields[3]) - 1
+    else:
+        end = int(fields[columns['end']])
+    if not columns['zero_based']:
+        beg -= 1
+
+    return (fields[columns['seqid']], beg, max(end, beg + 1))
+
+
+class Index(object):
+    """Catherpes Index is a Python class holding the binned virtual
+    offset chunks of an indexed bgzip file.
+    """
+
+    def __init__(self, seqids, chunk_seqids, bins, starts, ends, meta,
+                 lengths=None):
+        """Args:
+            seqids (list)        : The seqids in the order they were
+                                   first seen.
+
+            chunk_seqids (array) : The seqid number of each chunk.
+
+            bins (array)         : The bin of each chunk.
+
+            starts (array)       : The virtual offset of the start of
+                                   each chunk.
+
+            ends (array)         : The virtual offset of the end of
+                                   each chunk.
+
+            meta (dict)          : The preset and the size and mtime
+                                   of the indexed file.
+
+            lengths (array)      : The largest 0-based exclusive record
+                                   end of each seqid, None for indexes
+                                   written without it.
+
+        """
+
+        self.seqids = seqids
+        self.chunk_seqids = chunk_seqids
+        self.bins = bins
+        self.starts = starts
+        self.ends = ends
+        self.meta = meta
+        self.lengths = lengths
+
+    @classmethod
+    def read(cls, path):
+        """Read an index file.
+
+        Args:
+            path (str): The path/name of the index file.
+
+        Returns:
+            An Index object.
+        """
+
+        with np.load(path) as data:
+            return cls(seqids=list(data['seqids']),
+                       chunk_seqids=data['chunk_seqids'],
+                       bins=data['bins'],
+                       starts=data['starts'],
+                       ends=data['ends'],
+                       meta=json.loads(str(data['meta'])),
+                       lengths=(data['lengths'] if 'lengths' in data.files
+                                else None))
+
+    def write(self, path):
+        """Write the index to a file.
+
+        Args:
+            path (str): The path/name of the index file.
+
+        Returns: No return value.
+        """
+
+        arrays = {}
+        if self.lengths is not None:
+            arrays['lengths'] = self.lengths
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     seqids=np.array(self.seqids, dtype=str),
+                     chunk_seqids=self.chunk_seqids,
+                     bins=self.bins,
+                     starts=self.starts,
+                     ends=self.ends,
+                     meta=np.array(json.dumps(self.meta)),
+                     **arrays)
+
+    def chunks(self, seqid, beg, end):
+        """Get the merged chunks that may hold records overlapping a
+        region.
+
+        Args:
+            seqid (str): The seqid of the region.
+
+            beg (int)  : The 0-based start of the region.
+
+            end (int)  : The 0-based exclusive end of the region.
+
+        Returns:
+            A list of (start, end) virtual offset tuples in file order.
+        """
+
+        if seqid not in self.seqids:
+            return []
+        code = self.seqids.index(seqid)
+        keep = ((self.chunk_seqids == code) &
+                np.isin(self.bins, reg2bins(beg, end)))
+        order = np.argsort(self.starts[keep], kind='stable')
+        starts = self.starts[keep][order]
+        ends = self.ends[keep][order]
+
+        merged = []
+        for (start, end) in zip(starts.tolist(), ends.tolist()):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        return [tuple(chunk) for chunk in merged]
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("file", help="Required path/name of a bgzip file")
+
+    # Optional argument which requires a parameter (eg. -p vcf)
+    parser.add_argument("-p", "--preset", action="store", dest="preset",
+                        default='gff', choices=sorted(PRESETS),
+                        help="The type of the file")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""The catherpes intervals.py module provides an interval index for
+fast overlap queries against large sets of genomic features.
+
+Intervals are grouped by seqid and then split into tiers by length,
+each tier holding intervals whose lengths fall within a factor of two
+of each other, stored as arrays sorted by start.  No interval in a
+tier is longer than the tier maximum, so the intervals that can
+overlap a query all start between the query start less that maximum
+and the query end, and both bounds are found with a binary search.
+A long interval such as a chromosome record only widens the search
+within its own tier, so the number of candidates tested stays close
+to the number of hits.  Batches of queries are answered with
+vectorized numpy operations rather than a Python loop per query.
+
+Coordinates are treated as closed intervals [start, end], as in GFF3.
+Half-open coordinates (BED) should have one subtracted from the end
+before being indexed or queried.
+
+Example:
+    Find the features overlapping a locus::
+
+        index = IntervalIndex(seqids, starts, ends)
+        hits = index.query('22', 1000000, 2000000)
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import numpy as np
+import pandas as pd
+
+
+class IntervalIndex(object):
+    """Catherpes IntervalIndex is a Python class for overlap queries
+    against a static set of intervals.
+    """
+
+    def __init__(self, seqids, starts, ends):
+        """Args:
+            seqids (array-like): The seqid of each interval.
+
+            starts (array-like): The start coordinate of each interval.
+
+            ends (array-like)  : The end coordinate of each interval.
+
+        """
+
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        (codes, uniques) = pd.factorize(np.asarray(seqids, dtype=object))
+
+        self.size = len(starts)
+        self.seqids = {}
+        for (code, seqid) in enumerate(uniques):
+            members = np.flatnonzero(codes == code)
+            order = members[np.argsort(starts[members], kind='stable')]
+            lengths = np.maximum(ends[order] - starts[order], 0)
+            tiers = np.floor(np.log2(lengths + 1)).astype(np.int64)
+            groups = []
+            for tier in np.unique(tiers):
+                ranks = np.flatnonzero(tiers == tier)
+                groups.append((ranks,
+                               starts[order][ranks],
+                               ends[order][ranks],
+                               lengths[ranks].max()))
+            self.seqids[seqid] = (order, groups)
+
+    def __len__(self):
+        return self.size
+
+    def query(self, seqid, start, end):
+        """Find the intervals overlapping a single region.
+
+        Args:
+            seqid (str): The seqid of the region.
+
+            start (int): The start of the region.
+
+            end (int)  : The end of the region.
+
+        Returns:
+            An array of the positions of the overlapping intervals in
+            the arrays the index was built from, ordered by start.
+        """
+
+        return self.query_batch([seqid], [start], [end])[1]
+
+    def query_batch(self, seqids, starts, ends):
+        """Find the intervals overlapping each of a batch of regions.
+
+        Args:
+            seqids (array-like): The seqid of each region.
+
+            starts (array-like): The start of each region.
+
+            ends (array-like)  : The end of each region.
+
+        Returns:
+            A tuple of two equal length arrays (query_idx,
+            interval_idx) with one entry per overlapping pair, ordered
+            by query and then by interval start.
+        """
+
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        (codes, uniques) = pd.factorize(np.asarray(seqids, dtype=object))
+
+        query_hits = []
+        rank_hits = []
+        interval_hits = []
+        for (code, seqid) in enumerate(uniques):
+            if seqid not in self.seqids:
+                continue
+            queries = np.flatnonzero(codes == code)
+            (qi, ranks) = self._candidates(seqid, starts[queries],
+                                           ends[queries])
+            query_hits.append(queries[qi])
+            rank_hits.append(ranks)
+            interval_hits.append(self.seqids[seqid][0][ranks])
+
+        if not query_hits:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        query_idx = np.concatenate(query_hits)
+        order = np.lexsort((np.concatenate(rank_hits), query_idx))
+
+        return (query_idx[order], np.concatenate(interval_hits)[order])
+
+    def _candidates(self, seqid, starts, ends, filter=True):
+        """Find the intervals of one seqid overlapping a set of regions.
+
+        Args:
+            seqid (str)         : The seqid of the regions.
+
+            starts (np.ndarray) : The start of each region.
+
+            ends (np.ndarray)   : The end of each region.
+
+            filter (bool)       : Drop the candidates that do not
+                                  overlap their region.
+
+        Returns:
+            A tuple of two equal length arrays (query_idx, rank) with
+            one entry per candidate pair, where rank is the position of
+            the interval among the seqid's intervals sorted by start.
+        """
+
+        query_hits = []
+        rank_hits = []
+        for (ranks, iv_starts, iv_ends, longest) in self.seqids[seqid][1]:
+            lo = np.searchsorted(iv_starts, starts - longest, side='left')
+            hi = np.searchsorted(iv_starts, ends, side='right')
+            counts = np.maximum(hi - lo, 0)
+            total = counts.sum()
+            if total == 0:
+                continue
+
+            qi = np.repeat(np.arange(len(starts)), counts)
+            offsets = (np.arange(total) -
+                       np.repeat(np.cumsum(counts) - counts, counts))
+            pos = lo[qi] + offsets
+            if filter:
+                keep = iv_ends[pos] >= starts[qi]
+                qi = qi[keep]
+                pos = pos[keep]
+
+            query_hits.append(qi)
+            rank_hits.append(ranks[pos])
+
+        if not query_hits:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        return (np.concatenate(query_hits), np.concatenate(rank_hits))
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+"""The catherpes join.py module joins GFF3 features with BED intervals
+in a single sorted merge pass.
+
+Both inputs are consumed as streams sorted by seqid and start.  The
+sweep keeps a window of the features and intervals that are still
+open at the current position, pairs each new item with the open items
+of the other input and drops items once the sweep has passed their
+end, so memory is bounded by the number of overlapping items rather
+than by the size of either input.  Open features are kept in a heap
+ordered by end, so each interval is only paired with the features
+that still reach it.  Coverage of each feature is accumulated as the
+intervals stream past it and reported as soon as no later interval
+can reach it, so a feature spanning a whole seqid does not hold back
+the features it contains.
+
+GFF3 coordinates are 1-based and closed while BED coordinates are
+0-based and half-open; features are converted to half-open
+coordinates for the join.  Seqids are ordered lexicographically, as
+by `sort -k1,1 -k2,2n` and BED.sort(), unless an explicit order is
+given.  GFF and BED objects that are already loaded are sorted before
+the join; files and other iterables must already be sorted.
+
+Example:
+    Count the intervals overlapping each gene::
+
+        $ python join.py -t gene genes.gff3.gz peaks.bed
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from catherpes.bed import BED, iter_intervals
+from catherpes.gff import GFF
+
+CHUNK_SIZE = 10000
+
+
+def main(args):
+    """ Main entry point of the app """
+
+    gff = GFF(file=args.gff, types=args.types and args.types.split(','))
+    for (feature, count, covered, length, depth) in coverage(gff, args.bed):
+        print('\t'.join([feature['seqid'], str(feature['start']),
+                         str(feature['end']), feature['type'],
+                         str(feature['ID'] or '.'), str(count), str(covered),
+                         str(length), '{:.4f}'.format(depth)]))
+
+
+def overlaps(features, intervals, chroms=None):
+    """Find the overlapping pairs of features and intervals.
+
+    Args:
+        features : A GFF object or an iterable of sorted GFF3 records.
+
+        intervals: A BED object, the path/name of a sorted BED file or
+                   an iterable of sorted (chrom, start, end, ...) tuples.
+
+        chroms   : A list of seqids giving the sort order of the inputs.
+
+    Yields:
+        A tuple of (feature, interval) for each overlapping pair, in
+        the order the sweep finds them.
+    """
+
+    for (feature, interval, stats) in _sweep(features, intervals, chroms):
+        if stats is None:
+            yield (feature, interval)
+
+
+def coverage(features, intervals, chroms=None):
+    """Summarize the coverage of each feature by a set of intervals.
+
+    Args:
+        features : A GFF object or an iterable of sorted GFF3 records.
+
+        intervals: A BED object, the path/name of a sorted BED file or
+                   an iterable of sorted (chrom, start, end, ...) tuples.
+
+        chroms   : A list of seqids giving the sort order of the inputs.
+
+    Yields:
+        A tuple of (feature, count, covered, length, depth) for every
+        feature in the order the features are completed, where count
+        is the number of overlapping intervals, covered is the number
+        of feature bases covered by at least one interval, length is
+        the length of the feature and depth is the mean depth across
+        the feature.
+    """
+
+    for (feature, interval, stats) in _sweep(features, intervals, chroms):
+        if stats is not None:
+            (count, covered, reach, bases) = stats[4:]
+            length = stats[2] - stats[1]
+            yield (feature, count, covered, length,
+                   bases / length if length else 0.0)
+
+
+def _sweep(features, intervals, chroms=None):
+    """Merge two sorted streams and find their overlaps.
+
+    Args:
+        features : A GFF object or an iterable of sorted GFF3 records.
+
+        intervals: A BED object, a BED file or an iterable of tuples.
+
+        chroms   : A list of seqids giving the sort order.
+
+    Yields:
+        A tuple of (feature, interval, None) for each overlapping pair
+        and a tuple of (feature, None, stats) once each feature is
+        complete, where stats is the list of (rank, beg, end, feature,
+        count, covered, reach, bases) for the feature.
+    """
+
+    rank = _ranker(chroms)
+    feature_items = _items(_features(features, chroms),
+                           lambda r: (r['seqid'], int(r['start']) - 1,
+                                      int(r['end'])),
+                           rank, 'features')
+    interval_items = _items(_intervals(intervals, chroms),
+                            lambda r: (r[0], r[1], r[2]),
+                            rank, 'intervals')
+
+    # Open features are kept in a heap of (rank, end, seq, state) with
+    # each state a list of [rank, beg, end, record, count, covered,
+    # reach, bases] and open intervals as (rank, beg, end, record) in
+    # start order.
+    open_features = []
+    open_intervals = []
+    seq = 0
+    feature = next(feature_items, None)
+    interval = next(interval_items, None)
+
+    while feature is not None or interval is not None:
+        if interval is None or (feature is not None and
+                                feature[:2] <= interval[:2]):
+            (f_rank, beg, end, record) = feature
+            open_intervals = [i for i in open_intervals
+                              if i[0] == f_rank and i[2] > beg]
+            state = [f_rank, beg, end, record, 0, 0, beg, 0]
+            for item in open_intervals:
+                _add(state, item)
+                yield (record, item[3], None)
+            heapq.heappush(open_features, (f_rank, end, seq, state))
+            seq += 1
+            feature = next(feature_items, None)
+        else:
+            # Features that end at or before this interval starts were
+            # completed in the previous pass, so every open feature
+            # overlaps it.
+            (i_rank, beg, end, record) = interval
+            for (_, _, _, state) in open_features:
+                _add(state, interval)
+                yield (state[3], record, None)
+
+            # Intervals are only taken before the next feature, so one
+            # that cannot reach the next feature cannot reach any later
+            # one either.
+            if (feature is not None and feature[0] == i_rank and
+                    end > feature[1]):
+                open_intervals.append(interval)
+            interval = next(interval_items, None)
+
+        # A feature is complete once the next interval starts at or
+        # after its end.  Completed features are reported without
+        # waiting on longer features that started before them and
+        # those completed together are reported in feature order.
+        done = []
+        while open_features and (interval is None or
+                                 interval[:2] >= open_features[0][:2]):
+            done.append(heapq.heappop(open_features)[2:])
+        for (_, state) in sorted(done, key=lambda item: item[0]):
+            yield (state[3], None, state)
+
+
+def _add(state, interval):
+    """Add an overlapping interval to the coverage of a feature.
+    Intervals arrive in start order, so the covered bases are extended
+    past the furthest end reached so far."""
+
+    beg = max(state[1], interval[1])
+    end = min(state[2], interval[2])
+    state[4] += 1
+    state[5] += max(0, end - max(beg, state[6]))
+    state[6] = max(state[6], end)
+    state[7] += end - beg
+
+
+def _ranker(chroms):
+    """Get a function giving the sort key of a seqid."""
+
+    if chroms is None:
+        return lambda seqid: seqid
+    ranks = {seqid: i for (i, seqid) in enumerate(chroms)}
+
+    def rank(seqid):
+        if seqid not in ranks:
+            raise ValueError('Seqid {} is not in the chrom order'.format(
+                seqid))
+        return ranks[seqid]
+
+    return rank
+
+
+def _items(records, coords, rank, name):
+    """Convert records to (rank, beg, end, record) tuples and check
+    that they are sorted."""
+
+    last = None
+    for record in records:
+        (seqid, beg, end) = coords(record)
+        item = (rank(seqid), beg, end, record)
+        if last is not None and item[:2] < last:
+            raise ValueError('The {} are not sorted at {}:{}'.format(
+                name, seqid, beg))
+        last = item[:2]
+        yield item
+
+
+def _order(seqids, starts, chroms):
+    """Get the positions that sort a set of seqids and starts."""
+
+    seqids = np.asarray(seqids, dtype=object)
+    if chroms is None:
+        (codes, uniques) = pd.factorize(seqids, sort=True)
+    else:
+        ranks = {seqid: i for (i, seqid) in enumerate(chroms)}
+        codes = np.array([ranks.get(s, len(ranks)) for s in seqids],
+                         dtype=np.int64)
+
+    return np.lexsort((starts, codes))
+
+
+def _features(features, chroms):
+    """Get the records of the features in sorted order."""
+
+    if not isinstance(features, GFF):
+        yield from features
+        return
+    if features.lazy:
+        yield from features.iter_records()
+        return
+
+    order = _order(features._column('seqid'), features._column('start'),
+                   chroms)
+    for i in range(0, len(order), CHUNK_SIZE):
+        records = features._records(order[i:i + CHUNK_SIZE])
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict('records')
+        yield from records
+
+
+def _intervals(intervals, chroms):
+    """Get the intervals as sorted tuples."""
+
+    if isinstance(intervals, str):
+        yield from iter_intervals(intervals)
+        return
+    if not isinstance(intervals, BED):
+        yield from intervals
+        return
+
+    data = intervals.data
+    order = _order(data['chrom'].to_numpy(), data['start'].to_numpy(), chroms)
+    for i in range(0, len(order), CHUNK_SIZE):
+        yield from data.iloc[order[i:i + CHUNK_SIZE]].itertuples(index=False,
+                                                                 name=None)
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional arguments
+    parser.add_argument("gff", help="Required path/name of a GFF3 file")
+    parser.add_argument("bed", help="Required path/name of a sorted BED file")
+
+    # Optional argument which requires a parameter (eg. -t gene,exon)
+    parser.add_argument("-t", "--types", action="store", dest="types",
+                        help="Comma separated feature types to join")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,797 @@
+#!/usr/bin/env python3
+
+"""The catherpes junctions.py module reads STAR aligner splice
+junction files and converts them for display and analysis.
+
+STAR writes the junctions it finds to an SJ.out.tab file with one
+junction per line:
+
+    column 1: chromosome
+    column 2: first base of the intron (1-based)
+    column 3: last base of the intron (1-based)
+    column 4: strand (0: undefined, 1: +, 2: -)
+    column 5: intron motif: 0: non-canonical; 1: GT/AG, 2: CT/AC,
+              3: GC/AG, 4: CT/GC, 5: AT/AC, 6: GT/AT
+    column 6: 0: unannotated, 1: annotated (only if a splice junction
+              database is used)
+    column 7: number of uniquely mapping reads crossing the junction
+    column 8: number of multi-mapping reads crossing the junction
+    column 9: maximum spliced alignment overhang
+
+Note that STAR defines the junction start and end as intronic bases.
+
+The IGV splice junction track format is a hybrid of BED and GFF3 with
+the STAR values as GFF3 style attributes in the name column and the
+uniquely mapped read count as the score.  See
+https://github.com/igvteam/igv.js/wiki/Splice-Junctions.  For
+example:
+
+    chr15  92883778  92885514  motif=GT/AG;uniquely_mapped=95;...  95  +
+
+The conversion maps the coded columns through lookup arrays of text
+and converts each number column to strings once, then joins the lines
+from the columns of strings with no per-row formatting, so files with
+millions of junctions are written with a single buffered write.
+
+merge_junctions reads the SJ.out.tab files of a cohort in a process
+pool and builds a sparse junction by sample matrix of the unique and
+multi-mapping read counts.  Each junction (chrom, start, end, strand)
+is given an integer ID by a JunctionIndex, a hash index kept in the
+main process, and the counts of each sample are appended to binary
+files as compressed sparse columns.  Only the index is held in memory,
+so memory grows with the number of distinct junctions rather than
+with samples times junctions.  JunctionMatrix maps the files back in.
+
+A JunctionAnnotator derives the introns of every transcript from a GFF
+object once and keeps the intron keys and the splice sites sorted by
+seqid.  Junctions are labelled as known, novel donor, novel acceptor,
+novel exon skip or novel, with the genes they belong to, by a
+searchsorted lookup per seqid for each batch of junctions.
+
+Example:
+    Convert a STAR junction file for IGV::
+
+        $ python junctions.py 1099_SJ.out.tab > 1099_junctions.bed
+
+    Merge a cohort into a junction matrix::
+
+        $ python junctions.py *_SJ.out.tab -m cohort.junctions -w 16
+
+    Label the junctions of a sample against gene models::
+
+        $ python junctions.py 1099_SJ.out.tab -g genes.gff3.gz
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import json
+import os
+import sys
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from catherpes import store
+from catherpes.gff import GFF
+from catherpes.intervals import IntervalIndex
+from catherpes.shard import run_shards
+from catherpes.tsv import CHUNK_SIZE, TSV
+from catherpes.utils import hierarchy, join_groups, stable_ids
+
+STRANDS = np.array(['undefined', '+', '-'], dtype=object)
+MOTIFS = np.array(['non-canonical', 'GT/AG', 'CT/AC', 'GC/AG', 'CT/GC',
+                   'AT/AC', 'GT/AT'], dtype=object)
+ANNOTATED = np.array(['unannotated', 'annotated'], dtype=object)
+MOTIF_TEXT = 'motif=' + MOTIFS + ';uniquely_mapped='
+OVERHANG_TEXT = ';maximum_spliced_alignment_overhang='
+ANNOTATED_TEXT = ';annotated_junction=' + ANNOTATED
+MATRIX_META = 'matrix.json'
+CATEGORIES = ('known', 'novel_donor', 'novel_acceptor', 'novel_exon_skip',
+              'novel')
+COUNTS = ('unique', 'multi')
+
+# A junction key packs the start, end and strand into one int64, which
+# leaves 30 bits for the start and 31 for the end.
+MAX_START = 1 << 30
+MAX_END = 1 << 31
+
+
+def main(args):
+    """ Main entry point of the app """
+
+    if args.gff is not None:
+        annotator = JunctionAnnotator(GFF(file=args.gff, format='df'))
+        output = sys.stdout if args.output is None else open(args.output, 'w')
+        for (i, file) in enumerate(args.files):
+            for (j, chunk) in enumerate(annotator.annotate_sj(file)):
+                chunk.to_csv(output, sep='\t', index=False,
+                             header=(i == 0 and j == 0))
+        if output is not sys.stdout:
+            output.close()
+        return
+    if args.matrix is not None:
+        matrix = merge_junctions(args.files, args.matrix, workers=args.workers)
+        print('{} junctions in {} samples'.format(len(matrix),
+                                                  len(matrix.samples)))
+        return
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    for file in args.files:
+        write_igv_junctions(file, output)
+    if output is not sys.stdout:
+        output.close()
+
+
+def read_sj(file, columns=None):
+    """Read a STAR SJ.out.tab file.
+
+    Args:
+        file (str)    : The path/name of the file, which may be gzip
+                        compressed.
+
+        columns (list): Only read these columns.
+
+    Returns:
+        A DataFrame with the columns chrom, start, end, strand, motif,
+        annotated, unique, multi and overhang as in the file.
+    """
+
+    return TSV(file, schema='sj', columns=columns).read()
+
+
+def sample_name(file):
+    """Get a sample name from the name of a SJ.out.tab file.
+
+    Args:
+        file (str): The path/name of the file.
+
+    Returns:
+        The file name without the SJ.out.tab and .gz suffixes, or the
+        whole file name if nothing is left.
+    """
+
+    base = os.path.basename(file)
+    name = base
+    for suffix in ('.gz', 'SJ.out.tab'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name.rstrip('._') or base
+
+
+def igv_junctions(sj):
+    """Convert STAR junctions to the columns of an IGV splice junction
+    BED file.
+
+    Args:
+        sj: A DataFrame from read_sj or the path/name of a SJ.out.tab
+            file.
+
+    Returns:
+        A DataFrame with the chrom, start (0-based), end, name
+        (attributes), score and strand columns.
+    """
+
+    if isinstance(sj, str):
+        sj = read_sj(sj)
+
+    return pd.DataFrame({'chrom': sj['chrom'],
+                         'start': sj['start'].to_numpy() - 1,
+                         'end': sj['end'].to_numpy(),
+                         'name': _igv_name(sj, _str(sj['unique'])),
+                         'score': sj['unique'].to_numpy(),
+                         'strand': STRANDS[sj['strand'].to_numpy()]})
+
+
+def write_igv_junctions(sj, file):
+    """Write an IGV splice junction BED file.
+
+    Args:
+        sj  : A DataFrame from read_sj or the path/name of a SJ.out.tab
+              file.
+
+        file: The path/name of the output file or an open file handle.
+
+    Returns:
+        The number of junctions written.
+    """
+
+    if isinstance(sj, str):
+        sj = read_sj(sj)
+
+    # Every column is converted to strings once and the lines are
+    # joined from the columns, with no per-row formatting.
+    unique = _str(sj['unique'])
+    lines = map('\t'.join, zip(sj['chrom'].to_numpy(dtype=object),
+                               _str(sj['start'] - 1), _str(sj['end']),
+                               _igv_name(sj, unique), unique,
+                               STRANDS[sj['strand'].to_numpy()]))
+    text = '\n'.join(lines)
+    if text:
+        text += '\n'
+
+    if isinstance(file, str):
+        with open(file, 'w') as f:
+            f.write(text)
+    else:
+        file.write(text)
+
+    return len(sj)
+
+
+def merge_junctions(entries, path, workers=1):
+    """Merge the STAR junctions of many samples into a sparse junction
+    by sample matrix.
+
+    Args:
+        entries (list): (sample, path) tuples as from
+                        catherpes.viq.read_manifest, or SJ.out.tab paths
+                        from which the sample names are taken.
+
+        path (str)    : The directory to write, which is created if
+                        needed.
+
+        workers (int) : The number of processes reading files.
+
+    Returns:
+        A JunctionMatrix for the merged data.
+    """
+
+    entries = [entry if isinstance(entry, tuple)
+               else (sample_name(entry), entry) for entry in entries]
+    samples = [sample for (sample, file) in entries]
+    if len(set(samples)) != len(samples):
+        raise ValueError('Sample names are not unique')
+
+    os.makedirs(path, exist_ok=True)
+    outputs = {name: open(os.path.join(path, name + '.bin'), 'wb')
+               for name in ('indices',) + COUNTS}
+    index = JunctionIndex()
+    indptr = [0]
+    try:
+        # Results come back in sample order so junction IDs do not
+        # depend on which worker finishes first.
+        for (entry, result) in run_shards(_read_keys, entries,
+                                          workers=workers):
+            (chroms, codes, keys, counts) = result
+            ids = np.empty(len(keys), dtype=np.int32)
+            for (code, chrom) in enumerate(chroms):
+                rows = np.flatnonzero(codes == code)
+                if len(rows):
+                    ids[rows] = index.lookup(chrom, keys[rows])
+            order = np.argsort(ids, kind='stable')
+            outputs['indices'].write(ids[order].tobytes())
+            for name in COUNTS:
+                outputs[name].write(counts[name][order].tobytes())
+            indptr.append(indptr[-1] + len(ids))
+    finally:
+        for output in outputs.values():
+            output.close()
+
+    np.array(indptr, dtype=np.int64).tofile(os.path.join(path, 'indptr.bin'))
+    store.save_frame(index.frame(), os.path.join(path, 'junctions'))
+    with open(os.path.join(path, MATRIX_META), 'w') as f:
+        json.dump({'rows': len(index), 'samples': samples,
+                   'entries': indptr[-1],
+                   'files': [os.path.abspath(file)
+                             for (sample, file) in entries]},
+                  f)
+
+    return JunctionMatrix(path)
+
+
+class JunctionIndex(object):
+    """Catherpes JunctionIndex is a Python class that gives each
+    distinct junction an integer ID in the order they are first seen.
+
+    The junctions of each chromosome are kept in a dictionary keyed by
+    a packed int64 of the start, end and strand, so a sample's junctions
+    are looked up a chromosome at a time with no per-junction tuples.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.chroms = []
+        self.keys = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def lookup(self, chrom, keys):
+        """Get the IDs of junction keys, adding any new junctions.
+
+        Args:
+            chrom (str)        : The chromosome of the junctions.
+
+            keys (numpy.array) : int64 keys from _pack.  Repeated keys
+                                 get the same ID.
+
+        Returns:
+            An int32 array of junction IDs.
+        """
+
+        ids = self.ids.setdefault(chrom, {})
+        get = ids.get
+        found = np.fromiter((get(key, -1) for key in keys.tolist()),
+                            dtype=np.int32, count=len(keys))
+        new = found < 0
+        if new.any():
+            # Number the distinct new keys in the order they are first
+            # seen.
+            (unique, first, inverse) = np.unique(keys[new],
+                                                 return_index=True,
+                                                 return_inverse=True)
+            order = np.argsort(first)
+            rank = np.empty(len(order), dtype=np.int32)
+            rank[order] = np.arange(len(order), dtype=np.int32)
+            found[new] = self.size + rank[inverse]
+            added = unique[order]
+            ids.update(zip(added.tolist(),
+                           range(self.size, self.size + len(added))))
+            self.chroms.append(chrom)
+            self.keys.append(added)
+            self.size += len(added)
+
+        return found
+
+    def frame(self):
+        """Get the junctions in ID order.
+
+        Returns:
+            A DataFrame with a categorical chrom column, the 1-based
+            intron start and end and the STAR strand code.
+        """
+
+        keys = (np.concatenate(self.keys) if self.keys
+                else np.zeros(0, dtype=np.int64))
+        chroms = np.repeat(np.array(self.chroms, dtype=object),
+                           [len(keys) for keys in self.keys])
+        (start, end, strand) = _unpack(keys)
+
+        return pd.DataFrame({'chrom': pd.Categorical(chroms),
+                             'start': start, 'end': end, 'strand': strand})
+
+
+class JunctionMatrix(object):
+    """Catherpes JunctionMatrix is a Python class for memory-mapped
+    junction matrices written by merge_junctions.
+
+    The matrix is stored as compressed sparse columns with one column
+    per sample.  The junction IDs of sample i are
+    indices[indptr[i]:indptr[i + 1]], sorted, and the read counts for
+    them are at the same positions in the arrays of the counts
+    dictionary, one for 'unique' and one for 'multi'.  The junctions
+    attribute gives the chrom, start, end and strand of each ID.
+    """
+
+    def __init__(self, path):
+        """Args:
+            path (str): The directory written by merge_junctions.
+
+        """
+
+        with open(os.path.join(path, MATRIX_META)) as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.samples = meta['samples']
+        self.sample_index = {name: i for (i, name) in enumerate(self.samples)}
+        (self.junctions, _) = store.load_frame(os.path.join(path, 'junctions'))
+        self.indptr = np.fromfile(os.path.join(path, 'indptr.bin'),
+                                  dtype=np.int64)
+        self.indices = _map(os.path.join(path, 'indices.bin'), np.int32,
+                            meta['entries'])
+        self.counts = {name: _map(os.path.join(path, name + '.bin'), np.int32,
+                                  meta['entries'])
+                       for name in COUNTS}
+
+    def __len__(self):
+        return len(self.junctions)
+
+    def sample(self, name, kind='unique'):
+        """Get the read counts of one sample.
+
+        Args:
+            name (str): The sample name.
+
+            kind (str): 'unique' or 'multi' mapping reads.
+
+        Returns:
+            An int32 array with a count for every junction.
+        """
+
+        i = self.sample_index[name]
+        (first, last) = self.indptr[i:i + 2]
+        counts = np.zeros(len(self), dtype=np.int32)
+        counts[self.indices[first:last]] = self.counts[kind][first:last]
+
+        return counts
+
+    def totals(self, kind='unique', samples=None):
+        """Get the read counts of each junction summed over samples.
+
+        Args:
+            kind (str)    : 'unique' or 'multi' mapping reads.
+
+            samples (list): Only sum these sample names.
+
+        Returns:
+            An int64 array with a total for every junction.
+        """
+
+        totals = np.zeros(len(self), dtype=np.int64)
+        for name in self.samples if samples is None else samples:
+            i = self.sample_index[name]
+            (first, last) = self.indptr[i:i + 2]
+            totals += np.bincount(self.indices[first:last],
+                                  weights=self.counts[kind][first:last],
+                                  minlength=len(self)).astype(np.int64)
+
+        return totals
+
+    def dense(self, junctions, kind='unique', samples=None):
+        """Get the read counts of some junctions as a dense matrix.
+
+        Args:
+            junctions     : An array of junction IDs.
+
+            kind (str)    : 'unique' or 'multi' mapping reads.
+
+            samples (list): Only include these sample names, in this
+                            order.  Defaults to all samples.
+
+        Returns:
+            An int32 array of junctions by samples.
+        """
+
+        junctions = np.asarray(junctions, dtype=np.int64)
+        samples = self.samples if samples is None else samples
+        position = np.full(len(self), -1, dtype=np.int64)
+        position[junctions] = np.arange(len(junctions))
+        matrix = np.zeros((len(junctions), len(samples)), dtype=np.int32)
+        for (j, name) in enumerate(samples):
+            i = self.sample_index[name]
+            (first, last) = self.indptr[i:i + 2]
+            rows = position[self.indices[first:last]]
+            keep = rows >= 0
+            matrix[rows[keep], j] = self.counts[kind][first:last][keep]
+
+        return matrix
+
+
+class JunctionAnnotator(object):
+    """Catherpes JunctionAnnotator is a Python class for labelling
+    splice junctions against the introns of a set of gene models.
+
+    A junction is known if an annotated intron has the same start and
+    end.  If only one end is an annotated splice site it is a novel
+    donor or novel acceptor depending on the strand, if both are
+    annotated sites but never of the same intron it is a novel exon
+    skip and otherwise it is novel.  Junctions with an undefined strand
+    take the strand of their annotated splice site.
+    """
+
+    def __init__(self, gff):
+        """Args:
+            gff (GFF): The gene models, in any format.
+
+        """
+
+        df = gff.to_frame()
+        (parents, genes, transcripts) = hierarchy(df)
+        types = df['type'].to_numpy(dtype=object)
+        ids = df['ID'].to_numpy(dtype=object)
+        attributes = df['attributes'].to_numpy(dtype=object)
+        names = df['Name'].to_numpy(dtype=object)
+
+        tx_rows = np.unique(transcripts[types == 'exon'])
+        tx_rows = tx_rows[tx_rows >= 0]
+        row_of = {}
+        for (row, id) in zip(tx_rows.tolist(), ids[tx_rows].tolist()):
+            row_of.setdefault(id, row)
+
+        introns = gff.introns()
+        intron_tx = np.array([row_of.get(id, -1) for id in introns['Parent']],
+                             dtype=np.int64)
+        intron_gene = np.where(intron_tx >= 0,
+                               genes[np.maximum(intron_tx, 0)], -1)
+        gene_ids = stable_ids(attributes, ids, intron_gene, 'gene_id=')
+        gene_names = np.where(intron_gene >= 0,
+                              names[np.maximum(intron_gene, 0)], None)
+
+        seqids = introns['seqid'].to_numpy(dtype=object)
+        starts = introns['start'].to_numpy(dtype=np.int64)
+        ends = introns['end'].to_numpy(dtype=np.int64)
+        strands = introns['strand'].to_numpy(dtype=object)
+        self.introns = _site_table(seqids, _pack(starts, ends, 0), strands,
+                                   gene_ids, gene_names)
+        self.starts = _site_table(seqids, starts, strands, gene_ids,
+                                  gene_names)
+        self.ends = _site_table(seqids, ends, strands, gene_ids, gene_names)
+
+        gene_rows = np.unique(genes[tx_rows])
+        self.gene_ids = stable_ids(attributes, ids, gene_rows, 'gene_id=')
+        self.gene_names = np.where(pd.isna(names[gene_rows]), self.gene_ids,
+                                   names[gene_rows])
+        self.genes = IntervalIndex(
+            df['seqid'].to_numpy(dtype=object)[gene_rows],
+            df['start'].to_numpy(dtype=np.int64)[gene_rows],
+            df['end'].to_numpy(dtype=np.int64)[gene_rows])
+
+    def annotate(self, sj):
+        """Label a batch of junctions.
+
+        Args:
+            sj: A DataFrame with the chrom, start, end and strand
+                columns of read_sj, or the path/name of a SJ.out.tab
+                file.
+
+        Returns:
+            A DataFrame with one row per junction and columns category
+            (one of CATEGORIES), genes and gene_names holding
+            comma-separated identifiers.  Novel junctions are given the
+            genes they lie within.
+        """
+
+        if isinstance(sj, str):
+            sj = read_sj(sj)
+
+        size = len(sj)
+        chroms = sj['chrom'].to_numpy(dtype=object)
+        starts = sj['start'].to_numpy(dtype=np.int64)
+        ends = sj['end'].to_numpy(dtype=np.int64)
+        strands = np.array(['.', '+', '-'], dtype=object)[
+            sj['strand'].to_numpy(dtype=np.int64)]
+
+        category = np.full(size, CATEGORIES.index('novel'), dtype=np.int8)
+        genes = np.full(size, '', dtype=object)
+        gene_names = np.full(size, '', dtype=object)
+        (codes, uniques) = pd.factorize(chroms)
+        for (code, chrom) in enumerate(uniques):
+            if chrom not in self.introns:
+                continue
+            rows = np.flatnonzero(codes == code)
+            (known, k) = _find(self.introns, chrom,
+                               _pack(starts[rows], ends[rows], 0))
+            (donor, d) = _find(self.starts, chrom, starts[rows])
+            (acceptor, a) = _find(self.ends, chrom, ends[rows])
+
+            strand = strands[rows]
+            undefined = strand == '.'
+            if undefined.any():
+                both = undefined & donor
+                strand[both] = self.starts[chrom][1][d][both]
+                only = undefined & ~donor & acceptor
+                strand[only] = self.ends[chrom][1][a][only]
+            minus = strand == '-'
+
+            first = donor & ~acceptor
+            last = acceptor & ~donor
+            code_of = CATEGORIES.index
+            labels = np.full(len(rows), code_of('novel'), dtype=np.int8)
+            labels[known] = code_of('known')
+            labels[donor & acceptor & ~known] = code_of('novel_exon_skip')
+            labels[(first & minus) | (last & ~minus)] = code_of('novel_donor')
+            labels[(first & ~minus) | (last & minus)] = code_of(
+                'novel_acceptor')
+            category[rows] = labels
+
+            for (mask, table, position) in ((first, self.starts, d),
+                                            (last, self.ends, a),
+                                            (known, self.introns, k)):
+                genes[rows[mask]] = table[chrom][2][position[mask]]
+                gene_names[rows[mask]] = table[chrom][3][position[mask]]
+
+            skip = donor & acceptor & ~known
+            if skip.any():
+                (starts_of, ends_of) = (self.starts[chrom], self.ends[chrom])
+                pairs = zip(starts_of[2][d[skip]], ends_of[2][a[skip]],
+                            starts_of[3][d[skip]], ends_of[3][a[skip]])
+                merged = [(_union(g1, g2), _union(n1, n2))
+                          for (g1, g2, n1, n2) in pairs]
+                genes[rows[skip]] = [g for (g, n) in merged]
+                gene_names[rows[skip]] = [n for (g, n) in merged]
+
+        novel = np.flatnonzero(category == CATEGORIES.index('novel'))
+        (query_idx, gene_idx) = self.genes.query_batch(chroms[novel],
+                                                       starts[novel],
+                                                       ends[novel])
+        genes[novel] = join_groups(query_idx, self.gene_ids[gene_idx].tolist(),
+                                   len(novel))
+        gene_names[novel] = join_groups(query_idx,
+                                        self.gene_names[gene_idx].tolist(),
+                                        len(novel))
+
+        return pd.DataFrame({
+            'category': pd.Categorical.from_codes(category,
+                                                  categories=CATEGORIES),
+            'genes': genes,
+            'gene_names': gene_names})
+
+    def annotate_sj(self, file, chunk_size=CHUNK_SIZE):
+        """Label the junctions of a SJ.out.tab file.
+
+        Args:
+            file (str)      : The path/name of the SJ.out.tab file.
+
+            chunk_size (int): The number of junctions labelled at a
+                              time.
+
+        Yields:
+            A DataFrame for each chunk of junctions with the SJ.out.tab
+            columns followed by the annotate columns.
+        """
+
+        for chunk in TSV(file, schema='sj', chunk_size=chunk_size):
+            chunk = chunk.reset_index(drop=True)
+            yield pd.concat([chunk, self.annotate(chunk)], axis=1)
+
+
+def _igv_name(sj, unique):
+    """Build the IGV name column of STAR junctions from whole columns
+    of strings, with the constant text folded into the motif and
+    annotated lookups."""
+
+    return list(map(''.join, zip(MOTIF_TEXT[sj['motif'].to_numpy()], unique,
+                                 repeat(OVERHANG_TEXT), _str(sj['overhang']),
+                                 ANNOTATED_TEXT[sj['annotated'].to_numpy()])))
+
+
+def _str(series):
+    """Convert an int column to a list of strings."""
+    return list(map(str, series.tolist()))
+
+
+def _site_table(seqids, keys, strands, genes, names):
+    """Build a sorted lookup table of intron keys or splice sites.
+
+    Args:
+        seqids (array) : The seqid of each intron.
+
+        keys (array)   : The int64 key of each intron.
+
+        strands (array): The strand of each intron.
+
+        genes (array)  : The gene ID of each intron, or None.
+
+        names (array)  : The gene name of each intron, or None.
+
+    Returns:
+        A dictionary of seqid to a tuple of (keys, strands, genes,
+        names) arrays with one entry per distinct sorted key and the
+        genes and names of all introns with the key joined by commas.
+    """
+
+    table = {}
+    (codes, uniques) = pd.factorize(seqids)
+    for (code, seqid) in enumerate(uniques):
+        rows = np.flatnonzero(codes == code)
+        (unique, first, inverse) = np.unique(keys[rows], return_index=True,
+                                             return_inverse=True)
+        values = pd.DataFrame({'key': inverse, 'gene': genes[rows],
+                               'name': names[rows]})
+        values = values.dropna(subset=['gene']).drop_duplicates(['key',
+                                                                 'gene'])
+        values = values.sort_values('key', kind='stable')
+        values['name'] = values['name'].fillna(values['gene'])
+        table[seqid] = (unique, strands[rows][first],
+                        join_groups(values['key'].to_numpy(),
+                                    values['gene'].tolist(), len(unique)),
+                        join_groups(values['key'].to_numpy(),
+                                    values['name'].tolist(), len(unique)))
+
+    return table
+
+
+def _find(table, seqid, keys):
+    """Look up a batch of keys of one seqid in a _site_table.
+
+    Returns:
+        A tuple of (found, position) arrays, where position is the
+        entry of each found key in the seqid's table.
+    """
+
+    if len(keys) == 0:
+        return (np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64))
+    unique = table[seqid][0]
+    position = np.minimum(np.searchsorted(unique, keys), len(unique) - 1)
+
+    return (unique[position] == keys, position)
+
+
+def _union(first, second):
+    """Join the distinct values of two comma-separated lists."""
+
+    if first == second or not second:
+        return first
+    if not first:
+        return second
+    return ','.join(dict.fromkeys(first.split(',') + second.split(',')))
+
+
+def _read_keys(entry):
+    """Read the junction keys and read counts of one SJ.out.tab file.
+
+    Args:
+        entry (tuple): The (sample, path) of the file.
+
+    Returns:
+        A tuple of (chroms, codes, keys, counts) where codes index the
+        chroms list, keys are from _pack and counts holds int32 arrays
+        of the unique and multi-mapping reads.
+    """
+
+    (sample, file) = entry
+    sj = read_sj(file, columns=['chrom', 'start', 'end', 'strand'] +
+                 list(COUNTS))
+    if not isinstance(sj['chrom'].dtype, pd.CategoricalDtype):
+        sj['chrom'] = sj['chrom'].astype('category')
+    keys = _pack(sj['start'].to_numpy(dtype=np.int64),
+                 sj['end'].to_numpy(dtype=np.int64),
+                 sj['strand'].to_numpy(dtype=np.int64))
+    counts = {name: sj[name].to_numpy(dtype=np.int32) for name in COUNTS}
+
+    return (sj['chrom'].cat.categories.tolist(),
+            sj['chrom'].cat.codes.to_numpy(), keys, counts)
+
+
+def _pack(start, end, strand):
+    """Pack junction starts, ends and strand codes into int64 keys."""
+
+    if len(start) and (start.max() >= MAX_START or end.max() >= MAX_END):
+        raise ValueError('Junction coordinates are too large to index')
+    return (start << 33) | (end << 2) | strand
+
+
+def _unpack(keys):
+    """Unpack int64 keys into starts, ends and strand codes."""
+
+    return (keys >> 33, (keys >> 2) & (MAX_END - 1),
+            (keys & 3).astype(np.int8))
+
+
+def _map(file, dtype, size):
+    """Memory-map a vector file read-only."""
+
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode='r', shape=(size,))
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("files", nargs="+", help="Required path/name of "
+                        "one or more STAR SJ.out.tab files")
+
+    # Optional argument which requires a parameter (eg. -o out.bed)
+    parser.add_argument("-o", "--output", action="store", dest="output",
+                        help="The output file, standard output by default")
+
+    # Optional argument which requires a parameter (eg. -m cohort.junctions)
+    parser.add_argument("-m", "--matrix", action="store", dest="matrix",
+                        help="Merge the files into a junction matrix in "
+                        "this directory")
+
+    # Optional argument which requires a parameter (eg. -g genes.gff3.gz)
+    parser.add_argument("-g", "--gff", action="store", dest="gff",
+                        help="Label the junctions against this GFF3 file")
+
+    # Optional argument which requires a parameter (eg. -w 16)
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        default=1, help="The number of worker processes")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
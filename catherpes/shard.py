@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+"""The catherpes shard.py module splits GFF3, VCF and BED files into
+genomic regions and runs a function on each region in a process pool.
+
+Bgzip compressed files with a catherpes.index index are split into
+regions of a fixed size along each seqid, with the extent of each
+seqid taken from the largest record end in the index or a genome
+file, and each worker reads only its region through the index.  Other
+files are split at the boundaries between runs of records with the
+same seqid, found in one scan, and each worker seeks straight to its
+run (plain text and bgzip files) or scans for it (gzip files).
+
+Each record belongs to the shard that contains its start, so records
+that cross a shard boundary are processed exactly once.  Results are
+yielded in shard order, which is coordinate order, and only a limited
+number of shards are submitted ahead of the consumer so that a slow
+consumer holds back the workers rather than filling memory.
+
+Example:
+    Count the records of each region of an indexed file::
+
+        def count(shard):
+            return sum(1 for line in shard.lines())
+
+        for (shard, n) in run_shards(count, make_shards(file, 'vcf')):
+            print(shard.region, n)
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import gzip
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from catherpes import bgzf
+from catherpes import index
+
+# The first bin and the bin size shift of each level of the binning
+# scheme, from the 512 Mb bin down to the 16 kb bins.
+BIN_LEVELS = ((0, 29), (1, 26), (9, 23), (73, 20), (585, 17), (4681, 14))
+
+
+def main(args):
+    """ Main entry point of the app """
+    print("catherpes/Shard")
+    print(args)
+
+    shards = make_shards(args.file, preset=args.preset, size=args.size)
+    for (shard, count) in run_shards(_count, shards, workers=args.workers):
+        print('{}\t{}'.format(shard.region, count))
+
+
+class Shard(object):
+    """Catherpes Shard is a Python class for one genomic region of a
+    file that can be sent to a worker process.
+    """
+
+    def __init__(self, file, preset, seqid, start, end, offsets=None):
+        """Args:
+            file (str)    : The path/name of the file.
+
+            preset (str)  : The type of the file, one of 'gff', 'vcf'
+                            or 'bed'.
+
+            seqid (str)   : The seqid of the region.
+
+            start (int)   : The 1-based start of the region.
+
+            end (int)     : The 1-based inclusive end of the region.
+
+            offsets (tuple): The (start, end) byte offsets, or virtual
+                            offsets for bgzip files, of the run of
+                            records in the file.  None to read through
+                            the index or by scanning.
+
+        """
+
+        self.file = file
+        self.preset = preset
+        self.seqid = seqid
+        self.start = start
+        self.end = end
+        self.offsets = offsets
+
+    def __repr__(self):
+        return 'Shard({})'.format(self.region)
+
+    @property
+    def region(self):
+        """The region as a 'seqid:start-end' string."""
+        return '{}:{}-{}'.format(self.seqid, self.start, self.end)
+
+    def lines(self):
+        """Iterate over the records that start in the shard.
+
+        Yields:
+            The text of each record without the newline.
+        """
+
+        columns = index.PRESETS[self.preset]
+        for line in self._lines():
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            (seqid, beg, end) = index._coords(line, columns)
+            if seqid == self.seqid and self.start <= beg + 1 <= self.end:
+                yield line
+
+    def _lines(self):
+        """Read the lines that may hold records of the shard."""
+
+        if self.offsets is None:
+            if os.path.exists(self.file + index.EXTENSION):
+                yield from index.fetch(self.file, self.region,
+                                       preset=self.preset)
+            else:
+                with _open_text(self.file) as f:
+                    yield from f
+            return
+
+        (start, end) = self.offsets
+        with _open_offsets(self.file) as reader:
+            reader.seek(start)
+            while reader.tell() < end:
+                line = reader.readline()
+                if not line:
+                    break
+                yield line.decode()
+
+
+def make_shards(file, preset='gff', size=None, genome=None):
+    """Split a file into shards in coordinate order.
+
+    Args:
+        file (str)   : The path/name of the file.
+
+        preset (str) : The type of the file, one of 'gff', 'vcf' or
+                       'bed'.
+
+        size (int)   : The length of the regions for indexed files.
+                       Defaults to one shard per seqid.
+
+        genome (dict): The length of each seqid, as returned by
+                       catherpes.bed.read_genome, to use instead of the
+                       largest record end recorded in the index.
+
+    Returns:
+        A list of Shard objects.
+    """
+
+    if os.path.exists(file + index.EXTENSION):
+        loaded = index.load_index(file)
+        if loaded.lengths is not None:
+            extents = dict(zip(loaded.seqids, loaded.lengths.tolist()))
+        else:
+            # Older indexes only bound a seqid by the bins of its
+            # records, which reach 512 Mb for the largest records.
+            extents = {}
+            for (code, bin) in zip(loaded.chunk_seqids.tolist(),
+                                   loaded.bins.tolist()):
+                seqid = loaded.seqids[code]
+                extents[seqid] = max(extents.get(seqid, 0), _bin_end(bin))
+
+        shards = []
+        for seqid in loaded.seqids:
+            length = min(extents[seqid], index.MAX_COORD)
+            if genome is not None and seqid in genome:
+                length = genome[seqid]
+            step = size or length
+            for start in range(1, length + 1, step):
+                shards.append(Shard(file, preset, seqid, start,
+                                    min(start + step - 1, length)))
+        return shards
+
+    runs = _scan_runs(file, preset)
+    if runs and runs[0][1] is None:
+        # Without offsets each shard scans the whole file for its
+        # seqid, so a seqid must only have one shard.
+        seqids = list(dict.fromkeys(run[0] for run in runs))
+        runs = [(seqid, None, None) for seqid in seqids]
+
+    return [Shard(file, preset, seqid, 1, index.MAX_COORD,
+                  None if start is None else (start, end))
+            for (seqid, start, end) in runs]
+
+
+def run_shards(function, shards, workers=None, ordered=True, max_pending=None):
+    """Run a function on each shard in a process pool.
+
+    Args:
+        function         : A function taking a Shard and returning a
+                           result.  It must be importable by the worker
+                           processes (defined at module level).
+
+        shards           : An iterable of Shard objects.
+
+        workers (int)    : The number of processes.  Defaults to the
+                           number of CPUs; 1 runs the function in this
+                           process.
+
+        ordered (bool)   : Yield results in shard order.  If False
+                           results are yielded as they complete.
+
+        max_pending (int): The most shards submitted but not yet
+                           yielded.  Defaults to twice the workers.
+
+    Yields:
+        A tuple of (shard, result) for each shard.
+    """
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for shard in shards:
+            yield (shard, function(shard))
+        return
+
+    max_pending = max_pending or 2 * workers
+    shards = iter(shards)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def fill():
+            while len(pending) < max_pending:
+                shard = next(shards, None)
+                if shard is None:
+                    return
+                pending.append((shard, executor.submit(function, shard)))
+
+        fill()
+        while pending:
+            if ordered:
+                (shard, future) = pending.popleft()
+            else:
+                wait([future for (shard, future) in pending],
+                     return_when=FIRST_COMPLETED)
+                (shard, future) = next(item for item in pending
+                                       if item[1].done())
+                pending.remove((shard, future))
+            result = future.result()
+            fill()
+            yield (shard, result)
+
+
+def _bin_end(bin):
+    """Get the 0-based exclusive end of the region a bin covers."""
+
+    for (first, shift) in reversed(BIN_LEVELS):
+        if bin >= first:
+            return (bin - first + 1) << shift
+    return 0
+
+
+def _is_gzip(file):
+    """Test if a file is gzip (or bgzip) compressed."""
+
+    with open(file, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+
+def _open_text(file):
+    """Open a text file that may be gzip compressed."""
+
+    if _is_gzip(file):
+        return gzip.open(file, 'rt')
+    return open(file)
+
+
+def _open_offsets(file):
+    """Open a file for reading by (virtual) offset."""
+
+    if bgzf.is_bgzf(file):
+        return bgzf.BgzfReader(file)
+    return open(file, 'rb')
+
+
+def _scan_runs(file, preset):
+    """Find the runs of records with the same seqid in a file.
+
+    Args:
+        file (str)  : The path/name of the file.
+
+        preset (str): The type of the file.
+
+    Returns:
+        A list of (seqid, start, end) tuples with the offsets of each
+        run, or None offsets for gzip files that cannot seek.
+    """
+
+    column = index.PRESETS[preset]['seqid']
+    seekable = not _is_gzip(file) or bgzf.is_bgzf(file)
+    runs = []
+    opened = _open_offsets(file) if seekable else gzip.open(file, 'rb')
+    with opened as reader:
+        while True:
+            offset = reader.tell() if seekable else None
+            line = reader.readline()
+            if not line:
+                break
+            if line.startswith(b'#') or not line.strip():
+                continue
+            seqid = line.split(b'\t', column + 1)[column].decode()
+            if not runs or runs[-1][0] != seqid:
+                if runs and seekable:
+                    runs[-1][2] = offset
+                runs.append([seqid, offset, None])
+        if runs and seekable:
+            runs[-1][2] = reader.tell()
+
+    return [tuple(run) for run in runs]
+
+
+def _count(shard):
+    """Count the records of a shard."""
+    return sum(1 for line in shard.lines())
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional argument
+    parser.add_argument("file", help="Required path/name of a file")
+
+    # Optional argument which requires a parameter (eg. -p vcf)
+    parser.add_argument("-p", "--preset", action="store", dest="preset",
+                        default='gff', choices=sorted(index.PRESETS),
+                        help="The type of the file")
+
+    # Optional argument which requires a parameter (eg. -s 10000000)
+    parser.add_argument("-s", "--size", action="store", type=int,
+                        help="The length of the regions of indexed files")
+
+    # Optional argument which requires a parameter (eg. -w 8)
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        help="The number of worker processes")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
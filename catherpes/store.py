@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""The catherpes store.py module saves pandas DataFrames as a
+directory of binary column files that can be memory-mapped back in.
+
+Numeric columns are written as .npy files and the codes of
+categorical columns are written the same way, so loading them maps
+the files with no copy and no parsing.  String columns are written as
+one block of UTF-8 bytes plus an array of offsets, which is mapped
+too but decoded to Python strings one value at a time on load, so
+string columns still cost time in proportion to their length.  A
+meta.json file describes the columns and can carry extra metadata for
+the caller.
+
+Example:
+    Save and reload a DataFrame::
+
+        save_frame(df, 'cache/chr22')
+        (df, meta) = load_frame('cache/chr22')
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+META = 'meta.json'
+
+
+def save_frame(df, path, meta=None):
+    """Save a DataFrame to a directory of column files.
+
+    Args:
+        df (DataFrame): The DataFrame to save.  The index is not saved.
+
+        path (str)    : The directory to write, which is created if
+                        needed.
+
+        meta (dict)   : Extra JSON serializable metadata to store.
+
+    Returns: No return value.
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    columns = []
+    for (i, name) in enumerate(df.columns):
+        series = df[name]
+        base = os.path.join(path, str(i))
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(base + '.npy', series.cat.codes.to_numpy())
+            columns.append({'name': name, 'kind': 'categorical',
+                            'categories': series.cat.categories.tolist()})
+        elif series.dtype.kind in 'biufc':
+            np.save(base + '.npy', series.to_numpy())
+            columns.append({'name': name, 'kind': 'numeric'})
+        else:
+            (blob, offsets) = _encode_strings(series)
+            np.save(base + '.npy', blob)
+            np.save(base + '.offsets.npy', offsets)
+            columns.append({'name': name, 'kind': 'string'})
+
+    with open(os.path.join(path, META), 'w') as f:
+        json.dump({'rows': len(df), 'columns': columns,
+                   'meta': meta or {}}, f)
+
+
+def load_frame(path, mmap=True):
+    """Load a DataFrame saved by save_frame.
+
+    Args:
+        path (str) : The directory the DataFrame was saved to.
+
+        mmap (bool): Memory-map the numeric and categorical code
+                     columns rather than reading them into memory.
+                     String columns are always decoded into lists of
+                     Python strings.
+
+    Returns:
+        A tuple of (DataFrame, meta) where meta is the extra metadata
+        passed to save_frame.
+    """
+
+    info = read_meta(path)
+    mode = 'r' if mmap else None
+
+    data = {}
+    for (i, column) in enumerate(info['columns']):
+        base = os.path.join(path, str(i))
+        values = np.load(base + '.npy', mmap_mode=mode)
+        if column['kind'] == 'categorical':
+            data[column['name']] = pd.Categorical.from_codes(
+                values, categories=column['categories'])
+        elif column['kind'] == 'numeric':
+            data[column['name']] = values
+        else:
+            offsets = np.load(base + '.offsets.npy', mmap_mode=mode)
+            data[column['name']] = _decode_strings(values, offsets)
+
+    df = pd.DataFrame(data, copy=False)
+    if not data:
+        df = pd.DataFrame(index=range(info['rows']))
+
+    return (df, info['meta'])
+
+
+def read_meta(path):
+    """Read the metadata of a saved DataFrame without loading it.
+
+    Args:
+        path (str): The directory the DataFrame was saved to.
+
+    Returns:
+        The dictionary from meta.json with 'rows', 'columns' and
+        'meta' keys.
+    """
+
+    with open(os.path.join(path, META)) as f:
+        return json.load(f)
+
+
+def write_meta(path, meta):
+    """Replace the extra metadata of a saved DataFrame without
+    rewriting its columns.
+
+    Args:
+        path (str) : The directory the DataFrame was saved to.
+
+        meta (dict): The new extra JSON serializable metadata.
+
+    Returns: No return value.
+    """
+
+    info = read_meta(path)
+    info['meta'] = meta
+    tmp = os.path.join(path, META + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(info, f)
+    os.replace(tmp, os.path.join(path, META))
+
+
+def _encode_strings(series):
+    """Encode a column of strings as a block of bytes and offsets.
+
+    Args:
+        series (Series): The column to encode.  Missing values are
+                         recorded with an offset of -1.
+
+    Returns:
+        A tuple of (blob, offsets) where blob is a uint8 array and
+        offsets is an int64 array of the end of each value, or -1 for
+        missing values.
+    """
+
+    values = series.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    encoded = [b'' if m else str(v).encode()
+               for (v, m) in zip(values, missing)]
+    ends = np.cumsum([len(v) for v in encoded], dtype=np.int64)
+    ends[missing] = -1
+
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return (blob, ends)
+
+
+def _decode_strings(blob, offsets):
+    """Decode a column of strings encoded by _encode_strings.
+
+    Args:
+        blob (array)   : The uint8 array of UTF-8 bytes.
+
+        offsets (array): The int64 array of end offsets.
+
+    Returns:
+        A list of strings with None for missing values.
+    """
+
+    data = blob.tobytes() if isinstance(blob, np.ndarray) else blob
+    values = []
+    start = 0
+    for end in offsets.tolist():
+        if end < 0:
+            values.append(None)
+        else:
+            values.append(data[start:end].decode())
+            start = end
+
+    return values
@@ -1,6 +1,26 @@
 #!/usr/bin/env python3
-"""
-Module Docstring
+
+"""The catherpes tsv.py module provides a class for reading large
+tab-delimited files in fixed-size chunks of typed columns.
+
+A schema names the columns of a file and gives each one a dtype.
+Leading comment lines are kept, an optional header line supplies the
+column names when there is no schema and only the projected columns
+are converted, each straight to its dtype by the pandas C parser.
+Rows are returned a chunk at a time so files larger than memory can be
+processed in a bounded amount of memory.
+
+Schemas for the STAR SJ.out.tab and HPO phenotype_to_genes.txt files
+are included.  Files with a header line such as the VIQ output can be
+read with header=True and dtypes given for just the columns needed.
+
+Example:
+    Sum the uniquely mapped reads of a STAR junction file::
+
+        reader = TSV('sample.SJ.out.tab', schema='sj',
+                     columns=['unique'])
+        total = sum(chunk['unique'].sum() for chunk in reader)
+
 """
 
 __author__ = "Barry Moore"
@@ -8,33 +28,246 @@ __version__ = "0.1.0"
 __license__ = "GNU GPL"
 
 import argparse
+import csv
+import gzip
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 1000000
+
+# The columns and dtypes of the tool outputs we read most often.  The
+# header flag says whether the first line after the comments holds
+# column names and skip is a number of lines to drop unread first.
+# phenotype_to_genes.txt starts with one '#Format:' or header line
+# depending on the release, so that line is always skipped.
+SCHEMAS = {
+    'sj': {
+        'columns': [('chrom', 'category'), ('start', np.int64),
+                    ('end', np.int64), ('strand', np.int8),
+                    ('motif', np.int8), ('annotated', np.int8),
+                    ('unique', np.int32), ('multi', np.int32),
+                    ('overhang', np.int32)],
+        'header': False,
+        'skip': 0,
+    },
+    'phenotype_to_genes': {
+        'columns': [('id', 'category'), ('term', 'category'),
+                    ('gene_id', np.int64), ('gene', 'category'),
+                    ('source_info', object), ('source_id', object),
+                    ('disease_id', object)],
+        'header': False,
+        'skip': 1,
+    },
+}
 
 
 def main(args):
     """ Main entry point of the app """
-    print("hello world")
+    print("catherpes/TSV")
     print(args)
 
+    reader = TSV(args.file, schema=args.schema, header=args.header,
+                 columns=args.columns and args.columns.split(','))
+    rows = 0
+    for chunk in reader:
+        rows += len(chunk)
+    print('{} rows'.format(rows))
+    print(chunk.dtypes)
+
+
+class TSV(object):
+    """Catherpes TSV is a Python class for reading tab-delimited files
+    in chunks of typed columns.
+    """
+
+    def __init__(self, file, schema=None, columns=None, dtypes=None,
+                 header=None, skip=None, comment='#',
+                 na_values=('', '.', 'NA'), chunk_size=CHUNK_SIZE):
+        """Args:
+            file (str)       : The path/name of the file, which may be
+                               gzip compressed.
+
+            schema           : A name in SCHEMAS, or a list of (name,
+                               dtype) tuples for every column of the
+                               file.  Without a schema the names come
+                               from the header line (or are numbered)
+                               and the dtypes are inferred.
+
+            columns (list)   : Only read these columns, in this order.
+
+            dtypes (dict)    : Dtypes by column name, overriding the
+                               schema.
+
+            header (bool)    : The first line after any comments holds
+                               the column names.  Defaults to the
+                               schema's setting, or True with no schema.
+                               With a schema the header names are
+                               replaced by the schema names.
+
+            skip (int)       : The number of lines to skip before
+                               looking for comments and the header.
+                               Defaults to the schema's setting or 0.
+
+            comment (str)    : Leading lines starting with this are kept
+                               in the comments attribute.  None to keep
+                               no comments.
+
+            na_values (tuple): Strings read as missing values.
+
+            chunk_size (int) : The number of rows in each chunk.
+
+        """
+
+        if isinstance(schema, str):
+            if header is None:
+                header = SCHEMAS[schema]['header']
+            if skip is None:
+                skip = SCHEMAS[schema]['skip']
+            schema = SCHEMAS[schema]['columns']
+        if header is None:
+            header = schema is None
+
+        self.file = file
+        self.schema = None if schema is None else list(schema)
+        self.columns = None if columns is None else list(columns)
+        self.dtypes = dict(self.schema or [])
+        self.dtypes.update(dtypes or {})
+        self.header = header
+        self.skip = skip or 0
+        self.comment = comment
+        self.na_values = list(na_values)
+        self.chunk_size = chunk_size
+        self.comments = []
+        self.names = (None if schema is None
+                      else [name for (name, dtype) in schema])
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+    def iter_chunks(self):
+        """Iterate over the file a chunk of rows at a time.
+
+        Yields:
+            A DataFrame of up to chunk_size rows with the projected
+            columns converted to their dtypes.
+        """
+
+        with _open(self.file) as f:
+            self._read_header(f)
+            names = self.names
+            usecols = self.columns
+            dtypes = self.dtypes
+            if usecols is not None and names is not None:
+                missing = [name for name in usecols if name not in names]
+                if missing:
+                    raise ValueError('Unknown columns: {}'.format(
+                        ', '.join(missing)))
+                dtypes = {name: dtype for (name, dtype) in dtypes.items()
+                          if name in usecols}
+
+            try:
+                reader = pd.read_csv(f, sep='\t', header=None, names=names,
+                                     usecols=usecols, dtype=dtypes or None,
+                                     na_values=self.na_values,
+                                     keep_default_na=False, index_col=False,
+                                     quoting=csv.QUOTE_NONE,
+                                     chunksize=self.chunk_size)
+            except pd.errors.EmptyDataError:
+                return
+            for chunk in reader:
+                if usecols is not None:
+                    chunk = chunk[usecols]
+                yield chunk
+
+    def iter_arrays(self):
+        """Iterate over the file a chunk of rows at a time as numpy
+        arrays.
+
+        Yields:
+            A dictionary of column name to numpy array for each chunk.
+            Categorical columns are given as object arrays of values.
+        """
+
+        for chunk in self.iter_chunks():
+            yield {name: chunk[name].to_numpy() for name in chunk.columns}
+
+    def read(self):
+        """Read the whole file.
+
+        Returns:
+            A DataFrame.  Categorical columns are unified across chunks.
+        """
+
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return pd.DataFrame(columns=self.columns or self.names)
+        for name in chunks[0].columns:
+            if isinstance(chunks[0][name].dtype, pd.CategoricalDtype):
+                categories = pd.api.types.union_categoricals(
+                    [chunk[name] for chunk in chunks]).categories
+                for chunk in chunks:
+                    chunk[name] = chunk[name].cat.set_categories(categories)
+
+        return pd.concat(chunks, ignore_index=True)
+
+    def _read_header(self, f):
+        """Read the comment and header lines and leave the file at the
+        first data line.
+
+        Args:
+            f: The open file.
+
+        Returns: No return value.
+        """
+
+        self.comments = []
+        for i in range(self.skip):
+            f.readline()
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if self.comment is not None and line.startswith(self.comment):
+                self.comments.append(line.rstrip('\n'))
+                continue
+            if self.header:
+                names = line.rstrip('\n').split('\t')
+                if self.schema is None:
+                    self.names = names
+                offset = f.tell()
+            break
+        f.seek(offset)
+
+
+def _open(file):
+    """Open a text file that may be gzip compressed."""
+
+    with open(file, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(file, 'rt')
+    return open(file)
+
 if __name__ == "__main__":
     """ This is executed when run from the command line """
     parser = argparse.ArgumentParser()
 
     # Required positional argument
-    parser.add_argument("arg", help="Required positional argument")
+    parser.add_argument("file", help="Required path/name of a TSV file")
 
-    # Optional argument flag which defaults to False
-    parser.add_argument("-f", "--flag", action="store_true", default=False)
+    # Optional argument which requires a parameter (eg. -s sj)
+    parser.add_argument("-s", "--schema", action="store", dest="schema",
+                        choices=sorted(SCHEMAS), help="The file schema")
 
-    # Optional argument which requires a parameter (eg. -d test)
-    parser.add_argument("-n", "--name", action="store", dest="name")
+    # Optional argument which requires a parameter (eg. -c chrom,unique)
+    parser.add_argument("-c", "--columns", action="store", dest="columns",
+                        help="Comma separated columns to read")
 
-    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
-    parser.add_argument(
-        "-v",
-        "--verbose",
-        action="count",
-        default=0,
-        help="Verbosity (-v, -vv, etc)")
+    # Optional argument flag which defaults to the schema's setting
+    parser.add_argument("--header", action="store_true", default=None,
+                        help="The first non-comment line is a header")
 
     # Specify output of "--version"
     parser.add_argument(
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""The catherpes utils.py module holds the helpers shared by the
+parsers, writers and annotators.
+
+The helpers work on the columnar form of GFF data (GFF.to_frame) and
+on plain numpy arrays, finding attribute values with string searches,
+hashing source files, linking records to their parents, genes and
+transcripts by row number and joining grouped values, so each module
+that needs them builds on the same code.
+
+Example:
+    Get the gene and transcript row of every record::
+
+        df = GFF(file='genes.gff3.gz', format='df').data
+        (parents, genes, transcripts) = hierarchy(df)
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+def find_attribute(attrb_text, prefix):
+    """Find the value of a single attribute in the text of a GFF3
+    attributes column with string searches rather than splitting it.
+
+    Args:
+        attrb_text (str): The attributes column text.
+
+        prefix (str)    : The attribute key followed by '='.
+
+    Returns:
+        The value of the attribute or None if it is not present.
+    """
+
+    if attrb_text.startswith(prefix):
+        start = len(prefix)
+    else:
+        start = attrb_text.find(';' + prefix)
+        if start < 0:
+            return None
+        start += len(prefix) + 1
+
+    end = attrb_text.find(';', start)
+
+    return attrb_text[start:] if end < 0 else attrb_text[start:end]
+
+
+def file_hash(file):
+    """Get the content hash of a file.
+
+    Args:
+        file (str): The path/name of the file.
+
+    Returns:
+        The hex digest of the BLAKE2b hash of the file.
+    """
+
+    digest = hashlib.blake2b()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def parent_rows(df, explode=False):
+    """Map the Parent values of the data to row numbers.
+
+    Args:
+        df (DataFrame): The columnar GFF data.
+
+        explode (bool): Return a row for every parent of records with
+                        several comma-separated parents rather than
+                        only the first.
+
+    Returns:
+        If explode is False an array with the row of the first parent
+        of each record (-1 if none), otherwise a DataFrame of 'child'
+        and 'parent' row numbers.
+    """
+
+    ids = df['ID']
+    first = ids.notna() & ~ids.duplicated()
+    id_rows = pd.Series(np.flatnonzero(first.to_numpy()),
+                        index=ids[first].to_numpy(dtype=object))
+
+    parent = df['Parent'].astype(object)
+    if not explode:
+        parent = parent.where(parent.notna(), None)
+        first_parent = [p.split(',', 1)[0] if isinstance(p, str) else None
+                        for p in parent.tolist()]
+        rows = id_rows.reindex(first_parent).to_numpy()
+        return np.where(np.isnan(rows), -1, rows).astype(np.int64)
+
+    links = parent[parent.notna()].str.split(',').explode()
+    rows = id_rows.reindex(links.to_numpy(dtype=object)).to_numpy()
+    found = ~np.isnan(rows)
+    return pd.DataFrame({'child': links.index.to_numpy()[found],
+                         'parent': rows[found].astype(np.int64)})
+
+
+def hierarchy(df):
+    """Find the gene and transcript row of every record.
+
+    Args:
+        df (DataFrame): The columnar GFF data.
+
+    Returns:
+        A tuple of arrays (parents, genes, transcripts) holding the
+        row of the first parent, top level ancestor and second level
+        ancestor of each record, with -1 where there is none.
+    """
+
+    rows = np.arange(len(df))
+    parents = parent_rows(df)
+    grandparents = np.where(parents >= 0, parents[np.maximum(parents, 0)], -1)
+    genes = np.where(parents < 0, rows, np.where(grandparents < 0, parents,
+                                                 grandparents))
+    transcripts = np.where(parents < 0, -1, np.where(grandparents < 0, rows,
+                                                     parents))
+
+    return (parents, genes, transcripts)
+
+
+def stable_ids(attributes, ids, rows, prefix):
+    """Get the stable identifier of a set of records from an attribute
+    falling back to the ID.
+
+    Args:
+        attributes (array): The attributes column text.
+
+        ids (array)       : The ID column.
+
+        rows (array)      : The rows to get identifiers for, -1 for none.
+
+        prefix (str)      : The attribute key followed by '='.
+
+    Returns:
+        An object array of identifiers aligned with rows, with None
+        where the row is -1.
+    """
+
+    lookup = {}
+    for row in np.unique(rows[rows >= 0]).tolist():
+        value = find_attribute(attributes[row], prefix)
+        lookup[row] = value if value is not None else ids[row]
+
+    return np.array([lookup.get(row) for row in rows.tolist()], dtype=object)
+
+
+def join_groups(groups, values, size):
+    """Join the values of each group with commas.
+
+    Args:
+        groups (array): The sorted group number of each value.
+
+        values (list) : The string values.
+
+        size (int)    : The number of groups.
+
+    Returns:
+        An object array with the joined values of each group and an
+        empty string for groups with no values.
+    """
+
+    joined = np.full(size, '', dtype=object)
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    starts = np.concatenate(([0], bounds)).tolist()
+    ends = np.concatenate((bounds, [len(values)])).tolist()
+    if values:
+        joined[groups[starts]] = [','.join(values[start:end])
+                                  for (start, end) in zip(starts, ends)]
+
+    return joined
@@ -1,6 +1,29 @@
 #!/usr/bin/env python3
-"""
-Module Docstring
+
+"""The catherpes vcf.py module provides a class and methods for
+streaming VCF formatted text files.
+
+Records are read one line at a time from plain, gzip or bgzip
+compressed files.  Only the eight fixed columns are split and parsed
+when a record is read.  The INFO column is kept as text until the info
+property of a Variant is read and the FORMAT and sample columns,
+which dominate the size of a cohort VCF, are kept as a single block of
+text until genotype data is asked for.  Filters that only look at
+CHROM, POS, QUAL or FILTER therefore never touch the genotypes.
+
+For cohort analysis export_matrix converts a VCF once into a
+directory of binary matrices, int8 genotype codes and optional uint16
+FORMAT fields such as DP and GQ, plus a variant table and the sample
+names.  GenotypeMatrix memory-maps them back so samples and variants
+can be sliced as numpy views, and allele frequency, missingness and
+carrier queries are reductions over the matrix rather than text
+parsing.
+
+Example:
+    Count the passing variants in a file::
+
+        $ python vcf.py cohort.vcf.gz
+
 """
 
 __author__ = "Barry Moore"
@@ -8,33 +31,695 @@ __version__ = "0.1.0"
 __license__ = "GNU GPL"
 
 import argparse
+import gzip
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from catherpes import index
+from catherpes import store
+
+HEADER_FIELDS = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|[^,>]*)')
+
+CHUNK_SIZE = 10000
+MATRIX_META = 'matrix.json'
+
+# Genotype codes are the number of non-reference alleles, or -1 if any
+# allele is missing.  FORMAT fields are clipped to fit uint16 and
+# missing values are stored as the largest value.
+MISSING_GT = -1
+MISSING_FIELD = np.iinfo(np.uint16).max
 
 
 def main(args):
     """ Main entry point of the app """
-    print("hello world")
+    print("catherpes/VCF")
     print(args)
 
+    if args.matrix:
+        matrix = export_matrix(args.file, args.matrix, region=args.region)
+        print('Exported {} variants by {} samples'.format(
+            *matrix.genotypes.shape))
+        return
+
+    vcf = VCF(file=args.file, region=args.region)
+    counts = {}
+    for variant in vcf:
+        if variant.filter in ('PASS', '.'):
+            counts[variant.chrom] = counts.get(variant.chrom, 0) + 1
+
+    print('{} samples'.format(len(vcf.samples)))
+    for (chrom, count) in counts.items():
+        print('{}\t{}'.format(chrom, count))
+
+
+class VCF(object):
+    """Catherpes VCF is a Python class with methods for streaming VCF
+    data.
+    """
+
+    def __init__(self, file=None, region=None):
+        """Args:
+            file (str)  : The path/name of a VCF file, which may be
+                          plain text, gzip or bgzip compressed.
+
+            region (str): Only read records overlapping a region given
+                          as 'seqid', 'seqid:start' or 'seqid:start-end'
+                          with 1-based inclusive coordinates.  The
+                          file must be bgzip compressed and indexed
+                          with catherpes.index using the 'vcf' preset
+                          for the region to be read without scanning
+                          the whole file.
+
+        """
+
+        self.file = file
+        self.region = region
+        self.headers = []
+        self.samples = []
+        self.info_types = {}
+        self.format_types = {}
+        self._indexed = (file is not None and region is not None and
+                         os.path.exists(file + index.EXTENSION))
+        self._region = None if region is None else index.parse_region(region)
+
+        if file is not None:
+            self._parse_headers(file=file)
+
+    def __iter__(self):
+        return self.iter_variants()
+
+    def iter_variants(self):
+        """Iterate over the variants in the file one at a time.
+
+        The file is re-read on each call, so only a single record is
+        held in memory at a time regardless of the size of the file.
+
+        Yields:
+            A Variant object for each record in the file, or in the
+            region if one was given.
+        """
+
+        for line in self._lines(self.file):
+            if line.startswith('#'):
+                continue
+            values = line.rstrip('\n').split('\t', 8)
+            if len(values) < 8:
+                continue
+            variant = Variant(values, self)
+            if self._region is not None and not self._in_region(variant):
+                continue
+            yield variant
+
+    def _in_region(self, variant):
+        """Test if a variant overlaps the region."""
+
+        (seqid, start, end) = self._region
+        return (variant.chrom == seqid and variant.pos <= end and
+                variant.end >= start)
+
+    def _lines(self, file=None):
+        """Iterate over the lines of a VCF file, or only the records
+        overlapping the region if the file is indexed.
+
+        Args:
+            file: The path/name of the VCF file.
+
+        Yields:
+            Each line of text.
+        """
+
+        if self._indexed:
+            yield from index.fetch(file, self.region, preset='vcf')
+            return
+
+        with _open(file) as f:
+            yield from f
+
+    def _parse_headers(self, file=None):
+        """
+        Parse the block of header lines at the top of a VCF file,
+        stopping at the first record.  INFO and FORMAT definitions are
+        kept to decode values with and the sample names are read from
+        the #CHROM line.
+
+        Args:
+            file: The path/name of the VCF file to parse.
+
+        Returns: No return value.
+        """
+
+        with _open(file) as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line.startswith('##'):
+                    self.headers.append(line)
+                    if line.startswith('##INFO=<'):
+                        (key, definition) = _parse_definition(line)
+                        self.info_types[key] = definition
+                    elif line.startswith('##FORMAT=<'):
+                        (key, definition) = _parse_definition(line)
+                        self.format_types[key] = definition
+                elif line.startswith('#'):
+                    self.headers.append(line)
+                    self.samples = line.split('\t')[9:]
+                else:
+                    break
+
+
+class Variant(object):
+    """Catherpes Variant is a compact Python class for a single VCF
+    record.  The fixed columns are parsed when the Variant is created,
+    while the INFO column is decoded into a dictionary only the first
+    time the info property is read and the sample columns are split
+    only the first time genotype data is read.
+
+    Fields can also be read with item access (variant['pos']).
+    """
+
+    __slots__ = ('chrom', 'pos', 'id', 'ref', 'alt', 'qual', 'filter',
+                 '_info_text', '_info', '_sample_text', '_format',
+                 '_samples', '_vcf')
+
+    def __init__(self, values, vcf=None):
+        """Args:
+            values (list): The tab-split VCF columns with the FORMAT
+                           and sample columns left joined as the ninth
+                           value.
+
+            vcf (VCF)    : The VCF object holding the INFO and FORMAT
+                           definitions and the sample names.
+
+        """
+
+        (self.chrom, pos, self.id, self.ref, alt, qual,
+         self.filter, self._info_text) = values[:8]
+        self.pos = int(pos)
+        self.alt = [] if alt == '.' else alt.split(',')
+        self.qual = None if qual == '.' else float(qual)
+        self._sample_text = values[8] if len(values) > 8 else None
+        self._vcf = vcf
+        self._info = None
+        self._format = None
+        self._samples = None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return 'Variant({}:{} {}>{})'.format(self.chrom, self.pos, self.ref,
+                                             ','.join(self.alt) or '.')
+
+    @property
+    def end(self):
+        """The 1-based inclusive end of the REF allele."""
+        return self.pos + len(self.ref) - 1
+
+    @property
+    def filters(self):
+        """The list of failed filters, empty for PASS or missing."""
+        if self.filter in ('PASS', '.'):
+            return []
+        return self.filter.split(';')
+
+    @property
+    def info(self):
+        """The dictionary of decoded INFO values."""
+        if self._info is None:
+            types = self._vcf.info_types if self._vcf is not None else {}
+            self._info = _decode_info(self._info_text, types)
+        return self._info
+
+    @property
+    def format_keys(self):
+        """The list of FORMAT keys of the record."""
+        self._split_samples()
+        return self._format
+
+    def format(self, key):
+        """Get one FORMAT field for every sample.
+
+        Args:
+            key (str): The FORMAT key, such as 'DP'.
+
+        Returns:
+            A list with the decoded value for each sample, with None
+            where the value is missing or the key is not present.
+        """
+
+        definition = self._format_type(key)
+        return [_decode_value(text, definition)
+                for text in self._format_text(key)]
+
+    @property
+    def genotypes(self):
+        """A list with a tuple of allele numbers for each sample, with
+        None for missing alleles."""
+        return [_decode_genotype(gt) for gt in self._gt_text()]
+
+    @property
+    def phased(self):
+        """A list with True for each sample with a phased genotype."""
+        return ['|' in gt for gt in self._gt_text()]
+
+    def sample(self, name):
+        """Get every FORMAT field of one sample.
+
+        Args:
+            name (str): The sample name.
+
+        Returns:
+            A dictionary of decoded FORMAT values keyed by FORMAT key.
+        """
+
+        self._split_samples()
+        text = self._samples[self._vcf.samples.index(name)]
+        values = {}
+        for (key, value) in zip(self._format, text.split(':')):
+            if key == 'GT':
+                values[key] = _decode_genotype(value)
+            else:
+                values[key] = _decode_value(value, self._format_type(key))
+
+        return values
+
+    def _gt_text(self):
+        """Get the GT text of each sample."""
+        return self._format_text('GT')
+
+    def _format_text(self, key):
+        """Get the undecoded text of one FORMAT field for each sample,
+        with '.' where the field is missing."""
+
+        self._split_samples()
+        if key not in self._format:
+            return ['.'] * len(self._samples)
+        i = self._format.index(key)
+        if i == 0:
+            return [sample.split(':', 1)[0] for sample in self._samples]
+
+        values = []
+        for sample in self._samples:
+            fields = sample.split(':', i + 1)
+            values.append(fields[i] if i < len(fields) else '.')
+
+        return values
+
+    def _format_type(self, key):
+        """Get the header definition of a FORMAT key."""
+
+        types = self._vcf.format_types if self._vcf is not None else {}
+        return types.get(key, _STRING)
+
+    def _split_samples(self):
+        """Split the FORMAT and sample columns the first time they are
+        needed."""
+
+        if self._format is not None:
+            return
+        if not self._sample_text:
+            (self._format, self._samples) = ([], [])
+            return
+        fields = self._sample_text.split('\t')
+        self._format = fields[0].split(':')
+        self._samples = fields[1:]
+
+
+def export_matrix(file, path, fields=('DP', 'GQ'), region=None,
+                  chunk_size=CHUNK_SIZE):
+    """Export the genotypes of a VCF file to a directory of binary
+    matrices that GenotypeMatrix can memory-map.
+
+    Args:
+        file (str)      : The path/name of the VCF file.
+
+        path (str)      : The directory to write, which is created if
+                          needed.
+
+        fields (tuple)  : Integer FORMAT fields to export as uint16
+                          matrices alongside the genotypes.
+
+        region (str)    : Only export records overlapping a region.
+
+        chunk_size (int): The number of records parsed and written at
+                          a time.
+
+    Returns:
+        A GenotypeMatrix for the exported data.
+    """
+
+    vcf = VCF(file=file, region=region)
+    os.makedirs(path, exist_ok=True)
+    keys = ('GT',) + tuple(fields)
+    outputs = {key: open(os.path.join(path, key + '.bin'), 'wb')
+               for key in keys}
+
+    columns = {key: [] for key in ('chrom', 'pos', 'id', 'ref', 'alt',
+                                   'qual', 'filter')}
+    chunk = []
+    try:
+        for variant in vcf:
+            chunk.append(variant)
+            if len(chunk) == chunk_size:
+                _write_matrix_chunk(chunk, vcf.samples, outputs, columns)
+                chunk = []
+        if chunk:
+            _write_matrix_chunk(chunk, vcf.samples, outputs, columns)
+    finally:
+        for output in outputs.values():
+            output.close()
+
+    variants = pd.DataFrame(columns)
+    variants['chrom'] = variants['chrom'].astype('category')
+    variants['pos'] = variants['pos'].astype(np.int64)
+    variants['qual'] = variants['qual'].astype(np.float64)
+    store.save_frame(variants, os.path.join(path, 'variants'))
+
+    with open(os.path.join(path, MATRIX_META), 'w') as f:
+        json.dump({'rows': len(variants), 'samples': vcf.samples,
+                   'fields': list(fields), 'file': os.path.abspath(file),
+                   'region': region}, f)
+
+    return GenotypeMatrix(path)
+
+
+class GenotypeMatrix(object):
+    """Catherpes GenotypeMatrix is a Python class for memory-mapped
+    genotype matrices written by export_matrix.
+
+    The genotypes attribute is an int8 array of variants by samples
+    holding the number of non-reference alleles, or -1 if the genotype
+    is missing.  Each exported FORMAT field is a uint16 array of the
+    same shape in the fields dictionary, with missing values stored as
+    65535.  Slicing these arrays gives views onto the mapped files.
+    Allele frequencies assume diploid genotypes.
+    """
+
+    def __init__(self, path):
+        """Args:
+            path (str): The directory written by export_matrix.
+
+        """
+
+        with open(os.path.join(path, MATRIX_META)) as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.samples = meta['samples']
+        self.sample_index = {name: i for (i, name) in enumerate(self.samples)}
+        (self.variants, _) = store.load_frame(os.path.join(path, 'variants'))
+        shape = (meta['rows'], len(self.samples))
+        self.genotypes = _map(os.path.join(path, 'GT.bin'), np.int8, shape)
+        self.fields = {key: _map(os.path.join(path, key + '.bin'), np.uint16,
+                                 shape)
+                       for key in meta['fields']}
+
+    def __len__(self):
+        return self.genotypes.shape[0]
+
+    def sample_columns(self, samples=None):
+        """Get the matrix columns of a set of samples.
+
+        Args:
+            samples: A list of sample names, or None for all samples.
+
+        Returns:
+            A slice for all samples or an array of column numbers.
+        """
+
+        if samples is None:
+            return slice(None)
+        return np.array([self.sample_index[name] for name in samples],
+                        dtype=np.int64)
+
+    def allele_frequency(self, samples=None):
+        """Get the frequency of non-reference alleles of each variant.
+
+        Args:
+            samples: Only count these sample names.
+
+        Returns:
+            A float array with NaN for variants with no called
+            genotypes.
+        """
+
+        (alt, called) = self._reduce(samples, lambda g: (
+            np.where(g > 0, g, 0).sum(axis=1), (g >= 0).sum(axis=1)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return alt / (2.0 * called)
+
+    def missingness(self, samples=None):
+        """Get the fraction of missing genotypes of each variant.
+
+        Args:
+            samples: Only count these sample names.
+
+        Returns:
+            A float array.
+        """
+
+        (missing, total) = self._reduce(samples, lambda g: (
+            (g < 0).sum(axis=1), np.full(len(g), g.shape[1])))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return missing / total
+
+    def carrier_counts(self, samples=None, min_alleles=1):
+        """Get the number of carriers of each variant.
+
+        Args:
+            samples          : Only count these sample names.
+
+            min_alleles (int): The number of non-reference alleles a
+                               carrier must have, 2 for homozygotes.
+
+        Returns:
+            An int64 array.
+        """
+
+        (counts,) = self._reduce(samples, lambda g: (
+            (g >= min_alleles).sum(axis=1),))
+        return counts
+
+    def carriers(self, variant, samples=None, min_alleles=1):
+        """Get the samples carrying a variant.
+
+        Args:
+            variant (int)    : The row of the variant.
+
+            samples          : Only consider these sample names.
+
+            min_alleles (int): The number of non-reference alleles a
+                               carrier must have, 2 for homozygotes.
+
+        Returns:
+            A list of sample names.
+        """
+
+        columns = self.sample_columns(samples)
+        names = np.asarray(self.samples, dtype=object)[columns]
+        return names[self.genotypes[variant, columns] >= min_alleles].tolist()
+
+    def _reduce(self, samples, function, chunk_size=CHUNK_SIZE):
+        """Apply a row-wise reduction to the genotypes a block of rows
+        at a time so only one block is paged in and copied at once.
+
+        Args:
+            samples          : Only use these sample names.
+
+            function         : A function of a block of genotypes
+                               returning a tuple of per row arrays.
+
+            chunk_size (int) : The number of rows in a block.
+
+        Returns:
+            A tuple of the concatenated arrays.
+        """
+
+        columns = self.sample_columns(samples)
+        results = []
+        for i in range(0, max(len(self), 1), chunk_size):
+            block = self.genotypes[i:i + chunk_size][:, columns]
+            results.append(function(block))
+
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def _write_matrix_chunk(chunk, samples, outputs, columns):
+    """Encode a chunk of variants and append them to the matrix files.
+
+    Args:
+        chunk (list)   : The Variant objects.
+
+        samples (list) : The sample names of the file.
+
+        outputs (dict) : The open matrix file for each FORMAT key.
+
+        columns (dict) : The lists of variant table values to extend.
+
+    Returns: No return value.
+    """
+
+    texts = {key: [] for key in outputs}
+    for variant in chunk:
+        for (key, values) in texts.items():
+            text = variant._format_text(key)
+            if len(text) != len(samples):
+                raise ValueError('Record {}:{} has {} samples, expected '
+                                 '{}'.format(variant.chrom, variant.pos,
+                                             len(text), len(samples)))
+            values.extend(text)
+        columns['chrom'].append(variant.chrom)
+        columns['pos'].append(variant.pos)
+        columns['id'].append(variant.id)
+        columns['ref'].append(variant.ref)
+        columns['alt'].append(','.join(variant.alt))
+        columns['qual'].append(np.nan if variant.qual is None
+                               else variant.qual)
+        columns['filter'].append(variant.filter)
+
+    # Genotypes take few distinct values, so each distinct GT text is
+    # decoded once and the codes are gathered with one take.
+    (codes, uniques) = pd.factorize(np.asarray(texts.pop('GT'), dtype=object))
+    table = np.array([_genotype_code(text) for text in uniques], dtype=np.int8)
+    table[codes].tofile(outputs['GT'])
+
+    for (key, values) in texts.items():
+        numbers = pd.to_numeric(pd.Series(values, dtype=object),
+                                errors='coerce').to_numpy(dtype=np.float64)
+        numbers = np.clip(numbers, 0, MISSING_FIELD - 1)
+        numbers[np.isnan(numbers)] = MISSING_FIELD
+        numbers.astype(np.uint16).tofile(outputs[key])
+
+
+def _genotype_code(text):
+    """Get the int8 code of a GT value."""
+
+    alleles = _decode_genotype(text)
+    if None in alleles:
+        return MISSING_GT
+    return min(sum(1 for allele in alleles if allele > 0), 127)
+
+
+def _map(file, dtype, shape):
+    """Memory-map a matrix file read-only."""
+
+    if shape[0] * shape[1] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode='r', shape=shape)
+
+
+_STRING = {'Number': '1', 'Type': 'String'}
+
+
+def _open(file):
+    """Open a text file that may be gzip or bgzip compressed."""
+
+    with open(file, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(file, 'rt')
+    return open(file)
+
+
+def _parse_definition(line):
+    """Parse an ##INFO or ##FORMAT header line.
+
+    Args:
+        line (str): The header line.
+
+    Returns:
+        A tuple of (ID, definition) where definition is a dictionary
+        of the fields of the header.
+    """
+
+    body = line[line.index('<') + 1:line.rindex('>')]
+    definition = {key: value.strip('"')
+                  for (key, value) in HEADER_FIELDS.findall(body)}
+
+    return (definition.get('ID'), definition)
+
+
+def _decode_info(info_text, types):
+    """Decode the text of a VCF INFO column.
+
+    Args:
+        info_text (str): The INFO column text.
+
+        types (dict)   : The INFO definitions from the header.
+
+    Returns:
+        A dictionary of decoded values.  Flags are True.
+    """
+
+    info = {}
+    if info_text == '.':
+        return info
+    for item in info_text.split(';'):
+        (key, sep, text) = item.partition('=')
+        if not sep:
+            info[key] = True
+            continue
+        info[key] = _decode_value(text, types.get(key, _STRING))
+
+    return info
+
+
+def _decode_value(text, definition):
+    """Decode an INFO or FORMAT value using its header definition.
+
+    Args:
+        text (str)       : The value text.
+
+        definition (dict): The header definition with Number and Type.
+
+    Returns:
+        An int, float or str for single values, a list for values with
+        more than one item and None for missing values.
+    """
+
+    if text == '.' or text == '':
+        return None
+    kind = definition.get('Type', 'String')
+    if kind == 'Integer':
+        convert = int
+    elif kind == 'Float':
+        convert = float
+    else:
+        convert = str
+
+    if definition.get('Number') == '1':
+        return convert(text)
+    return [None if item == '.' else convert(item) for item in text.split(',')]
+
+
+def _decode_genotype(text):
+    """Decode a GT value into a tuple of allele numbers."""
+
+    if text == '.':
+        return (None,)
+    return tuple(None if allele == '.' else int(allele)
+                 for allele in text.replace('|', '/').split('/'))
+
 if __name__ == "__main__":
     """ This is executed when run from the command line """
     parser = argparse.ArgumentParser()
 
     # Required positional argument
-    parser.add_argument("arg", help="Required positional argument")
+    parser.add_argument("file", help="Required path/name of a VCF file")
 
-    # Optional argument flag which defaults to False
-    parser.add_argument("-f", "--flag", action="store_true", default=False)
+    # Optional argument which requires a parameter (eg. -r 22:1-1000)
+    parser.add_argument("-r", "--region", action="store", dest="region",
+                        help="Only read records overlapping a region")
 
-    # Optional argument which requires a parameter (eg. -d test)
-    parser.add_argument("-n", "--name", action="store", dest="name")
-
-    # Optional verbosity counter (eg. -v, -vv, -vvv, etc.)
-    parser.add_argument(
-        "-v",
-        "--verbose",
-        action="count",
-        default=0,
-        help="Verbosity (-v, -vv, etc)")
+    # Optional argument which requires a parameter (eg. -m cohort.gtm)
+    parser.add_argument("-m", "--matrix", action="store", dest="matrix",
+                        help="Export a genotype matrix to this directory")
 
     # Specify output of "--version"
     parser.add_argument(
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""The catherpes viq.py module aggregates the per-sample VIQ output
+files of a cohort into one columnar store.
+
+A manifest lists a sample ID and the path of its VIQ output on each
+line.  The files are read in a process pool with the catherpes.tsv
+reader using a single cohort schema, and each sample is written as a
+partition of binary column files with catherpes.store.  The store
+records the size, modification time and content hash of every input,
+so a re-run only reads the samples that are new or whose files have
+changed.  load_cohort maps the partitions back and adds a sample
+column.
+
+Example:
+    Aggregate and then update a cohort::
+
+        $ python viq.py viq_manifest.txt cohort.viq -w 16
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from catherpes import store
+from catherpes.tsv import TSV
+from catherpes.utils import file_hash
+
+INDEX = 'cohort.json'
+PARTS = 'samples'
+
+
+def main(args):
+    """ Main entry point of the app """
+    print("catherpes/VIQ")
+    print(args)
+
+    status = aggregate(read_manifest(args.manifest), args.store,
+                       workers=args.workers)
+    for (key, samples) in status.items():
+        print('{}\t{}'.format(key, len(samples)))
+
+
+def read_manifest(file):
+    """Read a manifest of sample IDs and VIQ output files.
+
+    Args:
+        file (str): The path/name of a tab-delimited file with a
+                    sample ID and a path on each line.  Relative paths
+                    are relative to the manifest.
+
+    Returns:
+        A list of (sample, path) tuples in file order.
+    """
+
+    base = os.path.dirname(os.path.abspath(file))
+    entries = []
+    with open(file) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 2 or line.startswith('#'):
+                continue
+            entries.append((fields[0], os.path.join(base, fields[1])))
+
+    return entries
+
+
+def aggregate(entries, path, workers=1, schema=None):
+    """Add the VIQ outputs of a cohort to a store, reading only the
+    samples that are new or have changed since the last run.
+
+    Args:
+        entries (list): (sample, path) tuples as from read_manifest.
+
+        path (str)    : The directory of the store, which is created if
+                        needed.
+
+        workers (int) : The number of processes reading files.
+
+        schema (list) : (name, dtype) tuples for the columns of the VIQ
+                        output.  Defaults to the schema already in the
+                        store, or the columns and inferred dtypes of
+                        the first file read, with integer columns read
+                        as floats so missing values in the other
+                        samples are NaN.
+
+    Returns:
+        A dictionary with lists of the 'added', 'updated' and
+        'unchanged' samples.
+    """
+
+    cohort = _read_index(path)
+    if schema is not None:
+        cohort['schema'] = [(name, pd.api.types.pandas_dtype(dtype).name)
+                            for (name, dtype) in schema]
+
+    status = {'added': [], 'updated': [], 'unchanged': []}
+    jobs = []
+    for (sample, file) in entries:
+        previous = cohort['samples'].get(sample)
+        stat = os.stat(file)
+        if (previous is not None and previous['path'] == file and
+                previous['size'] == stat.st_size and
+                previous['mtime'] == stat.st_mtime_ns):
+            status['unchanged'].append(sample)
+        else:
+            jobs.append((sample, file, previous))
+
+    if jobs and cohort['schema'] is None:
+        cohort['schema'] = _infer_schema(jobs[0][1])
+
+    os.makedirs(os.path.join(path, PARTS), exist_ok=True)
+    try:
+        with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = [executor.submit(_load_sample, sample, file,
+                                       _partition(path, sample),
+                                       cohort['schema'], previous)
+                       for (sample, file, previous) in jobs]
+            for future in as_completed(futures):
+                (sample, entry, changed) = future.result()
+                previous = cohort['samples'].get(sample)
+                cohort['samples'][sample] = entry
+                if not changed:
+                    status['unchanged'].append(sample)
+                elif previous is None:
+                    status['added'].append(sample)
+                else:
+                    status['updated'].append(sample)
+    finally:
+        _write_index(path, cohort)
+
+    return status
+
+
+def load_cohort(path, columns=None, samples=None, mmap=True):
+    """Load the aggregated VIQ outputs of a cohort.
+
+    Args:
+        path (str)    : The directory of the store.
+
+        columns (list): Only load these columns.
+
+        samples (list): Only load these samples.  Defaults to all
+                        samples in the store.
+
+        mmap (bool)   : Memory-map the numeric columns.
+
+    Returns:
+        A DataFrame with a categorical sample column followed by the
+        VIQ output columns.
+    """
+
+    cohort = _read_index(path)
+    if samples is None:
+        samples = sorted(cohort['samples'])
+
+    frames = []
+    for sample in samples:
+        (df, meta) = store.load_frame(_partition(path, sample), mmap=mmap)
+        frames.append(df if columns is None else df[list(columns)])
+
+    names = [name for (name, dtype) in cohort['schema'] or []]
+    if columns is not None:
+        names = list(columns)
+    df = (pd.concat(frames, ignore_index=True) if frames
+          else pd.DataFrame(columns=names))
+    codes = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+    df.insert(0, 'sample', pd.Categorical.from_codes(codes,
+                                                     categories=samples))
+
+    return df
+
+
+def _load_sample(sample, file, part, schema, previous=None):
+    """Read one VIQ output and write it as a partition of the store.
+
+    Args:
+        sample (str)   : The sample ID.
+
+        file (str)     : The path/name of the VIQ output.
+
+        part (str)     : The directory of the partition.
+
+        schema (list)  : The (name, dtype) tuples of the cohort.
+
+        previous (dict): The store entry from the last run, if any.
+
+    Returns:
+        A tuple of (sample, entry, changed) where entry is the new
+        store entry and changed is False if the content hash matches
+        the previous entry and the file was not read.
+    """
+
+    stat = os.stat(file)
+    entry = {'path': file, 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+             'hash': file_hash(file)}
+    if previous is not None and previous['hash'] == entry['hash']:
+        entry['rows'] = previous['rows']
+        return (sample, entry, False)
+
+    reader = TSV(file, header=True, dtypes=dict(schema))
+    df = reader.read()
+    names = [name for (name, dtype) in schema]
+    if list(df.columns) != names:
+        raise ValueError('The columns of {} do not match the cohort: '
+                         '{}'.format(file, ', '.join(map(str, df.columns))))
+    entry['rows'] = len(df)
+
+    # Write to a temporary directory and rename it into place so an
+    # interrupted run never leaves a partial partition.
+    parent = os.path.dirname(part)
+    tmp = tempfile.mkdtemp(dir=parent)
+    store.save_frame(df, tmp, meta={'sample': sample, 'source': entry})
+    shutil.rmtree(part, ignore_errors=True)
+    os.rename(tmp, part)
+
+    return (sample, entry, True)
+
+
+def _infer_schema(file):
+    """Get the columns and dtypes of a VIQ output file for a cohort.
+
+    Integer columns are read as floats and boolean columns as strings,
+    so the other samples of the cohort can have missing values in them.
+    """
+
+    df = TSV(file, header=True).read()
+    schema = []
+    for (name, dtype) in df.dtypes.items():
+        if dtype.kind in 'iu':
+            dtype = np.dtype(np.float64)
+        elif dtype.kind == 'b':
+            dtype = np.dtype(object)
+        schema.append((name, str(dtype)))
+
+    return schema
+
+
+def _partition(path, sample):
+    """Get the directory of a sample's partition."""
+    return os.path.join(path, PARTS, sample.replace(os.sep, '_'))
+
+
+def _read_index(path):
+    """Read the cohort index of a store, or an empty one."""
+
+    file = os.path.join(path, INDEX)
+    if not os.path.exists(file):
+        return {'schema': None, 'samples': {}}
+    with open(file) as f:
+        cohort = json.load(f)
+    if cohort['schema'] is not None:
+        cohort['schema'] = [tuple(column) for column in cohort['schema']]
+
+    return cohort
+
+
+def _write_index(path, cohort):
+    """Write the cohort index of a store atomically."""
+
+    os.makedirs(path, exist_ok=True)
+    tmp = os.path.join(path, INDEX + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(cohort, f)
+    os.replace(tmp, os.path.join(path, INDEX))
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional arguments
+    parser.add_argument("manifest", help="Required path/name of a manifest "
+                        "of sample IDs and VIQ output files")
+    parser.add_argument("store", help="Required path/name of the cohort "
+                        "store directory")
+
+    # Optional argument which requires a parameter (eg. -w 16)
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        default=1, help="The number of worker processes")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+"""The catherpes writers.py module writes GFF data back out as GFF3,
+GTF, BED6 or BED12 text.
+
+The writers work from the columnar form of the data (GFF.to_frame)
+and build the text for large chunks of records at a time from whole
+columns, joining each chunk with a single call and writing it as one
+buffered write.  Output can be written with bgzip compression
+directly, using several threads to compress blocks.
+
+Example:
+    Convert a GFF3 file to bgzipped BED12::
+
+        $ python writers.py --format bed12 --bgzip file.gff3.gz out.bed.gz
+
+"""
+
+__author__ = "Barry Moore"
+__version__ = "0.1.0"
+__license__ = "GNU GPL"
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from catherpes import bgzf
+from catherpes.gff import GFF
+from catherpes.utils import hierarchy, parent_rows, stable_ids
+
+CHUNK_SIZE = 100000
+
+
+def main(args):
+    """ Main entry point of the app """
+
+    gff = GFF(file=args.file, format='df', workers=args.workers)
+    options = {'bgzip': args.bgzip, 'threads': args.workers}
+    if args.format == 'gff3':
+        write_gff3(gff, args.output, **options)
+    elif args.format == 'gtf':
+        write_gtf(gff, args.output, **options)
+    else:
+        write_bed(gff, args.output, type=args.type,
+                  bed12=args.format == 'bed12', **options)
+
+
+def write_gff3(gff, file, bgzip=False, threads=1, chunk_size=CHUNK_SIZE):
+    """Write GFF data as GFF3.
+
+    Args:
+        gff (GFF)       : The GFF object to write.
+
+        file            : The path/name of the file to write, or an
+                          open text file handle such as sys.stdout.
+
+        bgzip (bool)    : Write the file with bgzip compression.
+
+        threads (int)   : The number of threads used to compress.
+
+        chunk_size (int): The number of records formatted per write.
+
+    Returns: No return value.
+    """
+
+    df = gff.to_frame()
+    headers = [h for h in gff.headers if h.startswith('##') and h != '###']
+    if not headers or not headers[0].startswith('##gff-version'):
+        headers.insert(0, '##gff-version 3')
+
+    with _Output(file, bgzip, threads) as out:
+        out.write('\n'.join(headers) + '\n')
+        for chunk in _chunks(df, chunk_size):
+            out.write_rows([_text(chunk['seqid']),
+                            _text(chunk['source']),
+                            _text(chunk['type']),
+                            _text(chunk['start']),
+                            _text(chunk['end']),
+                            _score_text(chunk['score']),
+                            _text(chunk['strand']),
+                            _phase_text(chunk['phase']),
+                            _text(chunk['attributes'])])
+
+
+def write_gtf(gff, file, bgzip=False, threads=1, chunk_size=CHUNK_SIZE):
+    """Write GFF data as GTF.
+
+    Only features that are part of a gene model (a top level feature
+    with children, and its descendants) are written.  Top level
+    features become 'gene' records and their children 'transcript'
+    records, while lower level features keep their type.  The gene_id
+    and transcript_id are taken from the gene_id and transcript_id
+    attributes if present, and the ID otherwise.
+
+    Args:
+        gff (GFF)       : The GFF object to write.
+
+        file            : The path/name of the file to write, or an
+                          open text file handle.
+
+        bgzip (bool)    : Write the file with bgzip compression.
+
+        threads (int)   : The number of threads used to compress.
+
+        chunk_size (int): The number of records formatted per write.
+
+    Returns: No return value.
+    """
+
+    df = gff.to_frame()
+    (parents, genes, transcripts) = hierarchy(df)
+    has_children = np.zeros(len(df), dtype=bool)
+    has_children[parents[parents >= 0]] = True
+    keep = np.flatnonzero((parents >= 0) | has_children)
+
+    attributes = df['attributes'].to_numpy(dtype=object)
+    ids = df['ID'].to_numpy(dtype=object)
+    names = df['Name'].to_numpy(dtype=object)
+    gene_ids = stable_ids(attributes, ids, genes, 'gene_id=')
+    transcript_ids = stable_ids(attributes, ids, transcripts, 'transcript_id=')
+
+    types = _text(df['type']).astype(object)
+    types[parents < 0] = 'gene'
+    types[(parents >= 0) & (transcripts == np.arange(len(df)))] = 'transcript'
+
+    # The attributes are built for every kept row at once from whole
+    # columns of strings.
+    (gene_ids, transcript_ids) = (gene_ids[keep], transcript_ids[keep])
+    gene_names = names[genes[keep]]
+    attributes = ('gene_id "' + _strings(gene_ids) + '";' +
+                  np.where(pd.notna(transcript_ids),
+                           ' transcript_id "' + _strings(transcript_ids) +
+                           '";', '') +
+                  np.where(pd.notna(gene_names),
+                           ' gene_name "' + _strings(gene_names) + '";', ''))
+
+    with _Output(file, bgzip, threads) as out:
+        for start in range(0, len(keep), chunk_size):
+            rows = keep[start:start + chunk_size]
+            chunk = df.iloc[rows]
+            out.write_rows([_text(chunk['seqid']),
+                            _text(chunk['source']),
+                            types[rows],
+                            _text(chunk['start']),
+                            _text(chunk['end']),
+                            _score_text(chunk['score']),
+                            _text(chunk['strand']),
+                            _phase_text(chunk['phase']),
+                            attributes[start:start + chunk_size]])
+
+
+def write_bed(gff, file, type=None, bed12=False, bgzip=False, threads=1,
+              chunk_size=CHUNK_SIZE):
+    """Write GFF data as BED6 or BED12.
+
+    BED6 writes one line per feature named by its Name, or ID if it
+    has no Name.  BED12 writes one line per feature with exon children
+    (usually transcripts), with a block per exon and the thick region
+    spanning its CDS children.
+
+    Args:
+        gff (GFF)       : The GFF object to write.
+
+        file            : The path/name of the file to write, or an
+                          open text file handle.
+
+        type            : A feature type or collection of feature
+                          types to write.  For BED12 this selects the
+                          transcript types.
+
+        bed12 (bool)    : Write BED12 rather than BED6.
+
+        bgzip (bool)    : Write the file with bgzip compression.
+
+        threads (int)   : The number of threads used to compress.
+
+        chunk_size (int): The number of records formatted per write.
+
+    Returns: No return value.
+    """
+
+    df = gff.to_frame()
+    if bed12:
+        df = _bed12_frame(df)
+    else:
+        name = df['Name'].where(df['Name'].notna(), df['ID'])
+        df = pd.DataFrame({'seqid': df['seqid'],
+                           'start': df['start'].astype(np.int64) - 1,
+                           'end': df['end'],
+                           'name': name.fillna('.'),
+                           'score': '0',
+                           'strand': df['strand'],
+                           'type': df['type']})
+
+    if type is not None:
+        types = [type] if isinstance(type, str) else list(type)
+        df = df[df['type'].isin(types)]
+    df = df.drop(columns='type')
+
+    with _Output(file, bgzip, threads) as out:
+        for chunk in _chunks(df, chunk_size):
+            columns = [_text(chunk[key]) for key in chunk.columns]
+            strand = columns[5]
+            columns[5] = np.where((strand == '+') | (strand == '-'), strand,
+                                  '.')
+            out.write_rows(columns)
+
+
+def _bed12_frame(df):
+    """Build the BED12 columns for the features with exon children.
+
+    Args:
+        df (DataFrame): The columnar GFF data.
+
+    Returns:
+        A DataFrame with the twelve BED12 columns plus the type of the
+        transcript.
+    """
+
+    parents = parent_rows(df, explode=True)
+    starts = df['start'].to_numpy(dtype=np.int64)
+    ends = df['end'].to_numpy(dtype=np.int64)
+    is_type = df['type'].to_numpy(dtype=object)
+
+    exons = parents[is_type[parents['child']] == 'exon']
+    exons = exons.assign(start=starts[exons['child']],
+                         end=ends[exons['child']])
+    exons = exons.sort_values(['parent', 'start'], kind='stable')
+    cds = parents[is_type[parents['child']] == 'CDS']
+    cds = cds.assign(start=starts[cds['child']], end=ends[cds['child']])
+
+    grouped = exons.groupby('parent', sort=True)
+    tx = grouped.agg(start=('start', 'min'), end=('end', 'max'),
+                     count=('start', 'size'))
+    tx_start = tx['start'].to_numpy()
+    offsets = (exons['start'].to_numpy() -
+               np.repeat(tx_start, tx['count'].to_numpy()))
+    sizes = exons['end'].to_numpy() - exons['start'].to_numpy() + 1
+    exons = exons.assign(size=sizes.astype(str), offset=offsets.astype(str))
+    blocks = exons.groupby('parent', sort=True).agg(
+        sizes=('size', ','.join), offsets=('offset', ','.join))
+
+    thick = cds.groupby('parent').agg(start=('start', 'min'),
+                                      end=('end', 'max'))
+    thick = thick.reindex(tx.index)
+    thick_start = thick['start'].fillna(tx['start']).to_numpy(
+        dtype=np.int64) - 1
+    thick_end = thick['end'].to_numpy()
+    thick_end = np.where(np.isnan(thick_end), thick_start,
+                         thick_end).astype(np.int64)
+
+    rows = tx.index.to_numpy()
+    names = stable_ids(df['attributes'].to_numpy(dtype=object),
+                       df['ID'].to_numpy(dtype=object), rows, 'transcript_id=')
+    return pd.DataFrame({'seqid': df['seqid'].to_numpy()[rows],
+                         'start': tx_start - 1,
+                         'end': tx['end'].to_numpy(),
+                         'name': names,
+                         'score': '0',
+                         'strand': df['strand'].to_numpy()[rows],
+                         'thick_start': thick_start,
+                         'thick_end': thick_end,
+                         'rgb': '0',
+                         'count': tx['count'].to_numpy(),
+                         'sizes': blocks['sizes'].to_numpy(),
+                         'offsets': blocks['offsets'].to_numpy(),
+                         'type': is_type[rows]})
+
+
+def _chunks(df, chunk_size):
+    """Iterate over a DataFrame in chunks of rows."""
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def _text(series):
+    """Convert a column to a numpy array of strings.  Categorical
+    columns are converted once per category rather than per row.
+    """
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = np.asarray(series.cat.categories.astype(str),
+                                dtype=object)
+        return categories[series.cat.codes.to_numpy()]
+    if series.dtype.kind in 'iu':
+        return series.to_numpy().astype(str).astype(object)
+    return series.to_numpy(dtype=object)
+
+
+def _strings(values):
+    """Convert an array to an object array of strings."""
+    return values.astype(str).astype(object)
+
+
+def _score_text(series):
+    """Convert a float score column to text with '.' for missing.  Only
+    the scores that are present are formatted."""
+
+    values = series.to_numpy(dtype=np.float64)
+    text = np.full(len(values), '.', dtype=object)
+    present = ~np.isnan(values)
+    if present.any():
+        text[present] = np.char.mod('%g', values[present])
+    return text
+
+
+def _phase_text(series):
+    """Convert an int phase column to text with '.' for -1."""
+    values = series.to_numpy()
+    return np.where(values < 0, '.', values.astype(str)).astype(object)
+
+
+class _Output(object):
+    """A buffered text output that is a plain file, a bgzip file or an
+    already open file handle.
+    """
+
+    def __init__(self, file, bgzip=False, threads=1):
+        self.close_fh = not hasattr(file, 'write')
+        if not self.close_fh:
+            self.fh = file
+        elif bgzip:
+            self.fh = bgzf.BgzfWriter(file, threads=threads)
+        else:
+            self.fh = open(file, 'w', buffering=1 << 20)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.close_fh:
+            self.fh.close()
+
+    def write(self, text):
+        self.fh.write(text)
+
+    def write_rows(self, columns):
+        """Join columns of strings into tab-delimited lines and write
+        them with a single call.
+        """
+
+        if len(columns[0]):
+            self.fh.write('\n'.join(map('\t'.join, zip(*columns))) + '\n')
+
+
+if __name__ == "__main__":
+    """ This is executed when run from the command line """
+    parser = argparse.ArgumentParser()
+
+    # Required positional arguments
+    parser.add_argument("file", help="Required path/name of a GFF3 file")
+    parser.add_argument("output", nargs='?', default=sys.stdout,
+                        help="Output file (default STDOUT)")
+
+    # Optional argument which requires a parameter (eg. -f bed12)
+    parser.add_argument("-f", "--format", action="store", dest="format",
+                        default='gff3',
+                        choices=['gff3', 'gtf', 'bed', 'bed12'],
+                        help="The output format")
+
+    # Optional argument which requires a parameter (eg. -t mRNA)
+    parser.add_argument("-t", "--type", action="append", dest="type",
+                        help="Feature types to write (BED only)")
+
+    # Optional argument flag which defaults to False
+    parser.add_argument("-b", "--bgzip", action="store_true", default=False,
+                        help="Write bgzip compressed output")
+
+    # Optional argument which requires a parameter (eg. -w 4)
+    parser.add_argument("-w", "--workers", action="store", type=int,
+                        default=1, help="Processes/threads to use")
+
+    # Specify output of "--version"
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s (version {version})".format(version=__version__))
+
+    args = parser.parse_args()
+    main(args)
@@ -1,15 +1,13 @@
 #!/usr/bin/env python
 
-import re
 import sys
-import json
 import argparse
-import numpy as np
 import pandas as pd
-import networkx as nx
 from tqdm import tqdm
 from joblib import Parallel, delayed
 
+from catherpes.hpo import ROOT, Ontology, Resnik, read_json, term_counts
+
 description_text = (
     """
     Synopsis:
@@ -71,69 +69,22 @@ def main():
     df_p2g = df_p2g.set_index('id')
         
     # Get term frequency and information content (ic)
-    term_counts = pd.DataFrame(df_p2g.reset_index()['id'].value_counts())
-    term_counts.rename(columns={'id': 'count'}, inplace=True)
-    term_counts.index.rename('id', inplace=True)
-    term_counts['freq'] = term_counts['count'] / term_counts['count'].sum()
-    term_counts['ic'] = -1 * np.log10(term_counts['freq'])
-    term_counts.loc['HP:0000118'] = [term_counts['count'].sum(), 1, 0]
-    df_p2g = df_p2g.join(term_counts)
+    df_counts = term_counts(df_p2g.reset_index(), root=ROOT)
+    df_p2g = df_p2g.join(df_counts)
     
-    # Parse HPO JSON
-    with open(args.json_file) as json_fh:
-        data = json.load(json_fh)
-        
-    # Parse Nodes from HPO JSON Data
-    nodes = list()
-    for node in data['graphs'][0]['nodes']:
-        hp_id = node['id']
-        hp_id = re.sub('.*\/', '', hp_id)
-        hp_id = re.sub('_', ':', hp_id)
-        if not re.match('^HP:', hp_id):
-            continue
-        hp_lbl = node['lbl']
-        hp_def = 'No definition'
-        if 'meta' in node.keys():
-            if 'definition' in node['meta'].keys():
-                hp_def = node['meta']['definition']['val']
-                nodes.append((hp_id, {'term': hp_lbl, 'definition': hp_def}))
-                
-    # Parse Edges from HPO JSON Data
-    edges = []
-    for edge in data['graphs'][0]['edges']:
-        sub = edge['sub']
-        sub = re.sub('.*\/', '', sub)
-        sub = re.sub('_', ':', sub)
-        
-        obj = edge['obj']
-        obj = re.sub('.*\/', '', obj)
-        obj = re.sub('_', ':', obj)
-        
-        edges.append((obj, sub))
-
-    # Create NetworkX Graph of HPO
-    G = nx.DiGraph()
-    G.add_nodes_from(nodes)
-    G.add_edges_from(edges)
-    
-    # Trim HPO to subgraph of 'Phenotypic abnormality'
-    
-    root = 'HP:0000118' # Phenotypic abnormality
-    sub_ids = nx.descendants(G, 'HP:0000118')
-    sub_ids.add('HP:0000118')
-    pabG = G.subgraph(sub_ids)
+    # Parse HPO JSON and trim it to the 'Phenotypic abnormality'
+    # subgraph with the ancestor closure of every term precomputed.
+    # Resnik builds the step table up front so the parallel jobs below
+    # are sent it rather than each rebuilding it.
+    terms, edges = read_json(args.json_file)
+    ontology = Ontology(terms=terms, edges=edges, root=ROOT)
+    resnik = Resnik(ontology, df_counts['ic'])
 
     # Get subgraph/leaves of proband HPO ancestors
-    prb_id_ancestors = set()
-    for id in prb_ids:
-        prb_id_ancestors.add(id)
-        if id not in pabG.nodes:
-            # WARN
-            continue
-        prb_id_ancestors.update(nx.ancestors(pabG, id))
-        prb_id_ancestors.add('HP:0000118')
-        prbG = pabG.subgraph(prb_id_ancestors)
-        prb_leaves = {node for node in prbG.nodes() if prbG.out_degree(node)==0}
+    prb_id_ancestors = set(ontology.ancestors(prb_ids))
+    prb_id_ancestors.update(prb_ids)
+    prb_id_ancestors.add(ROOT)
+    prb_leaves = set(ontology.leaves(prb_id_ancestors))
 
     #--------------------------------------------------------------------------------
 
@@ -141,12 +92,12 @@ def main():
     all_gene_lcas = []
             
     # Check for gene_ids in genG_ids
-    all_df_lcas = Parallel(n_jobs=args.jobs)(delayed(get_all_lcas)(prb_id_ancestors, prb_leaves, gene, df_p2g, pabG)
+    all_df_lcas = Parallel(n_jobs=args.jobs)(delayed(get_all_lcas)(prb_id_ancestors, prb_leaves, gene, df_p2g, resnik)
                                              for gene in tqdm(df_cnd['gene'].to_list()))
 
     df_lcas = pd.concat(all_df_lcas)
     df_lcas.set_index('lca_id', inplace=True)
-    df_lcas = df_lcas.join(term_counts, how='left')
+    df_lcas = df_lcas.join(df_counts, how='left')
     df_lcas.sort_values(by='ic', ascending=False, inplace=True)
     df_lcas.drop_duplicates(subset=['prb_id', 'gene'], keep='first', inplace=True)
 
@@ -171,59 +122,25 @@ def main():
     df_lcas = df_lcas.loc[:,['gene', 'ic', 'shpl', 'prb_term', 'gene_term', 'lca_term', 'anc_term', 'prb_id', 'gene_id', 'lca_id', 'anc_id', 'count', 'freq']]
     print(df_lcas.to_csv(sep='\t', index=False))
 
-def get_lcas(prb_id, genes, pgG, pgUG):
-
-    lcas = []
-    for gene_id in genes:
-        lca = nx.lowest_common_ancestor(pgG, gene_id, prb_id)
-        paths = nx.all_simple_paths(pgG, 'HP:0000118', prb_id)
-        anc = lca
-        for path in paths:
-            if (1 < len(path)):
-                anc = path[1]
-                break
-        shpl = nx.shortest_path_length(pgUG, gene_id, prb_id)
-        lcas.append((anc, prb_id, gene_id, lca, shpl))
-    return lcas
-
-def get_all_lcas(prb_id_ancestors, prb_id_leaves, gene, df_p2g, pabG):
+def get_all_lcas(prb_id_ancestors, prb_id_leaves, gene, df_p2g, resnik):
+    ontology = resnik.ontology
     # Get subgraph/leaves of gene HPO ancestors
     # gene = df_cnd.iloc[0]['gene']
     gene_ids = set(df_p2g.query('gene == @gene').index.to_list())
-    gene_id_ancestors = set()
-    for id in gene_ids:
-        gene_id_ancestors.add(id)
-        if id not in pabG.nodes:
-            # WARN
-            continue
-        gene_id_ancestors.update(nx.ancestors(pabG, id))
-    gene_id_ancestors.add('HP:0000118')
-    genG = pabG.subgraph(gene_id_ancestors)
-    gen_leaves = [node for node in genG.nodes() if genG.out_degree(node)==0]
-
-    # Get subgraph of proband & gene IDs
-    prb_gene_ids = prb_id_ancestors.union(gene_id_ancestors)
-    prb_gene_ids.add('HP:0000118')
-    pgG = pabG.subgraph(prb_gene_ids)
-    pgG_ids = set(pgG.nodes)
-    pgUG = nx.Graph(pgG)
-        
-    lcas = []
-    for prb_id in prb_id_leaves:
-        for gene_id in gen_leaves:
-            lca = nx.lowest_common_ancestor(pgG, gene_id, prb_id)
-            paths = nx.all_simple_paths(pgG, 'HP:0000118', prb_id)
-            anc = lca
-            for path in paths:
-                if (1 < len(path)):
-                    anc = path[1]
-                    break
-            shpl = nx.shortest_path_length(pgUG, gene_id, prb_id)
-            lcas.append((anc, prb_id, gene_id, lca, shpl))
-    
-    # all_gene_lcas = [];
-    # for lca in lcas:
-    #     all_gene_lcas.extend(lca)
+    gene_id_ancestors = set(ontology.ancestors(gene_ids))
+    gene_id_ancestors.update(gene_ids)
+    gene_id_ancestors.add(ROOT)
+    gen_leaves = ontology.leaves(gene_id_ancestors)
+
+    # Most informative common ancestor, top level branch of the proband
+    # term and shortest path length of every proband leaf and gene leaf
+    # pair in one batch
+    pairs = [(prb_id, gene_id) for prb_id in prb_id_leaves for gene_id in gen_leaves]
+    result = resnik.mica([prb_id for (prb_id, gene_id) in pairs],
+                         [gene_id for (prb_id, gene_id) in pairs])
+
+    lcas = [(anc, prb_id, gene_id, lca, shpl) for ((prb_id, gene_id), anc, lca, shpl)
+            in zip(pairs, result['branch'], result['mica'], result['distance'])]
     
     df_lcas = pd.DataFrame(lcas, columns=['anc_id', 'prb_id', 'gene_id', 'lca_id', 'shpl'])
     df_lcas['gene'] = gene
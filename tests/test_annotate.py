@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.annotate` module."""
+
+import os
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from catherpes import cli
+from catherpes.annotate import Annotator
+from catherpes.gff import GFF
+
+GFF_FILE = os.path.join(os.path.dirname(__file__), 'data',
+                        'Homo_sapiens.GRCh38.104.chromosome.22.gff3.gz')
+
+
+@pytest.fixture(scope='module')
+def gff():
+    return GFF(file=GFF_FILE, format='df')
+
+
+@pytest.fixture(scope='module')
+def annotator(gff):
+    return Annotator(gff)
+
+
+def test_introns(gff):
+    """Test introns lie between exons of the same transcript."""
+    introns = gff.introns()
+    assert len(introns) > 0
+    assert (introns['start'] <= introns['end']).all()
+    exons = gff.children(introns['Parent'][0])
+    exons = exons[exons['type'] == 'exon']
+    assert introns['start'][0] - 1 in exons['end'].tolist()
+    assert introns['end'][0] + 1 in exons['start'].tolist()
+
+
+def test_annotate(gff, annotator):
+    """Test regions and genes against the GFF3 records."""
+    cds = gff.data[gff.data['type'] == 'CDS'].iloc[0]
+    gene = gff.get(gff.get(cds['Parent'])['Parent'])
+    middle = (cds['start'] + cds['end']) // 2
+
+    introns = gff.introns()
+    centres = ((introns['start'] + introns['end']) // 2).to_numpy()
+    (hits, _) = gff.query_batch(introns['seqid'].to_numpy(), centres, centres,
+                                type=['exon', 'CDS'])
+    clean = np.setdiff1d(np.arange(len(introns)), hits)[0]
+
+    result = annotator.annotate(['22', '22', '22'],
+                                [middle, centres[clean], 1],
+                                [middle, centres[clean], 1])
+    assert result['region'].tolist() == ['CDS', 'intron', 'intergenic']
+    assert gene['ID'].split(':')[1] in result['genes'][0].split(',')
+    assert gene['Name'] in result['gene_names'][0].split(',')
+    assert cds['Parent'].split(':')[1] in result['transcripts'][0].split(',')
+    assert result['genes'][2] == ''
+
+    hits = annotator.query(['22'], [middle], [middle])
+    assert set(hits['region']) >= {'CDS', 'exon', 'transcript', 'gene'}
+    assert (hits['query'] == 0).all()
+
+
+def test_cli(gff, tmpdir):
+    """Test annotating VCF files from the command line."""
+    cds = gff.data[gff.data['type'] == 'CDS'].iloc[0]
+    path = str(tmpdir.join('a.vcf'))
+    with open(path, 'w') as f:
+        f.write('##fileformat=VCFv4.2\n'
+                '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+                '22\t1\t.\tA\tG\t.\t.\t.\n'
+                '22\t{}\t.\tAC\tA\t.\t.\t.\n'.format(cds['start']))
+
+    out = str(tmpdir.join('out'))
+    result = CliRunner().invoke(cli.main, ['annotate', GFF_FILE, path,
+                                           '-o', out])
+    assert result.exit_code == 0, result.output
+    with open(os.path.join(out, 'a.annotated.tsv')) as f:
+        lines = [line.rstrip('\n').split('\t') for line in f]
+    assert lines[0][:6] == ['chrom', 'pos', 'id', 'ref', 'alt', 'region']
+    assert [line[5] for line in lines[1:]] == ['intergenic', 'CDS']
+
+
+def test_cli_error(monkeypatch, tmpdir):
+    """Test a failure part way through a table leaves no output file."""
+    def annotate_vcf(self, vcf):
+        yield Annotator.query(self, ['22'], [1], [1])
+        raise ValueError('bad record')
+
+    monkeypatch.setattr(Annotator, 'annotate_vcf', annotate_vcf)
+    path = str(tmpdir.join('a.vcf'))
+    open(path, 'w').close()
+    out = str(tmpdir.join('out'))
+    result = CliRunner().invoke(cli.main, ['annotate', GFF_FILE, path,
+                                           '-o', out])
+    assert isinstance(result.exception, ValueError)
+    assert os.listdir(out) == []
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.bed` module."""
+
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catherpes.bed import BED, read_genome
+
+
+def _bed(rows):
+    return BED(data=pd.DataFrame(rows, columns=['chrom', 'start', 'end']))
+
+
+def _rows(bed):
+    columns = bed.data[['chrom', 'start', 'end']]
+    return [tuple(row) for row in columns.itertuples(index=False)]
+
+
+@pytest.fixture
+def a():
+    return _bed([('2', 50, 60), ('1', 30, 40), ('1', 10, 20),
+                 ('1', 15, 25), ('1', 25, 28)])
+
+
+@pytest.fixture
+def b():
+    return _bed([('1', 18, 22), ('1', 35, 36), ('1', 100, 110),
+                 ('3', 0, 10)])
+
+
+def test_parse(tmpdir):
+    """Test parsing a gzipped BED file with header lines."""
+    path = str(tmpdir.join('a.bed.gz'))
+    with gzip.open(path, 'wt') as f:
+        f.write('track name=test\n#comment\n')
+        f.write('chr1\t10\t20\tgene1\t0\t+\nchr2\t5\t8\tgene2\t0\t-\n')
+    bed = BED(file=path)
+    assert bed.headers == ['track name=test', '#comment']
+    assert list(bed.data.columns) == ['chrom', 'start', 'end', 'name',
+                                      'score', 'strand']
+    assert bed.data['name'].tolist() == ['gene1', 'gene2']
+    assert len(bed) == 2
+
+
+def test_sort_merge(a):
+    """Test sorting and merging, including a merge distance."""
+    assert _rows(a.sort()) == [('1', 10, 20), ('1', 15, 25), ('1', 25, 28),
+                               ('1', 30, 40), ('2', 50, 60)]
+    assert _rows(a.merge()) == [('1', 10, 28), ('1', 30, 40), ('2', 50, 60)]
+    assert _rows(a.merge(distance=2)) == [('1', 10, 40), ('2', 50, 60)]
+
+
+def test_intersect(a, b):
+    """Test clipped, unique and inverted intersections."""
+    assert sorted(_rows(a.intersect(b))) == [('1', 18, 20), ('1', 18, 22),
+                                             ('1', 35, 36)]
+    assert sorted(_rows(a.intersect(b, unique=True))) == [
+        ('1', 10, 20), ('1', 15, 25), ('1', 30, 40)]
+    assert sorted(_rows(a.intersect(b, invert=True))) == [
+        ('1', 25, 28), ('2', 50, 60)]
+
+
+def test_subtract(a, b):
+    """Test subtraction splits and removes covered parts."""
+    assert _rows(a.subtract(b)) == [('1', 10, 18), ('1', 15, 18),
+                                    ('1', 22, 25), ('1', 25, 28),
+                                    ('1', 30, 35), ('1', 36, 40),
+                                    ('2', 50, 60)]
+    assert len(b.subtract(b)) == 0
+
+
+def test_subtract_random():
+    """Test subtraction against a per base brute force."""
+    rng = np.random.default_rng(12)
+    starts = rng.integers(0, 1000, size=200)
+    a = _bed({'chrom': '1', 'start': starts,
+              'end': starts + rng.integers(1, 50, size=200)})
+    starts = rng.integers(0, 1000, size=100)
+    b = _bed({'chrom': '1', 'start': starts,
+              'end': starts + rng.integers(1, 30, size=100)})
+
+    covered = np.zeros(1100, dtype=bool)
+    for (chrom, start, end) in _rows(b):
+        covered[start:end] = True
+    expect = 0
+    for (chrom, start, end) in _rows(a):
+        expect += (~covered[start:end]).sum()
+    pieces = a.subtract(b).data
+    assert (pieces['end'] - pieces['start']).sum() == expect
+    assert (pieces['end'] > pieces['start']).all()
+
+
+def test_complement(a, tmpdir):
+    """Test the complement within a genome file."""
+    path = str(tmpdir.join('genome.txt'))
+    with open(path, 'w') as f:
+        f.write('1\t50\n2\t60\n3\t5\n')
+    genome = read_genome(path)
+    assert _rows(a.complement(genome)) == [('1', 0, 10), ('1', 28, 30),
+                                           ('1', 40, 50), ('2', 0, 50),
+                                           ('3', 0, 5)]
+
+
+def test_closest(a, b):
+    """Test closest distances, overlaps and missing chroms."""
+    result = a.closest(b).set_index(['chrom', 'start'])
+    assert result.loc[('1', 10), 'distance'] == 0
+    assert result.loc[('1', 25), 'distance'] == 4
+    assert result.loc[('1', 25), 'b_start'] == 18
+    assert result.loc[('1', 30), 'b_start'] == 35
+    assert result.loc[('2', 50), 'distance'] == -1
+    assert result.loc[('2', 50), 'b_row'] == -1
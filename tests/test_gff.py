@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.gff` module."""
+
+import gzip
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from catherpes import bgzf
+from catherpes import index
+from catherpes import store
+
+from catherpes.gff import GFF, Feature
+
+GFF_FILE = os.path.join(os.path.dirname(__file__), 'data',
+                        'Homo_sapiens.GRCh38.104.chromosome.22.gff3.gz')
+
+
+@pytest.fixture(scope='module')
+def gff():
+    """A fully parsed chr22 GFF3 file."""
+    return GFF(file=GFF_FILE)
+
+
+def test_parse(gff):
+    """Test eager parsing of the chr22 GFF3 file."""
+    assert gff.headers[0] == '##gff-version 3'
+    assert len(gff.data) == 67740
+    record = gff.data[0]
+    assert record['seqid'] == '22'
+    assert record['type'] == 'chromosome'
+    assert record['ID'] == 'chromosome:22'
+
+
+def test_lazy(gff):
+    """Test that lazy parsing streams the same records."""
+    lazy = GFF(file=GFF_FILE, lazy=True)
+    assert lazy.data == []
+    assert lazy.headers == gff.headers[0:len(lazy.headers)]
+    assert lazy.headers[-1] == '#!genebuild-last-updated 2021-03'
+    for count, (a, b) in enumerate(zip(lazy.iter_records(), gff.data), 1):
+        assert a == b
+        if count == 1000:
+            break
+    assert sum(1 for record in lazy) == len(gff.data)
+
+
+def test_df(gff):
+    """Test the columnar DataFrame format."""
+    df = GFF(file=GFF_FILE, format='df').data
+    assert len(df) == len(gff.data)
+    assert str(df['type'].dtype) == 'category'
+    assert df['start'].dtype.kind == 'i'
+    for i in (0, 1000, 50000):
+        record = gff.data[i]
+        row = df.iloc[i]
+        assert row['type'] == record['type']
+        assert row['start'] == int(record['start'])
+        assert row['end'] == int(record['end'])
+        row_id = row['ID'] if isinstance(row['ID'], str) else None
+        assert row_id == record['ID']
+    genes = df[df['type'] == 'gene']
+    assert len(genes) == 505
+
+
+def test_object(gff):
+    """Test the Feature object format."""
+    data = GFF(file=GFF_FILE, format='object').data
+    assert len(data) == len(gff.data)
+    for i in (0, 400, 50000):
+        feature = data[i]
+        record = gff.data[i]
+        assert isinstance(feature, Feature)
+        assert feature.start == int(record['start'])
+        assert feature['type'] == record['type']
+        assert feature.ID == record['ID']
+        assert feature.Parent == record['Parent']
+        assert feature._attributes is None
+        assert feature.attributes == record['attributes']
+
+
+def test_attributes():
+    """Test decoding of flag style and empty attributes."""
+    feature = Feature(['1', '.', 'gene', '1', '10', '.', '+', '.',
+                       'ID=g1;Name=A;Parent=p1,p2;circular;'])
+    assert feature.ID == 'g1'
+    assert feature.Parent == 'p1,p2'
+    assert feature.Alias is None
+    assert feature.attributes == {'ID': 'g1', 'Name': 'A',
+                                  'Parent': 'p1,p2', 'circular': True}
+    assert GFF()._parse_attributes('.') == {}
+
+
+@pytest.mark.parametrize('format', ['dict', 'df', 'object'])
+def test_workers(gff, format):
+    """Test parallel parsing of a bgzipped GFF3 file."""
+    assert bgzf.is_bgzf(GFF_FILE)
+    serial = GFF(file=GFF_FILE, format=format)
+    parallel = GFF(file=GFF_FILE, format=format, workers=3)
+    assert parallel.headers == serial.headers
+    if format == 'df':
+        assert parallel.data.equals(serial.data)
+    else:
+        assert parallel.data == serial.data
+
+
+def test_workers_gzip(gff, tmp_path):
+    """Test that plain gzip files fall back to serial parsing."""
+    file = str(tmp_path / 'chr22.gff3.gz')
+    with gzip.open(GFF_FILE, 'rb') as src, gzip.open(file, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    assert not bgzf.is_bgzf(file)
+    assert GFF(file=file, workers=2).data == gff.data
+
+
+@pytest.mark.parametrize('format', ['dict', 'df'])
+def test_query(format):
+    """Test region queries against the chr22 genes."""
+    gff = GFF(file=GFF_FILE, format=format)
+    genes = gff.query('22', 17000000, 17100000, type='gene')
+    assert len(genes) == 2
+    (query_idx, record_idx) = gff.query_batch(['22', '22', '1'],
+                                              [17000000, 1, 1],
+                                              [17100000, 2, 2],
+                                              type='gene')
+    assert list(query_idx) == [0, 0]
+    assert len(gff.query('22', 1, 50818468)) == 67740
+
+
+@pytest.fixture(scope='module')
+def indexed(tmp_path_factory):
+    """A copy of the chr22 GFF3 file with a sidecar index."""
+    file = str(tmp_path_factory.mktemp('data') / 'chr22.gff3.gz')
+    shutil.copyfile(GFF_FILE, file)
+    index.build_index(file)
+    return file
+
+
+@pytest.mark.parametrize('region', ['22:17000000-17100000',
+                                    '22:40,000,000-41,000,000',
+                                    '22:1-100', '22', '1:1-100'])
+def test_region(gff, indexed, region):
+    """Test loading a region from an indexed file."""
+    (seqid, start, end) = index.parse_region(region)
+    (query_idx, record_idx) = gff.query_batch([seqid], [start], [end])
+    expect = [gff.data[i] for i in sorted(record_idx)]
+    for format in ('dict', 'df'):
+        data = GFF(file=indexed, format=format, region=region).data
+        assert len(data) == len(expect)
+    regional = GFF(file=indexed, region=region)
+    assert regional.headers[0] == '##gff-version 3'
+    assert regional.data == expect
+
+
+def test_region_no_index(gff, indexed):
+    """Test that a region filter scans files without an index."""
+    region = '22:17000000-17100000'
+    scanned = GFF(file=GFF_FILE, region=region)
+    regional = GFF(file=indexed, region=region)
+    assert scanned.data == regional.data
+    assert scanned.headers == gff.headers
+
+
+@pytest.mark.parametrize('format', ['dict', 'df', 'object'])
+def test_hierarchy(format):
+    """Test the gene to transcript to exon hierarchy."""
+    gff = GFF(file=GFF_FILE, format=format)
+    assert gff.get('gene:ENSG00000130538')['Name'] == 'OR11H1'
+    assert gff.get('gene:missing') is None
+    transcripts = gff.children('gene:ENSG00000100197')
+    assert len(transcripts) == 4
+    exons = gff.descendants('gene:ENSG00000100197', type='exon')
+    assert len(exons) == 32
+    assert set(exons['type'] if format == 'df' else
+               [exon['type'] for exon in exons]) == {'exon'}
+    assert len(gff.descendants('gene:ENSG00000100197')) == 65
+
+
+def test_cache(tmp_path):
+    """Test the persistent columnar cache and its invalidation."""
+    file = str(tmp_path / 'chr22.gff3.gz')
+    cache_dir = str(tmp_path / 'cache')
+    shutil.copyfile(GFF_FILE, file)
+
+    parsed = GFF(file=file, format='df', cache_dir=cache_dir)
+    cached = GFF(file=file, format='df', cache_dir=cache_dir)
+    assert cached.headers == parsed.headers
+    assert cached.data.equals(parsed.data)
+    assert isinstance(cached.data['start'].values, np.memmap)
+
+    os.utime(file, ns=(0, 0))
+    reloaded = GFF(file=file, format='df', cache_dir=cache_dir)
+    assert reloaded.data.equals(parsed.data)
+    # The hash check records the new mtime for later loads.
+    (entry,) = os.listdir(cache_dir)
+    meta = store.read_meta(os.path.join(cache_dir, entry))['meta']
+    assert meta['source']['mtime'] == 0
+    assert meta['headers'] == parsed.headers
+
+    with gzip.open(file, 'wt') as f:
+        f.write('##gff-version 3\n1\t.\tgene\t1\t10\t.\t+\t.\tID=g1\n')
+    changed = GFF(file=file, format='df', cache_dir=cache_dir)
+    assert list(changed.data['ID']) == ['g1']
+    assert len(os.listdir(cache_dir)) == 1
+
+    with pytest.raises(ValueError):
+        GFF(file=file, cache_dir=cache_dir)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_filters(gff, workers):
+    """Test the types, seqids and attributes filters."""
+    filtered = GFF(file=GFF_FILE, types=['gene', 'exon'], seqids=['22'],
+                   attributes=['biotype'], workers=workers)
+    expect = [r for r in gff.data if r['type'] in ('gene', 'exon')]
+    assert len(filtered.data) == len(expect)
+    for (a, b) in zip(filtered.data, expect):
+        assert a['ID'] == b['ID']
+        assert a['attributes'] == {k: v for (k, v) in b['attributes'].items()
+                                   if k == 'biotype'}
+    assert GFF(file=GFF_FILE, seqids=['1'], workers=workers).data == []
+
+    df = GFF(file=GFF_FILE, format='df', types=['gene'],
+             attributes=['biotype'], workers=workers).data
+    assert len(df) == 505
+    assert (df['biotype'] == 'protein_coding').sum() == 444
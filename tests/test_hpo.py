@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.hpo` module."""
+
+import json
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catherpes.hpo import Ontology, Resnik, term_counts
+
+TERMS = {
+    'HP:0000001': 'All',
+    'HP:0000005': 'Mode of inheritance',
+    'HP:0000118': 'Phenotypic abnormality',
+    'HP:0000478': 'Abnormality of the eye',
+    'HP:0000504': 'Abnormality of vision',
+    'HP:0000505': 'Visual impairment',
+    'HP:0000707': 'Abnormality of the nervous system',
+    'HP:0001250': 'Seizure',
+    'HP:0012638': 'Abnormal nervous system physiology',
+}
+
+EDGES = [('HP:0000001', 'HP:0000118'), ('HP:0000001', 'HP:0000005'),
+         ('HP:0000118', 'HP:0000478'), ('HP:0000118', 'HP:0000707'),
+         ('HP:0000707', 'HP:0012638'), ('HP:0012638', 'HP:0001250'),
+         ('HP:0000478', 'HP:0000504'), ('HP:0000504', 'HP:0000505'),
+         ('HP:0012638', 'HP:0000505')]
+
+
+def _uri(id):
+    return 'http://purl.obolibrary.org/obo/' + id.replace(':', '_')
+
+
+@pytest.fixture(scope='module')
+def hp_json(tmp_path_factory):
+    """A small hp.json file."""
+    path = str(tmp_path_factory.mktemp('hpo') / 'hp.json')
+    nodes = [{'id': _uri(id), 'lbl': label, 'type': 'CLASS',
+              'meta': {'definition': {'val': label + '.'}}}
+             for (id, label) in TERMS.items()]
+    nodes.append({'id': 'http://purl.obolibrary.org/obo/UPHENO_0000001',
+                  'lbl': 'affected'})
+    edges = [{'sub': _uri(child), 'pred': 'is_a', 'obj': _uri(parent)}
+             for (parent, child) in EDGES]
+    with open(path, 'w') as f:
+        json.dump({'graphs': [{'nodes': nodes, 'edges': edges}]}, f)
+    return path
+
+
+@pytest.fixture(scope='module')
+def ontology(hp_json):
+    return Ontology(hp_json)
+
+
+def test_closure(ontology):
+    """Test the subgraph and ancestor closure."""
+    assert len(ontology) == 7
+    assert 'HP:0000005' not in ontology
+    contains = ontology.contains(['HP:0000505', 'HP:0000001'])
+    assert contains.tolist() == [True, False]
+    assert ontology.labels[ontology.index['HP:0001250']] == 'Seizure'
+    assert ontology.depth[ontology.index['HP:0000505']] == 3
+
+    assert ontology.ancestors(['HP:0000505']) == [
+        'HP:0000118', 'HP:0000478', 'HP:0000504', 'HP:0000505', 'HP:0000707',
+        'HP:0012638']
+    assert ontology.ancestors(['HP:0001250', 'HP:9999999']) == [
+        'HP:0000118', 'HP:0000707', 'HP:0001250', 'HP:0012638']
+    assert ontology.ancestors([]) == []
+    assert ontology.is_ancestor(
+        ['HP:0000478', 'HP:0000478', 'HP:0000505', 'HP:0000118'],
+        ['HP:0000505', 'HP:0001250', 'HP:0000505', 'HP:0000001']).tolist() == \
+        [True, False, True, False]
+
+
+def test_leaves(ontology):
+    """Test the leaves of the subgraph induced by a set of terms."""
+    ancestors = ontology.ancestors(['HP:0001250', 'HP:0000504'])
+    assert ontology.leaves(ancestors) == ['HP:0000504', 'HP:0001250']
+    assert ontology.leaves(ontology.ids) == ['HP:0000505', 'HP:0001250']
+    assert ontology.leaves(['HP:0000118']) == ['HP:0000118']
+    mask = ontology.ancestor_mask(['HP:0012638'])
+    assert np.flatnonzero(mask).tolist() == [ontology.index[id] for id in
+                                             ('HP:0000118', 'HP:0000707',
+                                              'HP:0012638')]
+
+
+def test_resnik(ontology):
+    """Test the MICA, branch and distance of blocks of term pairs."""
+    ic = {'HP:0000118': 0, 'HP:0000478': 1, 'HP:0000707': 0.5,
+          'HP:0012638': 1.2, 'HP:0000504': 1.5, 'HP:0000505': 3,
+          'HP:0001250': 2}
+    resnik = Resnik(ontology, ic)
+    result = resnik.mica(
+        ['HP:0000505', 'HP:0000504', 'HP:0000505', 'HP:0000118', 'HP:0000005'],
+        ['HP:0001250', 'HP:0001250', 'HP:0000504', 'HP:0000505', 'HP:0000505'],
+        block_size=2)
+    assert result['mica'].tolist()[:4] == ['HP:0012638', 'HP:0000118',
+                                           'HP:0000504', 'HP:0000118']
+    assert result['mica'].isna().tolist() == [False] * 4 + [True]
+    assert result['ic'].tolist()[:4] == [1.2, 0, 1.5, 0]
+    assert np.isnan(result['ic'][4])
+    assert result['branch'].tolist()[:4] == ['HP:0000478', 'HP:0000478',
+                                             'HP:0000478', 'HP:0000118']
+    assert result['distance'].tolist() == [2, 5, 1, 3, -1]
+
+    # Without an IC the deepest common ancestor is chosen.
+    result = Resnik(ontology, {}).mica(['HP:0000505'], ['HP:0001250'])
+    assert result['mica'].tolist() == ['HP:0012638']
+
+
+def test_resnik_pickle(hp_json):
+    """Test a pickled Resnik engine carries the step table."""
+    resnik = pickle.loads(pickle.dumps(Resnik(Ontology(hp_json), {})))
+    assert resnik.ontology._steps is not None
+    result = resnik.mica(['HP:0000505'], ['HP:0001250'])
+    assert result['distance'].tolist() == [2]
+
+
+def test_term_counts():
+    """Test term frequencies and information content."""
+    annotations = pd.DataFrame({
+        'id': ['HP:0000505', 'HP:0000505', 'HP:0000505', 'HP:0001250'],
+        'gene': ['CHD7', 'CHD7', 'CFTR', 'CHD7']})
+    counts = term_counts(annotations)
+    assert counts['count'].tolist() == [2, 1, 3]
+    assert counts.index.tolist() == ['HP:0000505', 'HP:0001250', 'HP:0000118']
+    assert counts['ic']['HP:0001250'] == pytest.approx(-np.log10(1 / 3))
+    assert counts['ic']['HP:0000118'] == 0
+
+
+def test_branches_distance(ontology):
+    """Test the top level branch and distance tables."""
+    assert ontology.branches('HP:0000505') == ['HP:0000478', 'HP:0000707']
+    assert ontology.branches('HP:0000118') == []
+    assert ontology.ids[ontology.branch[ontology.index['HP:0001250']]] == \
+        'HP:0000707'
+    assert ontology.branch[ontology.index['HP:0000118']] == -1
+
+    (indptr, ancestors, steps) = ontology.steps()
+    i = ontology.index['HP:0000505']
+    assert dict(zip(ontology.ids[ancestors[indptr[i]:indptr[i + 1]]],
+                    steps[indptr[i]:indptr[i + 1]].tolist())) == {
+        'HP:0000118': 3, 'HP:0000478': 2, 'HP:0000504': 1, 'HP:0000505': 0,
+        'HP:0000707': 2, 'HP:0012638': 1}
+    assert ontology.distance(
+        ['HP:0000505', 'HP:0000504', 'HP:0001250', 'HP:0000005'],
+        ['HP:0001250', 'HP:0001250', 'HP:0001250', 'HP:0000505']).tolist() == \
+        [2, 5, 0, -1]
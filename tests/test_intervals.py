@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.intervals` module."""
+
+import os
+
+import numpy as np
+
+from catherpes.gff import GFF
+from catherpes.intervals import IntervalIndex
+
+GFF_FILE = os.path.join(os.path.dirname(__file__), 'data',
+                        'Homo_sapiens.GRCh38.104.chromosome.22.gff3.gz')
+
+
+def test_query_batch():
+    """Test batch queries against a brute force scan."""
+    rng = np.random.default_rng(22)
+    seqids = rng.choice(['1', '2', 'X'], size=2000)
+    starts = rng.integers(1, 100000, size=2000)
+    ends = starts + rng.integers(0, 5000, size=2000)
+    index = IntervalIndex(seqids, starts, ends)
+
+    q_seqids = rng.choice(['1', '2', 'Y'], size=500)
+    q_starts = rng.integers(1, 100000, size=500)
+    q_ends = q_starts + rng.integers(0, 1000, size=500)
+    (query_idx, interval_idx) = index.query_batch(q_seqids, q_starts, q_ends)
+
+    assert np.all(np.diff(query_idx) >= 0)
+    for q in range(500):
+        expect = np.flatnonzero((seqids == q_seqids[q]) &
+                                (starts <= q_ends[q]) &
+                                (ends >= q_starts[q]))
+        assert set(interval_idx[query_idx == q]) == set(expect)
+
+
+def test_query():
+    """Test a single query with closed interval boundaries."""
+    index = IntervalIndex(['1', '1', '1'], [10, 20, 30], [19, 29, 39])
+    assert list(index.query('1', 19, 20)) == [0, 1]
+    assert list(index.query('1', 40, 50)) == []
+    assert list(index.query('2', 10, 20)) == []
+
+
+def test_long_intervals():
+    """Test that the chromosome record does not widen every query."""
+    df = GFF(file=GFF_FILE, format='df').data
+    assert (df['type'] == 'chromosome').any()
+    index = IntervalIndex(df['seqid'].to_numpy(dtype=object),
+                          df['start'], df['end'])
+
+    rng = np.random.default_rng(22)
+    q_starts = rng.integers(df['start'].min(), df['end'].max(), size=2000)
+    q_ends = q_starts + 1000
+    (query_idx, interval_idx) = index.query_batch(['22'] * 2000,
+                                                  q_starts, q_ends)
+    (candidates, _) = index._candidates('22', q_starts, q_ends,
+                                        filter=False)
+    assert len(candidates) < 2 * len(query_idx)
+
+    starts = df['start'].to_numpy()
+    ends = df['end'].to_numpy()
+    for q in range(0, 2000, 100):
+        expect = np.flatnonzero((starts <= q_ends[q]) & (ends >= q_starts[q]))
+        expect = expect[np.argsort(starts[expect], kind='stable')]
+        assert list(interval_idx[query_idx == q]) == list(expect)
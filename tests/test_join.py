@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.join` module."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catherpes.bed import BED
+from catherpes.gff import GFF
+from catherpes.join import coverage, overlaps
+
+GFF_FILE = os.path.join(os.path.dirname(__file__), 'data',
+                        'Homo_sapiens.GRCh38.104.chromosome.22.gff3.gz')
+
+
+@pytest.fixture(scope='module')
+def genes():
+    """The genes of the chr22 GFF3 file."""
+    return GFF(file=GFF_FILE, types=['gene'])
+
+
+@pytest.fixture(scope='module')
+def peaks():
+    """Random intervals on chr22 and a seqid with no genes."""
+    rng = np.random.default_rng(13)
+    starts = rng.integers(10000000, 51000000, size=3000)
+    return BED(data=pd.DataFrame({
+        'chrom': rng.choice(['22', '22', '22', 'X'], size=3000),
+        'start': starts,
+        'end': starts + rng.integers(1, 20000, size=3000)}))
+
+
+def test_overlaps(genes, peaks):
+    """Test the overlap pairs against an interval index."""
+    pairs = {(f['ID'], i[1], i[2]) for (f, i) in overlaps(genes, peaks)}
+
+    data = peaks.data
+    (query_idx, gene_idx) = genes.query_batch(data['chrom'].to_numpy(),
+                                              data['start'].to_numpy() + 1,
+                                              data['end'].to_numpy())
+    expect = {(genes.data[g]['ID'], int(data['start'][q]), int(data['end'][q]))
+              for (q, g) in zip(query_idx, gene_idx)}
+    assert pairs == expect
+
+
+def test_coverage(genes, peaks):
+    """Test coverage summaries against a per base count."""
+    results = list(coverage(genes, peaks))
+    assert len(results) == len(genes.data)
+    ids = [feature['ID'] for (feature, *stats) in results]
+    assert sorted(ids) == sorted(record['ID'] for record in genes.data)
+
+    data = peaks.data
+    for (feature, count, covered, length, depth) in results[:200:7]:
+        (start, end) = (int(feature['start']), int(feature['end']))
+        depths = np.zeros(end - start + 1, dtype=int)
+        hits = data[(data['chrom'] == '22') & (data['start'] < end) &
+                    (data['end'] >= start)]
+        for (h_start, h_end) in zip(hits['start'], hits['end']):
+            depths[max(h_start + 1 - start, 0):h_end - start + 1] += 1
+        assert count == len(hits)
+        assert covered == (depths > 0).sum()
+        assert length == len(depths)
+        assert depth == pytest.approx(depths.mean())
+
+
+def test_sorted_file(tmpdir):
+    """Test streaming a sorted BED file and rejecting unsorted input."""
+    path = str(tmpdir.join('a.bed'))
+    with open(path, 'w') as f:
+        f.write('1\t5\t15\n1\t12\t30\n2\t0\t10\n')
+    features = [{'seqid': '1', 'start': 1, 'end': 10, 'ID': 'a'},
+                {'seqid': '1', 'start': 20, 'end': 20, 'ID': 'b'},
+                {'seqid': '2', 'start': 50, 'end': 60, 'ID': 'c'}]
+    results = [(f['ID'], count, covered) for (f, count, covered, length, depth)
+               in coverage(features, path)]
+    assert results == [('a', 1, 5), ('b', 1, 1), ('c', 0, 0)]
+
+    with pytest.raises(ValueError):
+        list(overlaps(features[::-1], path))
+
+
+def test_spanning_feature():
+    """Test that a feature spanning its seqid does not hold back the
+    features it contains."""
+    features = [{'seqid': '1', 'start': 1, 'end': 1000000, 'ID': 'chr1'},
+                {'seqid': '1', 'start': 11, 'end': 20, 'ID': 'a'},
+                {'seqid': '1', 'start': 15, 'end': 40, 'ID': 'b'},
+                {'seqid': '1', 'start': 101, 'end': 200, 'ID': 'c'},
+                {'seqid': '2', 'start': 1, 'end': 10, 'ID': 'd'}]
+    reported = []
+
+    def intervals():
+        for interval in [('1', 0, 5), ('1', 12, 30), ('1', 150, 160),
+                         ('1', 500, 600), ('2', 0, 2)]:
+            yield interval
+            reported.append(len(results))
+
+    results = []
+    for (feature, count, covered, length, depth) in coverage(features,
+                                                             intervals()):
+        results.append((feature['ID'], count, covered))
+    assert results == [('a', 1, 8), ('b', 1, 16), ('c', 1, 10),
+                       ('chr1', 4, 133), ('d', 1, 2)]
+    assert reported[2] == 2
+
+    pairs = sorted((f['ID'], i[1])
+                   for (f, i) in overlaps(features, intervals()))
+    assert pairs == [('a', 12), ('b', 12), ('c', 150), ('chr1', 0),
+                     ('chr1', 12), ('chr1', 150), ('chr1', 500), ('d', 0)]
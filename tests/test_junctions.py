@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.junctions` module."""
+
+import gzip
+import io
+
+import numpy as np
+from click.testing import CliRunner
+
+from catherpes import cli
+from catherpes.gff import GFF
+from catherpes.junctions import (JunctionAnnotator, JunctionIndex,
+                                 JunctionMatrix, igv_junctions,
+                                 merge_junctions, read_sj,
+                                 write_igv_junctions)
+
+SJ = ('chr15\t92883779\t92885514\t1\t1\t1\t95\t10\t38\n'
+      'chr2\t1001\t2000\t2\t0\t0\t3\t0\t12\n'
+      'chr2\t5001\t6000\t0\t6\t1\t0\t4\t20\n')
+
+
+def test_igv_junctions(tmpdir):
+    """Test the IGV splice junction BED columns."""
+    path = str(tmpdir.join('a.SJ.out.tab'))
+    with open(path, 'w') as f:
+        f.write(SJ)
+    bed = igv_junctions(read_sj(path))
+    assert bed['start'].tolist() == [92883778, 1000, 5000]
+    assert bed['strand'].tolist() == ['+', '-', 'undefined']
+    assert bed['name'][0] == ('motif=GT/AG;uniquely_mapped=95;'
+                              'maximum_spliced_alignment_overhang=38;'
+                              'annotated_junction=annotated')
+    assert bed['name'][1].startswith('motif=non-canonical;')
+
+    output = io.StringIO()
+    assert write_igv_junctions(path, output) == 3
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 3
+    assert lines[2].split('\t') == [
+        'chr2', '5000', '6000', 'motif=GT/AT;uniquely_mapped=0;'
+        'maximum_spliced_alignment_overhang=20;annotated_junction=annotated',
+        '0', 'undefined']
+
+
+def test_command(tmpdir):
+    """Test the igv-junctions command writes only the BED lines."""
+    path = str(tmpdir.join('a.SJ.out.tab'))
+    with open(path, 'w') as f:
+        f.write(SJ)
+    result = CliRunner().invoke(cli.main, ['igv-junctions', path])
+    assert result.exit_code == 0
+    first = result.output.splitlines()[0]
+    assert first.startswith('chr15\t92883778\t92885514\t')
+    assert len(result.output.splitlines()) == 3
+
+    empty = str(tmpdir.join('empty.SJ.out.tab'))
+    open(empty, 'w').close()
+    assert write_igv_junctions(empty, io.StringIO()) == 0
+
+
+def test_merge_junctions(tmpdir):
+    """Test merging samples into a sparse junction matrix."""
+    samples = {
+        'a': SJ,
+        'b': ('chr2\t5001\t6000\t0\t6\t1\t7\t1\t20\n'
+              'chr2\t5001\t6000\t2\t6\t1\t2\t0\t20\n'
+              'chrM\t10\t90\t1\t1\t0\t5\t6\t9\n'),
+        'c': '',
+    }
+    files = []
+    for (name, text) in samples.items():
+        path = str(tmpdir.join(name + '_SJ.out.tab.gz'))
+        with gzip.open(path, 'wt') as f:
+            f.write(text)
+        files.append(path)
+
+    store = str(tmpdir.join('cohort'))
+    matrix = merge_junctions(files, store, workers=2)
+    assert matrix.samples == ['a', 'b', 'c']
+    assert len(matrix) == 5
+    junctions = matrix.junctions
+    assert junctions['chrom'].tolist() == ['chr15', 'chr2', 'chr2', 'chr2',
+                                           'chrM']
+    assert junctions['start'].tolist() == [92883779, 1001, 5001, 5001, 10]
+    assert junctions['strand'].tolist() == [1, 2, 0, 2, 1]
+    assert matrix.indptr.tolist() == [0, 3, 6, 6]
+
+    matrix = JunctionMatrix(store)
+    assert matrix.sample('b').tolist() == [0, 0, 7, 2, 5]
+    assert matrix.sample('b', kind='multi').tolist() == [0, 0, 1, 0, 6]
+    assert matrix.totals().tolist() == [95, 3, 7, 2, 5]
+    assert matrix.totals(samples=['a', 'c']).tolist() == [95, 3, 0, 0, 0]
+    assert np.array_equal(matrix.dense([2, 0], kind='multi'),
+                          [[4, 1, 0], [10, 0, 0]])
+
+    result = CliRunner().invoke(cli.main, ['junction-matrix',
+                                           str(tmpdir.join('cli')), files[1]])
+    assert result.exit_code == 0
+    assert result.output == '3 junctions in 1 samples\n'
+
+
+def test_junction_index():
+    """Test repeated keys get one ID, numbered in first seen order."""
+    index = JunctionIndex()
+    assert index.lookup('chr1', np.array([30, 10, 30, 20, 10])).tolist() == \
+        [0, 1, 0, 2, 1]
+    assert index.lookup('chr1', np.array([40, 20, 40])).tolist() == [3, 2, 3]
+    assert index.lookup('chr2', np.array([10, 10])).tolist() == [4, 4]
+    assert len(index) == 5
+    assert index.frame()['chrom'].tolist() == ['chr1'] * 4 + ['chr2']
+
+
+def test_annotator(tmpdir):
+    """Test junction categories and genes against GFF3 introns."""
+    gff_file = str(tmpdir.join('genes.gff3.gz'))
+    records = [('gene', 100, 600, '+', 'ID=gene:G1;Name=ONE;gene_id=G1'),
+               ('mRNA', 100, 600, '+', 'ID=transcript:T1;Parent=gene:G1'),
+               ('exon', 100, 200, '+', 'Parent=transcript:T1'),
+               ('exon', 300, 400, '+', 'Parent=transcript:T1'),
+               ('exon', 500, 600, '+', 'Parent=transcript:T1'),
+               ('gene', 1000, 2000, '-', 'ID=gene:G2;Name=TWO;gene_id=G2'),
+               ('mRNA', 1000, 2000, '-', 'ID=transcript:T2;Parent=gene:G2'),
+               ('exon', 1000, 1100, '-', 'Parent=transcript:T2'),
+               ('exon', 1500, 2000, '-', 'Parent=transcript:T2')]
+    with gzip.open(gff_file, 'wt') as f:
+        f.write('##gff-version 3\n')
+        for (type, start, end, strand, attributes) in records:
+            f.write('1\ttest\t{}\t{}\t{}\t.\t{}\t.\t{}\n'.format(
+                type, start, end, strand, attributes))
+
+    sj = str(tmpdir.join('a.SJ.out.tab'))
+    with open(sj, 'w') as f:
+        for (chrom, start, end, strand) in (
+                ('1', 201, 299, 1), ('1', 201, 499, 1), ('1', 201, 350, 0),
+                ('1', 250, 299, 1), ('1', 1101, 1300, 2), ('1', 1200, 1300, 1),
+                ('2', 10, 20, 1)):
+            f.write('{}\t{}\t{}\t{}\t1\t0\t5\t0\t30\n'.format(
+                chrom, start, end, strand))
+
+    annotator = JunctionAnnotator(GFF(file=gff_file, format='df'))
+    result = annotator.annotate(sj)
+    assert result['category'].tolist() == [
+        'known', 'novel_exon_skip', 'novel_acceptor', 'novel_donor',
+        'novel_donor', 'novel', 'novel']
+    assert result['genes'].tolist() == ['G1'] * 4 + ['G2', 'G2', '']
+    assert result['gene_names'].tolist()[4] == 'TWO'
+
+    chunks = list(annotator.annotate_sj(sj, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 3]
+    assert chunks[1]['category'].tolist() == ['novel_donor', 'novel', 'novel']
+    assert chunks[1]['unique'].tolist() == [5, 5, 5]
+
+    output = str(tmpdir.join('out'))
+    result = CliRunner().invoke(cli.main, ['annotate-junctions', gff_file, sj,
+                                           '-o', output])
+    assert result.exit_code == 0
+    with open(str(tmpdir.join('out', 'a.junctions.tsv'))) as f:
+        lines = f.read().splitlines()
+    assert lines[0].split('\t')[-3:] == ['category', 'genes', 'gene_names']
+    assert lines[1].split('\t')[-3:] == ['known', 'G1', 'ONE']
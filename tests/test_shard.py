@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.shard` module."""
+
+import gzip
+
+import pytest
+
+from catherpes import bgzf
+from catherpes import index
+from catherpes.shard import make_shards, run_shards
+
+
+def _starts(shard):
+    """Get the seqid and start of each record of a shard."""
+    return [tuple(line.split('\t')[:2]) for line in shard.lines()]
+
+
+def _records(n=3000):
+    """BED records on three seqids, some crossing 100 kb boundaries."""
+    lines = []
+    for i in range(n):
+        seqid = ('chr1', 'chr2', 'chr10')[i * 3 // n]
+        start = (i % (n // 3)) * 997
+        lines.append('{}\t{}\t{}\tr{}\n'.format(seqid, start, start + 5000, i))
+    return lines
+
+
+@pytest.fixture(scope='module')
+def files(tmp_path_factory):
+    """The same records as plain, gzip and indexed bgzip files."""
+    path = tmp_path_factory.mktemp('shard')
+    lines = _records()
+    plain = str(path / 'a.bed')
+    with open(plain, 'w') as f:
+        f.write('# header\n' + ''.join(lines))
+    gzipped = str(path / 'a.bed.gz')
+    with gzip.open(gzipped, 'wt') as f:
+        f.write(''.join(lines))
+    bgzipped = str(path / 'b.bed.gz')
+    with bgzf.BgzfWriter(bgzipped) as writer:
+        writer.write(''.join(lines))
+    indexed = str(path / 'c.bed.gz')
+    with bgzf.BgzfWriter(indexed) as writer:
+        writer.write(''.join(lines))
+    index.build_index(indexed, preset='bed')
+    expect = [tuple(line.split('\t')[:2]) for line in lines]
+    return {'plain': plain, 'gzip': gzipped, 'bgzip': bgzipped,
+            'indexed': indexed, 'expect': expect}
+
+
+@pytest.mark.parametrize('kind', ['plain', 'gzip', 'bgzip'])
+def test_seqid_runs(files, kind):
+    """Test shards at seqid boundaries cover every record once."""
+    shards = make_shards(files[kind], preset='bed')
+    assert [shard.seqid for shard in shards] == ['chr1', 'chr2', 'chr10']
+    results = [starts for (shard, starts)
+               in run_shards(_starts, shards, workers=1)]
+    assert sum(results, []) == files['expect']
+
+
+def test_indexed_regions(files):
+    """Test fixed size regions of an indexed file in a process pool."""
+    shards = make_shards(files['indexed'], preset='bed', size=100000)
+    assert len(shards) > 9
+    assert shards[0].region == 'chr1:1-100000'
+
+    results = list(run_shards(_starts, shards, workers=3, max_pending=2))
+    assert [shard for (shard, starts) in results] == shards
+    assert sum([starts for (shard, starts) in results], []) == files['expect']
+
+    unordered = run_shards(_starts, shards, workers=3, ordered=False)
+    assert sorted(sum([starts for (shard, starts) in unordered], [])) == \
+        sorted(files['expect'])
+
+
+def test_indexed_extent(tmp_path):
+    """Test a seqid spanning record bounds the regions by its end, not
+    by the 512 Mb bin it falls in.
+    """
+    file = str(tmp_path / 'd.bed.gz')
+    with bgzf.BgzfWriter(file) as writer:
+        writer.write('chr1\t0\t70000000\tchromosome\n'
+                     'chr1\t1000\t2000\tr1\n'
+                     'chr2\t500\t1500\tr2\n')
+    index.build_index(file, preset='bed')
+    shards = make_shards(file, preset='bed', size=10000000)
+    assert [shard.region for shard in shards][-2:] == \
+        ['chr1:60000001-70000000', 'chr2:1-1500']
+    assert len(shards) == 8
+
+    shards = make_shards(file, preset='bed', genome={'chr2': 3000})
+    assert [shard.region for shard in shards] == ['chr1:1-70000000',
+                                                  'chr2:1-3000']
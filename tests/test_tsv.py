@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.tsv` module."""
+
+import gzip
+
+import numpy as np
+import pytest
+
+from catherpes.tsv import TSV
+
+
+@pytest.fixture
+def sj_file(tmpdir):
+    """A gzipped STAR SJ.out.tab file."""
+    path = str(tmpdir.join('a.SJ.out.tab.gz'))
+    with gzip.open(path, 'wt') as f:
+        for i in range(25):
+            f.write('chr{}\t{}\t{}\t1\t1\t0\t{}\t0\t30\n'.format(
+                1 + i % 2, 1000 + i, 2000 + i, i))
+    return path
+
+
+def test_schema_chunks(sj_file):
+    """Test typed, projected chunks with a schema."""
+    reader = TSV(sj_file, schema='sj', columns=['unique', 'chrom'],
+                 chunk_size=10)
+    chunks = list(reader)
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert list(chunks[0].columns) == ['unique', 'chrom']
+    assert chunks[0]['unique'].dtype == np.int32
+    assert chunks[0]['chrom'].dtype == 'category'
+
+    df = reader.read()
+    assert df['unique'].sum() == sum(range(25))
+    assert df['chrom'].cat.categories.tolist() == ['chr1', 'chr2']
+
+    arrays = next(TSV(sj_file, schema='sj', chunk_size=10).iter_arrays())
+    assert arrays['start'].dtype == np.int64
+    assert arrays['start'][:2].tolist() == [1000, 1001]
+
+    with pytest.raises(ValueError):
+        list(TSV(sj_file, schema='sj', columns=['score']))
+
+
+def test_header_comments(tmpdir):
+    """Test comments, a header line, missing values and dtypes."""
+    path = str(tmpdir.join('viq.txt'))
+    with open(path, 'w') as f:
+        f.write('## VIQ run\n## version 1\nRank\tGene\tScore\tFlag\n'
+                '1\tCFTR\t0.9\t.\n2\tCHD7\t.\t#x\n')
+    reader = TSV(path, dtypes={'Rank': np.int16})
+    df = reader.read()
+    assert reader.comments == ['## VIQ run', '## version 1']
+    assert list(df.columns) == ['Rank', 'Gene', 'Score', 'Flag']
+    assert df['Rank'].dtype == np.int16
+    assert np.isnan(df['Score'][1])
+    assert df['Flag'].tolist()[1] == '#x'
+
+
+def test_phenotype_to_genes(tmpdir):
+    """Test the first line of phenotype_to_genes.txt is skipped."""
+    path = str(tmpdir.join('phenotype_to_genes.txt'))
+    with open(path, 'w') as f:
+        f.write('#Format: HPO-id<tab>HPO label<tab>entrez-gene-id\n'
+                'HP:0000002\tAbnormality of body height\t81848\tSPRY4\t-\t'
+                'mim2gene\tOMIM:615266\n')
+    df = TSV(path, schema='phenotype_to_genes').read()
+    assert df['id'].tolist() == ['HP:0000002']
+    assert df['gene_id'].tolist() == [81848]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.vcf` module."""
+
+import numpy as np
+import pytest
+
+from catherpes import bgzf
+from catherpes import index
+from catherpes.vcf import VCF, GenotypeMatrix, export_matrix
+
+HEADER = """##fileformat=VCFv4.2
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency, per ALT">
+##INFO=<ID=DB,Number=0,Type=Flag,Description="dbSNP">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allele depths">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3
+"""
+
+
+def _write(path, n=2000):
+    """Write a VCF of n records on two chroms."""
+    lines = [HEADER]
+    for i in range(n):
+        chrom = '1' if i < n // 2 else '2'
+        lines.append('{}\t{}\trs{}\tA\tG,T\t{}\t{}\tDP={};AF=0.5,.;DB\t'
+                     'GT:DP:AD\t0/1:10:5,5,0\t1|1:.:0,8,0\t./.\n'.format(
+                         chrom, 1000 + i * 100, i, 50 if i % 2 else '.',
+                         'PASS' if i % 3 else 'q10;s50', i))
+    with open(path, 'w') as f:
+        f.write(''.join(lines))
+    return path
+
+
+@pytest.fixture(scope='module')
+def vcf_file(tmp_path_factory):
+    return _write(str(tmp_path_factory.mktemp('vcf') / 'a.vcf'))
+
+
+def test_parse(vcf_file):
+    """Test headers and the eagerly parsed fixed columns."""
+    vcf = VCF(file=vcf_file)
+    assert vcf.samples == ['S1', 'S2', 'S3']
+    assert vcf.info_types['AF']['Number'] == 'A'
+    assert vcf.info_types['AF']['Description'] == 'Allele frequency, per ALT'
+
+    variants = list(vcf)
+    assert len(variants) == 2000
+    variant = variants[0]
+    assert ((variant.chrom, variant.pos, variant.id, variant.ref) ==
+            ('1', 1000, 'rs0', 'A'))
+    assert variant.alt == ['G', 'T']
+    assert variant.qual is None and variants[1].qual == 50.0
+    assert variant.filters == ['q10', 's50'] and variants[1].filters == []
+    assert variant['pos'] == 1000
+    assert variant._info is None and variant._format is None
+
+
+def test_lazy_fields(vcf_file):
+    """Test INFO and FORMAT values decoded on access."""
+    variant = list(VCF(file=vcf_file))[7]
+    assert variant.info == {'DP': 7, 'AF': [0.5, None], 'DB': True}
+    assert variant.format_keys == ['GT', 'DP', 'AD']
+    assert variant.format('DP') == [10, None, None]
+    assert variant.format('AD') == [[5, 5, 0], [0, 8, 0], None]
+    assert variant.format('GQ') == [None, None, None]
+    assert variant.genotypes == [(0, 1), (1, 1), (None, None)]
+    assert variant.phased == [False, True, False]
+    assert variant.sample('S1') == {'GT': (0, 1), 'DP': 10, 'AD': [5, 5, 0]}
+
+
+def test_region(vcf_file, tmpdir):
+    """Test a bgzipped indexed region against a scan."""
+    path = str(tmpdir.join('a.vcf.gz'))
+    with open(vcf_file) as f, bgzf.BgzfWriter(path) as writer:
+        writer.write(f.read())
+    index.build_index(path, preset='vcf')
+
+    region = '2:150000-160000'
+    indexed = [v.pos for v in VCF(file=path, region=region)]
+    scanned = [v.pos for v in VCF(file=vcf_file, region=region)]
+    assert indexed == scanned
+    assert indexed == list(range(150000, 160001, 100))
+
+
+def test_export_matrix(vcf_file, tmpdir):
+    """Test the memory-mapped genotype matrix and its reductions."""
+    path = str(tmpdir.join('matrix'))
+    export_matrix(vcf_file, path, fields=('DP',), chunk_size=300)
+    matrix = GenotypeMatrix(path)
+
+    assert matrix.samples == ['S1', 'S2', 'S3']
+    assert matrix.genotypes.shape == (2000, 3)
+    assert matrix.genotypes[0].tolist() == [1, 2, -1]
+    assert matrix.fields['DP'][0].tolist() == [10, 65535, 65535]
+    assert matrix.variants['pos'][1999] == 1000 + 1999 * 100
+    assert matrix.variants['alt'][0] == 'G,T'
+    assert np.shares_memory(matrix.genotypes[10:20, 1:],
+                            matrix.genotypes)
+
+    assert matrix.allele_frequency()[0] == pytest.approx(0.75)
+    assert np.isnan(matrix.allele_frequency(samples=['S3'])[0])
+    assert matrix.missingness()[0] == pytest.approx(1 / 3)
+    assert matrix.carrier_counts().tolist() == [2] * 2000
+    assert matrix.carrier_counts(min_alleles=2)[5] == 1
+    assert matrix.carriers(0) == ['S1', 'S2']
+    assert matrix.carriers(0, samples=['S2', 'S3']) == ['S2']
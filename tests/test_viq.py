@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.viq` module."""
+
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from catherpes import cli
+from catherpes.viq import aggregate, load_cohort, read_manifest
+
+
+def _write_viq(path, sample, rows):
+    with open(path, 'w') as f:
+        f.write('## VIQ {}\nRank\tGene\tScore\n'.format(sample))
+        for i in range(rows):
+            f.write('{}\tGENE{}\t{}\n'.format(i + 1, i, 0.5 if i % 2 else '.'))
+
+
+@pytest.fixture
+def cohort(tmpdir):
+    """A manifest of three samples with relative paths."""
+    for (i, sample) in enumerate(['HG00096', 'HG00103', 'HG00105']):
+        _write_viq(str(tmpdir.join('viq.{}.output.txt'.format(sample))),
+                   sample, 3 + i)
+    manifest = str(tmpdir.join('manifest.txt'))
+    with open(manifest, 'w') as f:
+        for sample in ['HG00096', 'HG00103', 'HG00105']:
+            f.write('{}\tviq.{}.output.txt\n'.format(sample, sample))
+    return manifest
+
+
+def test_aggregate(cohort, tmpdir):
+    """Test the store is built once and only updated for changes."""
+    path = str(tmpdir.join('store'))
+    entries = read_manifest(cohort)
+    assert entries[0] == ('HG00096',
+                          str(tmpdir.join('viq.HG00096.output.txt')))
+
+    status = aggregate(entries, path, workers=2)
+    assert sorted(status['added']) == ['HG00096', 'HG00103', 'HG00105']
+
+    df = load_cohort(path)
+    assert list(df.columns) == ['sample', 'Rank', 'Gene', 'Score']
+    assert len(df) == 3 + 4 + 5
+    assert df['sample'].value_counts()['HG00105'] == 5
+    assert df['Score'].isna().sum() == 2 + 2 + 3
+
+    assert aggregate(entries, path)['unchanged'] == ['HG00096', 'HG00103',
+                                                     'HG00105']
+
+    # Touching a file without changing it is detected by the hash.
+    os.utime(entries[0][1], ns=(1, 1))
+    _write_viq(entries[1][1], 'HG00103', 10)
+    status = aggregate(entries, path)
+    assert status['updated'] == ['HG00103']
+    assert sorted(status['unchanged']) == ['HG00096', 'HG00105']
+    df = load_cohort(path, columns=['Gene'], samples=['HG00103'])
+    assert list(df.columns) == ['sample', 'Gene']
+    assert len(df) == 10
+
+
+def test_schema_mismatch(cohort, tmpdir):
+    """Test a file with different columns is rejected."""
+    entries = read_manifest(cohort)
+    with open(entries[2][1], 'w') as f:
+        f.write('Rank\tGene\n1\tX\n')
+    with pytest.raises(ValueError):
+        aggregate(entries, str(tmpdir.join('store')))
+
+
+def test_missing_values(tmpdir):
+    """Test missing values in columns that are complete in the first
+    sample do not break the cohort schema.
+    """
+    entries = []
+    for (sample, rank, flag) in (('s1', '1', 'True'), ('s2', '.', '.')):
+        file = str(tmpdir.join('{}.txt'.format(sample)))
+        with open(file, 'w') as f:
+            f.write('Rank\tGene\tFlag\n{}\tX\t{}\n2\tY\tFalse\n'.format(
+                rank, flag))
+        entries.append((sample, file))
+
+    path = str(tmpdir.join('store'))
+    assert sorted(aggregate(entries, path)['added']) == ['s1', 's2']
+    df = load_cohort(path)
+    assert df['Rank'].isna().tolist() == [False, False, True, False]
+    assert df['Rank'].sum() == 5
+    assert df['Flag'].isna().tolist() == [False, False, True, False]
+    assert df['Flag'].dropna().tolist() == ['True', 'False', 'False']
+
+
+def test_cli(cohort, tmpdir):
+    """Test aggregating from the command line."""
+    result = CliRunner().invoke(cli.main, ['viq', cohort,
+                                           str(tmpdir.join('store'))])
+    assert result.exit_code == 0, result.output
+    assert 'added\t3' in result.output
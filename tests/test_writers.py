@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""Tests for `catherpes.writers` module."""
+
+import os
+
+import pytest
+
+from catherpes import bgzf
+from catherpes import writers
+from catherpes.gff import GFF
+
+GFF_FILE = os.path.join(os.path.dirname(__file__), 'data',
+                        'Homo_sapiens.GRCh38.104.chromosome.22.gff3.gz')
+
+
+@pytest.fixture(scope='module')
+def gff():
+    """A columnar chr22 GFF3 file."""
+    return GFF(file=GFF_FILE, format='df')
+
+
+@pytest.mark.parametrize('format', ['df', 'dict'])
+def test_gff3(gff, tmp_path, format):
+    """Test a bgzipped GFF3 round trip."""
+    file = str(tmp_path / 'out.gff3.gz')
+    writers.write_gff3(GFF(file=GFF_FILE, format=format), file,
+                       bgzip=True, threads=2)
+    assert bgzf.is_bgzf(file)
+    written = GFF(file=file, format='df')
+    assert written.headers[0] == '##gff-version 3'
+    assert written.data.drop(columns='score').equals(
+        gff.data.drop(columns='score'))
+
+
+def test_gtf(gff, tmp_path):
+    """Test GTF gene_id and transcript_id attributes."""
+    file = str(tmp_path / 'out.gtf')
+    writers.write_gtf(gff, file)
+    with open(file) as f:
+        lines = [line.rstrip('\n').split('\t') for line in f]
+    genes = [line for line in lines if line[2] == 'gene']
+    assert len(genes) == 505 + 539 + 344
+    exon = [line for line in lines if line[2] == 'exon'][0]
+    assert exon[8].startswith('gene_id "ENSG')
+    assert 'transcript_id "ENST' in exon[8]
+
+
+def test_bed(gff, tmp_path):
+    """Test BED6 and BED12 output."""
+    file = str(tmp_path / 'genes.bed')
+    writers.write_bed(gff, file, type='gene')
+    with open(file) as f:
+        genes = [line.rstrip('\n').split('\t') for line in f]
+    assert len(genes) == 505
+    assert genes[0][0:4] == ['22', '15528191', '15529139', 'OR11H1']
+
+    file = str(tmp_path / 'transcripts.bed')
+    writers.write_bed(gff, file, type='mRNA', bed12=True)
+    with open(file) as f:
+        rows = {line.split('\t')[3]: line.rstrip('\n').split('\t')
+                for line in f}
+    assert len(rows) == 2225
+    for (name, row) in list(rows.items())[0:50]:
+        children = gff.children('transcript:' + name)
+        exons = children[children['type'] == 'exon'].sort_values('start')
+        cds = children[children['type'] == 'CDS']
+        start = int(row[1])
+        assert start == exons['start'].min() - 1
+        assert int(row[2]) == exons['end'].max()
+        assert int(row[9]) == len(exons)
+        sizes = exons['end'] - exons['start'] + 1
+        assert row[10] == ','.join(str(s) for s in sizes)
+        assert row[11] == ','.join(str(s) for s in exons['start'] - 1 - start)
+        if len(cds):
+            assert int(row[6]) == cds['start'].min() - 1
+            assert int(row[7]) == cds['end'].max()